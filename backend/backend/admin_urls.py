@@ -0,0 +1,10 @@
+# backend/admin_urls.py
+# Imported on the first request under /admin/ (see backend/urls.py), so the
+# app admin modules are not loaded at startup.
+
+from django.contrib import admin
+
+admin.autodiscover()
+
+app_name = 'admin'
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,74 @@
+# backend/compression.py
+"""
+Compresses JSON responses with brotli (when the `brotli` package is
+installed and the client accepts it) or gzip. Streaming responses, which
+include the SSE chat stream and the exports, are passed through untouched.
+
+BREACH: gzip bodies get the random-length header padding Django's
+GZipMiddleware adds. Brotli has no equivalent, so it is only used for GET
+and HEAD responses; the ones that return secrets (login, registration and
+access tokens) answer POSTs and are always gzipped with padding.
+"""
+
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_LENGTH = 512
+COMPRESSIBLE_TYPES = ('application/json', 'application/problem+json')
+BROTLI_METHODS = ('GET', 'HEAD')
+ENCODING_TOKEN = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+
+
+def accepted_encodings(header):
+    """Encodings the client accepts (q > 0), lower-cased"""
+    accepted = set()
+    for part in header.split(','):
+        match = ENCODING_TOKEN.match(part)
+        if match and float(match.group(2) or 1) > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < MIN_LENGTH
+            or response.get('Content-Type', '').split(';')[0].strip() not in COMPRESSIBLE_TYPES
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted and request.method in BROTLI_METHODS:
+            encoding, compressed = 'br', brotli.compress(response.content, quality=4)
+        elif 'gzip' in accepted:
+            encoding, compressed = 'gzip', compress_string(
+                response.content, max_random_bytes=GZipMiddleware.max_random_bytes,
+            )
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The compressed body is a different representation of the same resource
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,37 @@
+# backend/conditional.py
+"""
+Conditional GET helpers. Views build a strong ETag and a Last-Modified time
+from cheap version stamps (updated_at columns, message high-water marks) and
+call not_modified() before serializing anything.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Strong ETag from the version stamps of everything the response depends on"""
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response when the request's validators still match, otherwise None"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Per-user representations: browsers may keep them but must revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    return response
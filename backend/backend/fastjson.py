@@ -0,0 +1,80 @@
+# backend/fastjson.py
+"""
+orjson-backed JSON for the API: a DRF renderer and parser (the project
+defaults, see REST_FRAMEWORK) and the encoder used for SSE frames and NDJSON
+exports. Output matches DRF's compact JSON; anything orjson does not know
+natively goes through the same conversions as DRF's JSONEncoder.
+"""
+
+import datetime
+import decimal
+import uuid
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+# Valid JSON but not valid JavaScript; escaped like DRF does
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def default(obj):
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj, indent=False):
+    """Serialize to UTF-8 bytes"""
+    return orjson.dumps(obj, default=default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+def sse_event(payload):
+    """One server-sent event frame carrying payload as JSON"""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        content = dumps(data, indent=bool(indent))
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in content:
+                content = content.replace(separator, escaped)
+        return content
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,175 @@
+# backend/memory.py
+"""
+Memory diagnostics for a running worker, served by
+/api/users/memory/ (admins only). Everything is per process: each worker
+answers for itself, and the report carries its pid.
+
+- process_stats(): RSS (current and peak), GC counts/collections, uncollectable
+  garbage and tracemalloc totals; also rendered as Prometheus text.
+- tracemalloc is started on demand (or at boot with PYTHONTRACEMALLOC=<frames>);
+  take_snapshot() keeps the last MAX_SNAPSHOTS snapshots so growth can be
+  diffed over time with compare(), and top_sites() lists the biggest live
+  allocation sites.
+- live_objects() counts live model instances, serializers and the most common
+  object types via the garbage collector.
+"""
+
+import gc
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MAX_SNAPSHOTS = 5
+TOP_LIMIT = 25
+IGNORED_FILES = (tracemalloc.__file__, __file__, '<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>')
+
+_lock = threading.Lock()
+_snapshots = []  # [(id, label, taken_at, snapshot)], oldest first
+_next_id = 1
+
+
+def rss_kb():
+    """(current, peak) resident set size in KiB"""
+    try:
+        with open('/proc/self/status') as status:
+            fields = dict(line.split(':', 1) for line in status if ':' in line)
+        return int(fields['VmRSS'].split()[0]), int(fields['VmHWM'].split()[0])
+    except (OSError, KeyError, ValueError):
+        # ru_maxrss is KiB on Linux; no current value without /proc
+        return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def process_stats():
+    rss, peak = rss_kb()
+    traced, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        'pid': os.getpid(),
+        'rss_kb': rss,
+        'rss_peak_kb': peak,
+        'gc': {
+            'counts': gc.get_count(),
+            'thresholds': gc.get_threshold(),
+            'generations': gc.get_stats(),
+            'garbage': len(gc.garbage),
+        },
+        'tracemalloc': {
+            'tracing': tracemalloc.is_tracing(),
+            'frames': tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else 0,
+            'traced_kb': traced // 1024,
+            'traced_peak_kb': traced_peak // 1024,
+            'overhead_kb': tracemalloc.get_tracemalloc_memory() // 1024,
+        },
+        'snapshots': [
+            {'id': snapshot_id, 'label': label, 'taken_at': taken_at}
+            for snapshot_id, label, taken_at, _ in list(_snapshots)
+        ],
+    }
+
+
+def prometheus_metrics():
+    """process_stats() in the Prometheus text exposition format"""
+    stats = process_stats()
+    labels = f'{{pid="{stats["pid"]}"}}'
+    lines = []
+    if stats['rss_kb'] is not None:
+        lines.append(f'worker_memory_rss_bytes{labels} {stats["rss_kb"] * 1024}')
+    lines.append(f'worker_memory_rss_peak_bytes{labels} {stats["rss_peak_kb"] * 1024}')
+    for generation, (count, collected) in enumerate(zip(stats['gc']['counts'], stats['gc']['generations'])):
+        gen_labels = f'{{pid="{stats["pid"]}",generation="{generation}"}}'
+        lines.append(f'worker_gc_objects{gen_labels} {count}')
+        lines.append(f'worker_gc_collections_total{gen_labels} {collected["collections"]}')
+        lines.append(f'worker_gc_collected_total{gen_labels} {collected["collected"]}')
+    lines.append(f'worker_gc_garbage{labels} {stats["gc"]["garbage"]}')
+    lines.append(f'worker_tracemalloc_traced_bytes{labels} {stats["tracemalloc"]["traced_kb"] * 1024}')
+    return '\n'.join(lines) + '\n'
+
+
+def start_tracing(frames=1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+
+
+def stop_tracing():
+    """Stop tracing and drop the stored snapshots, which are meaningless afterwards"""
+    with _lock:
+        _snapshots.clear()
+    tracemalloc.stop()
+
+
+def take_snapshot(label=''):
+    """Store a snapshot of the traced allocations; returns its id"""
+    global _next_id
+    if not tracemalloc.is_tracing():
+        raise RuntimeError('tracemalloc is not tracing; start it first')
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+    )
+    with _lock:
+        snapshot_id, _next_id = _next_id, _next_id + 1
+        _snapshots.append((snapshot_id, label, time.time(), snapshot))
+        del _snapshots[:-MAX_SNAPSHOTS]
+    return snapshot_id
+
+
+def get_snapshot(snapshot_id):
+    with _lock:
+        for stored_id, _, _, snapshot in _snapshots:
+            if stored_id == snapshot_id:
+                return snapshot
+    raise KeyError(snapshot_id)
+
+
+def previous_snapshot_id(snapshot_id):
+    with _lock:
+        ids = [stored_id for stored_id, _, _, _ in _snapshots if stored_id < snapshot_id]
+    return ids[-1] if ids else None
+
+
+def _site(stat):
+    return [f'{frame.filename}:{frame.lineno}' for frame in stat.traceback]
+
+
+def top_sites(snapshot_id, group_by='lineno', limit=TOP_LIMIT):
+    """Largest allocation sites in a snapshot"""
+    return [
+        {'site': _site(stat), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+        for stat in get_snapshot(snapshot_id).statistics(group_by)[:limit]
+    ]
+
+
+def compare(snapshot_id, base_id, group_by='lineno', limit=TOP_LIMIT):
+    """Allocation sites that grew the most from base_id to snapshot_id"""
+    stats = get_snapshot(snapshot_id).compare_to(get_snapshot(base_id), group_by)
+    return [
+        {
+            'site': _site(stat),
+            'size_kb': round(stat.size / 1024, 1),
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'count': stat.count,
+            'count_diff': stat.count_diff,
+        }
+        for stat in stats[:limit]
+    ]
+
+
+def live_objects(limit=TOP_LIMIT):
+    """Live model instances and serializers by class, and the most common tracked types"""
+    from django.db.models import Model
+    from rest_framework.serializers import BaseSerializer
+
+    models, serializers, types = Counter(), Counter(), Counter()
+    for obj in gc.get_objects():
+        kind = type(obj)
+        types[f'{kind.__module__}.{kind.__qualname__}'] += 1
+        if isinstance(obj, Model):
+            models[obj._meta.label] += 1
+        elif isinstance(obj, BaseSerializer):
+            serializers[kind.__qualname__] += 1
+    return {
+        'models': dict(models.most_common()),
+        'serializers': dict(serializers.most_common()),
+        'types': dict(types.most_common(limit)),
+    }
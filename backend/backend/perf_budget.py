@@ -0,0 +1,218 @@
+# backend/perf_budget.py
+"""
+Query-count and latency budgets for the API endpoints, used by the apps'
+tests.py.
+
+seed_school() creates a school at realistic volume (learners with a few
+weeks of conversations and activity, their teachers and parents, an admin).
+EndpointBudgetTestCase.measure() calls an endpoint as one of the seeded roles
+with every cache cleared, which is the path where an N+1 shows up. It then
+asserts the query count and the median wall time against the endpoint's budget.
+
+When each test class finishes, its results are printed next to the stored
+baseline (perf_baseline.json beside manage.py). Run the tests with
+PERF_BASELINE=update to rewrite that baseline. The latency budgets only catch
+order-of-magnitude regressions; scale them with PERF_LATENCY_FACTOR on slow
+machines.
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from learners import quotas
+from learners.models import LearnerDailyActivity, LearnerProfile, LearnerPrompt, Response
+from parents.models import ParentProfile
+from teachers.models import TeacherProfile
+from users.authentication import token_cache
+from users.models import AdminProfile, User
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'perf_baseline.json'
+LATENCY_FACTOR = float(os.environ.get('PERF_LATENCY_FACTOR', '1'))
+RUNS = 3
+
+LEARNERS = 40
+LEARNERS_PER_PARENT = 2
+CONVERSATIONS_PER_LEARNER = 8
+MESSAGES_PER_CONVERSATION = 12
+ACTIVITY_DAYS = 30
+PASSWORD = 'budget-password'
+
+QUESTION = 'Why do plants need sunlight to grow?'
+ANSWER = (
+    'Plants use sunlight to make their own food in a process called photosynthesis. '
+    'Their leaves take in light, water and carbon dioxide and turn them into sugar and oxygen. '
+)
+
+
+def seed_school():
+    """Create the school; returns the users measured by the tests keyed by role"""
+    password = make_password(PASSWORD)
+
+    def user(username, role, **fields):
+        return User(
+            username=username, email=f'{username}@budget.example.com', password=password, role=role,
+            first_name=username.title(), last_name='Budget', gender=User.Gender.OTHER, phone_number='0000000000', **fields,
+        )
+
+    teachers = User.objects.bulk_create([user(f'teacher{i}', User.Role.TEACHER) for i in range(2)])
+    parents = User.objects.bulk_create([
+        user(f'parent{i}', User.Role.PARENT) for i in range(LEARNERS // LEARNERS_PER_PARENT)
+    ])
+    learners = User.objects.bulk_create([user(f'learner{i}', User.Role.LEARNER, grade='5') for i in range(LEARNERS)])
+    admin = User.objects.create(**{
+        field: getattr(user('admin', User.Role.ADMIN), field)
+        for field in ('username', 'email', 'password', 'role', 'first_name', 'last_name', 'gender', 'phone_number')
+    })
+
+    AdminProfile.objects.create(user=admin)
+    TeacherProfile.objects.bulk_create([
+        TeacherProfile(user=teacher, subject='Science', school='Hill School') for teacher in teachers
+    ])
+    ParentProfile.objects.bulk_create([ParentProfile(user=parent, address='1 Budget Road') for parent in parents])
+    LearnerProfile.objects.bulk_create([
+        LearnerProfile(
+            user=learner, grade='5', school='Hill School',
+            parent=parents[index // LEARNERS_PER_PARENT], teacher=teachers[index % len(teachers)],
+        )
+        for index, learner in enumerate(learners)
+    ])
+
+    conversations = LearnerPrompt.objects.bulk_create([
+        LearnerPrompt(learner=learner, text=QUESTION, title=f'Plants question {index}')
+        for learner in learners
+        for index in range(CONVERSATIONS_PER_LEARNER)
+    ])
+    Response.objects.bulk_create([
+        Response(
+            prompt=conversation,
+            role='user' if turn % 2 == 0 else 'assistant',
+            text=QUESTION if turn % 2 == 0 else ANSWER * 3,
+        )
+        for conversation in conversations
+        for turn in range(MESSAGES_PER_CONVERSATION)
+    ], batch_size=2000)
+
+    today = localdate()
+    LearnerDailyActivity.objects.bulk_create([
+        LearnerDailyActivity(
+            learner=learner, date=today - timedelta(days=day), message_count=6, answer_count=6,
+            answer_characters=6 * len(ANSWER) * 3, conversations_started=1,
+            active_time=timedelta(minutes=20), last_activity_at=now() - timedelta(days=day),
+        )
+        for learner in learners
+        for day in range(ACTIVITY_DAYS)
+    ])
+
+    return {'admin': admin, 'teacher': teachers[0], 'parent': parents[0], 'learner': learners[0]}
+
+
+def load_baseline():
+    try:
+        return json.loads(BASELINE_PATH.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results):
+    baseline = load_baseline()
+    baseline.update(results)
+    BASELINE_PATH.write_text(json.dumps(dict(sorted(baseline.items())), indent=2) + '\n')
+
+
+def reset_caches():
+    """Start a request cold: no cached relationships, responses, token users or quota counters"""
+    cache.clear()
+    token_cache.clear()
+    quotas.store.clear()
+
+
+class EndpointBudgetTestCase(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_school()
+        cls.tokens = {role: Token.objects.create(user=user).key for role, user in cls.users.items()}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.results:
+            cls.report(cls.results)
+            if os.environ.get('PERF_BASELINE') == 'update':
+                save_baseline(cls.results)
+        super().tearDownClass()
+
+    @classmethod
+    def report(cls, results):
+        baseline = load_baseline()
+        lines = [
+            f"\n{cls.__module__}.{cls.__name__}",
+            f"{'endpoint':<62} {'role':<8} {'queries':>13} {'budget':>6} {'ms':>17} {'budget':>7}",
+        ]
+        for key, result in results.items():
+            endpoint, role = key.rsplit(' as ', 1)
+            before = baseline.get(key, {})
+            queries = f"{before.get('queries', '-')} → {result['queries']}"
+            ms = f"{before.get('ms', '-')} → {result['ms']}"
+            lines.append(
+                f"{endpoint:<62} {role:<8} {queries:>13} {result['max_queries']:>6} {ms:>17} {result['max_ms']:>7}"
+            )
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+    def client_for(self, role):
+        client = APIClient()
+        if role is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[role]}')
+        return client
+
+    def measure(self, role, method, path, max_queries, max_ms, data=None, expected_status=None, label=None):
+        """Call path as role with cold caches and assert its query and latency budget; label names ids in path"""
+        client = self.client_for(role)
+        send = getattr(client, method.lower())
+        # Writes run once; reads are repeated and the median time is kept
+        runs = RUNS if method in ('GET', 'HEAD') else 1
+        if runs > 1:
+            send(path, data)
+
+        timings = []
+        for _ in range(runs):
+            reset_caches()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = send(path, data, format='json') if method not in ('GET', 'HEAD') else send(path, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        ms = round(statistics.median(timings), 1)
+        self.results[f'{method} {label or path} as {role or "anonymous"}'] = {
+            'queries': len(queries), 'ms': ms, 'max_queries': max_queries, 'max_ms': max_ms,
+        }
+        if expected_status is not None:
+            self.assertEqual(response.status_code, expected_status)
+        else:
+            self.assertLess(response.status_code, 400, f'{method} {path} as {role}')
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{method} {path} as {role}: {len(queries)} queries\n'
+            + '\n'.join(query['sql'][:200] for query in queries.captured_queries),
+        )
+        self.assertLessEqual(ms, max_ms * LATENCY_FACTOR, f'{method} {path} as {role}: {ms} ms')
+        return response
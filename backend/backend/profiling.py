@@ -0,0 +1,231 @@
+# backend/profiling.py
+"""
+On-demand profiling of a single request, for admins only.
+
+Send `X-Profile: sql` (or `?_profile=sql`) to capture every SQL query made
+while the request is handled: count, total time, and the slowest queries
+with the project frames that issued them. Use `cprofile` instead of `sql` to
+also run the request under cProfile.
+
+The summary comes back as response headers:
+- Server-Timing
+- X-Profile-Slow-<n>
+- X-Profile-Id
+
+The full report is kept in the default cache for PROFILE_REPORT_SECONDS. For
+streaming responses it is stored once the stream ends. Fetch it from
+GET /api/users/request-profiles/<id>/; add `?output=prof` for the raw cProfile
+stats, which pstats or snakeviz can read.
+
+Requests without the flag only pay one dictionary lookup and one substring
+test. Setting REQUEST_PROFILING=False removes the middleware entirely.
+"""
+
+import time
+import traceback
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '_profile='
+MODES = ('sql', 'cprofile')
+SLOWEST = 10
+SLOW_HEADERS = 3
+STATS_LINES = 40
+REPORT_SECONDS = getattr(settings, 'PROFILE_REPORT_SECONDS', 3600)
+
+
+def report_key(profile_id):
+    return f'request-profile:{profile_id}'
+
+
+def stats_key(profile_id):
+    return f'request-profile-stats:{profile_id}'
+
+
+def requested_mode(request):
+    """'sql', 'cprofile' or None; the cheap checks come first"""
+    mode = request.META.get(HEADER)
+    if mode is None and QUERY_FLAG in request.META.get('QUERY_STRING', ''):
+        mode = request.GET.get('_profile')
+    if mode is None:
+        return None
+    mode = mode.strip().lower()
+    return mode if mode in MODES else 'sql'
+
+
+def profiling_user(request):
+    """The requesting admin, authenticated the way the API would, or None"""
+    from rest_framework.exceptions import APIException
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+    from users.authentication import CHAT_AUTHENTICATION_CLASSES
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        user = None
+        drf_request = Request(request)
+        for authentication_class in (*api_settings.DEFAULT_AUTHENTICATION_CLASSES, *CHAT_AUTHENTICATION_CLASSES):
+            try:
+                result = authentication_class().authenticate(drf_request)
+            except APIException:
+                return None
+            if result is not None:
+                user = result[0]
+                break
+    return user if user is not None and user.role == 'ADMIN' else None
+
+
+def query_origin(stack):
+    """The innermost project frames ('path:line in function') behind a query"""
+    base = str(settings.BASE_DIR)
+    frames = [
+        f"{frame.filename[len(base) + 1:]}:{frame.lineno} in {frame.name}"
+        for frame in stack
+        if frame.filename.startswith(base) and '-packages' not in frame.filename and frame.filename != __file__
+    ]
+    return frames[-3:]
+
+
+class QueryRecorder:
+    """connection.execute_wrapper() hook timing every query and remembering where it came from"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'ms': (time.perf_counter() - started) * 1000,
+                'sql': sql,
+                'many': many,
+                'origin': query_origin(traceback.extract_stack()[:-1]),
+            })
+
+    def summary(self):
+        seen = {}
+        for query in self.queries:
+            seen[query['sql']] = seen.get(query['sql'], 0) + 1
+        slowest = sorted(self.queries, key=lambda query: -query['ms'])[:SLOWEST]
+        return {
+            'count': len(self.queries),
+            'ms': round(sum(query['ms'] for query in self.queries), 2),
+            'repeated': {sql: count for sql, count in seen.items() if count > 1},
+            'slowest': [{**query, 'ms': round(query['ms'], 2)} for query in slowest],
+        }
+
+
+class RequestProfile:
+    def __init__(self, request, user, mode):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.user = user
+        self.mode = mode
+        self.recorder = QueryRecorder()
+        self.profiler = None
+        self.stack = ExitStack()
+
+    def start(self):
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self.recorder))
+        if self.mode == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.started = time.perf_counter()
+
+    def stop(self, response):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.stack.close()
+
+        report = {
+            'id': self.id,
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'status': response.status_code,
+            'user': self.user.pk,
+            'mode': self.mode,
+            'ms': round(total_ms, 2),
+            'sql': self.recorder.summary(),
+            'profile': None,
+        }
+        if self.profiler is not None:
+            report['profile'] = self.store_stats()
+        cache.set(report_key(self.id), report, REPORT_SECONDS)
+        return report
+
+    def store_stats(self):
+        """Keep the raw stats for download and return the top of the cumulative listing"""
+        import io
+        import marshal
+        import pstats
+
+        stats = pstats.Stats(self.profiler)
+        cache.set(stats_key(self.id), marshal.dumps(stats.stats), REPORT_SECONDS)
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(STATS_LINES)
+        return out.getvalue()
+
+    def add_headers(self, response, report):
+        sql = report['sql']
+        response['X-Profile-Id'] = self.id
+        response['Server-Timing'] = (
+            f'app;dur={report["ms"]}, sql;dur={sql["ms"]};desc="{sql["count"]} queries"'
+        )
+        for index, query in enumerate(sql['slowest'][:SLOW_HEADERS], 1):
+            origin = query['origin'][-1] if query['origin'] else 'unknown'
+            response[f'X-Profile-Slow-{index}'] = f"{query['ms']}ms {origin}"
+
+    def wrap_stream(self, response):
+        """Keep recording while the body streams; store the report when it ends"""
+        content = response.streaming_content
+
+        def streamed():
+            try:
+                yield from content
+            finally:
+                self.stop(response)
+
+        response.streaming_content = streamed()
+        response['X-Profile-Id'] = self.id
+        return response
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        user = profiling_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profile = RequestProfile(request, user, mode)
+        profile.start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.stack.close()
+            if profile.profiler is not None:
+                profile.profiler.disable()
+            raise
+        if response.streaming:
+            return profile.wrap_stream(response)
+        profile.add_headers(response, profile.stop(response))
+        return response
@@ -0,0 +1,113 @@
+# backend/routers.py
+
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+PRIMARY_DB = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_primary = ContextVar('use_primary', default=False)
+
+
+def get_replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary database"""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def release_connections():
+    """
+    Close this thread's open DB connections (returning them to the pool when
+    pooling is enabled). Connections inside an atomic block are left alone.
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+class PrimaryDatabaseMixin:
+    """
+    View mixin for consistency-critical endpoints: all reads made while
+    handling the request go to the primary database.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_primary():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary. Reads go to a random replica unless the
+    current request is pinned to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replica_aliases()
+        if not replicas or _use_primary.get():
+            return PRIMARY_DB
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so every alias holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Read-your-writes: after a client makes a successful write, pin that
+    client's requests to the primary for DB_PRIMARY_STICKY_SECONDS so
+    replica lag never hides their own changes.
+
+    Clients are identified by their Authorization header or session cookie,
+    since DRF token authentication only runs later, inside the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replica_aliases():
+            return self.get_response(request)
+
+        pin_key = self.get_pin_key(request)
+        pinned = request.method not in SAFE_METHODS or (
+            pin_key is not None and cache.get(pin_key) is not None
+        )
+
+        token = _use_primary.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+        if pin_key and request.method not in SAFE_METHODS and response.status_code < 400:
+            cache.set(pin_key, 1, timeout=settings.DB_PRIMARY_STICKY_SECONDS)
+        return response
+
+    def get_pin_key(self, request):
+        credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credential:
+            return None
+        digest = hashlib.sha256(credential.encode()).hexdigest()
+        return f'db-primary-pin:{digest}'
@@ -1,6 +1,7 @@
 # import dj_database_url
 from decouple import config
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -17,12 +18,14 @@ ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='*').split(',')
 # Application definition
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
+    # Admin modules are autodiscovered on the first /admin/ request (backend/admin_urls.py)
+    "django.contrib.admin.apps.SimpleAdminConfig",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "corsheaders",
@@ -32,7 +35,6 @@ INSTALLED_APPS = [
     "allauth.socialaccount",
     "dj_rest_auth.registration",
     'django.contrib.sites',
-    "allauth.socialaccount.providers.google",
     "users",
     "learners",
     "chat",
@@ -42,28 +44,101 @@ INSTALLED_APPS = [
     "prompts"
 ]
 
+# Social login providers (comma-separated allauth provider names). Google stays
+# enabled by default so configured SocialApps keep working; each provider is
+# imported at startup, so deployments without social login can set this empty.
+# Their URLs are only imported on first use, see backend/urls.py
+INSTALLED_APPS += [
+    f"allauth.socialaccount.providers.{provider.strip()}"
+    for provider in config('SOCIAL_LOGIN_PROVIDERS', default='google').split(',') if provider.strip()
+]
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "backend.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "backend.routers.PrimaryStickinessMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "backend.profiling.RequestProfilingMiddleware",
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # 'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.fastjson.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.fastjson.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
+# Shared cache for relationships and rendered responses; set REDIS_URL (needs the
+# redis package) whenever more than one worker process serves requests
+if config('REDIS_URL', default=''):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+        }
+    }
+
+# Rendered GET responses of /me/, /profile/ and the conversation list (0 disables).
+# Without REDIS_URL entries are kept for at most 5 seconds, see users/response_cache.py
+RESPONSE_CACHE_SECONDS = config('RESPONSE_CACHE_SECONDS', default=300, cast=int)
+
+# Chat limits (POST .../messages/), see learners/quotas.py; 0 disables a limit.
+# Parents and teachers can lower the learner values per learner (0 pauses chat).
+LEARNER_MESSAGES_PER_MINUTE = config('LEARNER_MESSAGES_PER_MINUTE', default=10, cast=int)
+LEARNER_DAILY_TOKENS = config('LEARNER_DAILY_TOKENS', default=50000, cast=int)
+SCHOOL_MESSAGES_PER_MINUTE = config('SCHOOL_MESSAGES_PER_MINUTE', default=300, cast=int)
+SCHOOL_DAILY_TOKENS = config('SCHOOL_DAILY_TOKENS', default=2000000, cast=int)
+# 'local' counts in each process, 'cache' shares the counters through the default cache
+QUOTA_COUNTER_STORE = config('QUOTA_COUNTER_STORE', default='cache' if config('REDIS_URL', default='') else 'local')
+
+# Message bodies at least this many UTF-8 bytes are zstd-compressed with the
+# grade's trained dictionary (see learners/compression.py)
+MESSAGE_COMPRESSION_MIN_BYTES = config('MESSAGE_COMPRESSION_MIN_BYTES', default=256, cast=int)
+
+# Frequent opening questions are answered from the answer bank built by
+# `build_answer_bank` (see learners/answer_bank.py); entries older than
+# ANSWER_BANK_MAX_AGE_DAYS are not served until the job refreshes them
+ANSWER_BANK = config('ANSWER_BANK', default=True, cast=bool)
+ANSWER_BANK_MAX_AGE_DAYS = config('ANSWER_BANK_MAX_AGE_DAYS', default=30, cast=int)
+
+# Admins can profile one request with `X-Profile: sql|cprofile` (see backend/profiling.py);
+# reports are kept this many seconds
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=True, cast=bool)
+PROFILE_REPORT_SECONDS = config('PROFILE_REPORT_SECONDS', default=3600, cast=int)
+
+# Token → user lookups are cached in-process for this many seconds; a deleted
+# token keeps working in the other worker processes for up to this long
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=15, cast=int)
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int)
+
+# Stateless signed access tokens for the chat endpoints (POST /api/users/access-token/).
+# They cannot be revoked, so keep them short-lived.
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
-    # you can customize token lifetime here if you like
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('ACCESS_TOKEN_MINUTES', default=5, cast=int)),
 }
 
 SITE_ID = 1
@@ -74,7 +149,8 @@ TOGETHER_MODEL = config('TOGETHER_MODEL', default="mistralai/Mixtral-8x7B-Instru
 
 
 REST_AUTH = {
-    'REGISTER_SERIALIZER': 'users.serializers.CustomRegisterSerializer',
+    'REGISTER_SERIALIZER': 'users.registration.CustomRegisterSerializer',
+    'LOGIN_SERIALIZER': 'users.serializers.UsernameEmailLoginSerializer',
 }
 
 # Allauth configuration
@@ -195,6 +271,37 @@ DATABASES = {
     }
 }
 
+# Connection reuse. With DB_POOL the psycopg connection pool hands connections
+# out per use (closing a connection returns it to the pool); otherwise each
+# worker keeps a persistent connection that is health-checked before reuse.
+if config('DB_POOL', default=False, cast=bool):
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            'check': ConnectionPool.check_connection,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = config('CONN_MAX_AGE', default=60, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Optional read replicas (comma-separated hosts). Safe reads are spread across
+# them; writes and consistency-critical views always use the primary.
+DATABASE_REPLICAS = []
+for index, host in enumerate(h.strip() for h in config('PGREPLICA_HOSTS', default='').split(',') if h.strip()):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.routers.PrimaryReplicaRouter']
+
+# How long a client keeps reading from the primary after a write (read-your-writes)
+DB_PRIMARY_STICKY_SECONDS = config('DB_PRIMARY_STICKY_SECONDS', default=5, cast=int)
+
 
 
 # Password validation
@@ -234,3 +341,10 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = 'users.User'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Profile photos: header-checked on upload, resized in a small worker pool
+PROFILE_PHOTO_MAX_BYTES = config('PROFILE_PHOTO_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+PROFILE_PHOTO_WORKERS = config('PROFILE_PHOTO_WORKERS', default=2, cast=int)
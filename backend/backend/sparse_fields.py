@@ -0,0 +1,114 @@
+# backend/sparse_fields.py
+"""
+Sparse fieldsets and relation expansion for GET responses.
+
+    ?fields=id,title,messages.text   only these fields (dotted names reach nested serializers)
+    ?expand=user,teacher             swap these relations (Meta.expandable_fields) for nested objects
+
+Fields that are not requested are removed from the serializer before it
+runs, so their sources, method fields and nested serializers are never
+evaluated. Views use field_requested() / expanded() to decide what to
+prefetch. Names the serializer does not have are rejected with a 400.
+"""
+
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def parse_params(request):
+    """(fields or None, expand) from the query string of a GET request"""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None, []
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    fields = _split(params.get('fields')) or None
+    return fields, _split(params.get('expand'))
+
+
+def field_requested(request, name):
+    fields, expand = parse_params(request)
+    return fields is None or name in expand or any(field.split('.')[0] == name for field in fields)
+
+
+def expanded(request, name):
+    return name in parse_params(request)[1]
+
+
+def expands_relations(request):
+    """
+    Whether the request expands any relation. ETags and the response cache are
+    versioned by the main row only, so views serve such responses uncached.
+    """
+    return bool(parse_params(request)[1])
+
+
+def _nested(specs):
+    """Split ['a', 'b.c', 'b.d'] into ({'a', 'b'}, {'b': ['c', 'd']})"""
+    top, nested = set(), {}
+    for spec in specs:
+        head, _, rest = spec.partition('.')
+        top.add(head)
+        if rest:
+            nested.setdefault(head, []).append(rest)
+    return top, nested
+
+
+def _reject(param, prefix, names):
+    if names:
+        problem = 'Unknown field(s)' if param == 'fields' else 'Cannot expand'
+        names = ', '.join(sorted(prefix + name for name in names))
+        raise ValidationError({param: [f'{problem}: {names}']})
+
+
+def restrict(serializer, fields=None, expand=(), prefix=''):
+    """Apply a fieldset and expansions to a serializer instance in place"""
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    expand_top, expand_nested = _nested(expand)
+    expandable = getattr(getattr(serializer, 'Meta', None), 'expandable_fields', {})
+    # Besides Meta.expandable_fields, expand may reach into nested serializers
+    _reject('expand', prefix, expand_top - set(expandable) - set(expand_nested))
+    for name in expand_top & set(expandable):
+        serializer_class, options = expandable[name]
+        if isinstance(serializer_class, str):
+            serializer_class = import_string(serializer_class)
+        serializer.fields[name] = serializer_class(read_only=True, **options)
+
+    if fields is not None:
+        wanted, nested_fields = _nested(fields)
+        _reject('fields', prefix, wanted - set(serializer.fields))
+        wanted |= expand_top & set(expandable)
+        for name in set(serializer.fields) - wanted:
+            serializer.fields.pop(name)
+    else:
+        nested_fields = {}
+
+    for name in set(nested_fields) | set(expand_nested):
+        field = serializer.fields.get(name)
+        if field is not None and (hasattr(field, 'fields') or isinstance(field, ListSerializer)):
+            restrict(field, nested_fields.get(name), expand_nested.get(name, ()), f'{prefix}{name}.')
+        else:
+            _reject('expand' if name in expand_nested else 'fields', prefix, [name])
+
+
+def apply_request_fields(serializer, request):
+    """restrict() from the request's query string, for serializers built without a request context"""
+    fields, expand = parse_params(request)
+    if fields is not None or expand:
+        restrict(serializer, fields, expand)
+    return serializer
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin: honours ?fields= and ?expand= on the request in the
+    serializer context. Only the top-level serializer reads the query string.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        apply_request_fields(self, self.context.get('request'))
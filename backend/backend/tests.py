@@ -0,0 +1,125 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from learners.models import LearnerPrompt, Response
+from learners.serializers import ConversationSerializer
+from users.models import User
+from .routers import PRIMARY_DB, PrimaryReplicaRouter, PrimaryStickinessMiddleware, use_primary
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_a_replica_unless_pinned(self):
+        self.assertEqual(self.router.db_for_read(User), 'replica_0')
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(User), PRIMARY_DB)
+        self.assertEqual(self.router.db_for_read(User), 'replica_0')
+
+    def test_writes_and_migrations_stay_on_the_primary(self):
+        self.assertEqual(self.router.db_for_write(User), PRIMARY_DB)
+        self.assertTrue(self.router.allow_migrate(PRIMARY_DB, 'users'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'users'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_reads_from_the_primary(self):
+        self.assertEqual(self.router.db_for_read(User), PRIMARY_DB)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DB_PRIMARY_STICKY_SECONDS=5)
+class PrimaryStickinessMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.status = 200
+        self.read_from = []
+        self.middleware = PrimaryStickinessMiddleware(self.respond)
+
+    def respond(self, request):
+        self.read_from.append(PrimaryReplicaRouter().db_for_read(User))
+        return HttpResponse(status=self.status)
+
+    def call(self, method, token='Token one'):
+        request = getattr(self.factory, method)('/api/learners/conversations/', HTTP_AUTHORIZATION=token)
+        self.middleware(request)
+        return self.read_from[-1]
+
+    def test_a_write_pins_that_clients_reads_to_the_primary(self):
+        self.assertEqual(self.call('get'), 'replica_0')
+        self.assertEqual(self.call('post'), PRIMARY_DB)
+        self.assertEqual(self.call('get'), PRIMARY_DB)
+        self.assertEqual(self.call('get', token='Token two'), 'replica_0')
+
+    def test_failed_writes_do_not_pin(self):
+        self.status = 400
+        self.assertEqual(self.call('patch'), PRIMARY_DB)
+        self.status = 200
+        self.assertEqual(self.call('get'), 'replica_0')
+
+    def test_pin_lasts_for_the_sticky_window(self):
+        with mock.patch('backend.routers.cache.set') as set_pin:
+            self.call('delete')
+        key = self.middleware.get_pin_key(self.factory.get('/', HTTP_AUTHORIZATION='Token one'))
+        set_pin.assert_called_once_with(key, 1, timeout=5)
+
+    def test_anonymous_reads_are_never_pinned(self):
+        self.call('post', token='')
+        self.assertEqual(self.call('get', token=''), 'replica_0')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_nothing_is_pinned(self):
+        self.call('post')
+        self.assertIsNone(cache.get(self.middleware.get_pin_key(self.factory.get('/', HTTP_AUTHORIZATION='Token one'))))
+
+
+class SparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.learner = User.objects.create(username='sparse-learner', email='sparse-learner@example.com', role=User.Role.LEARNER)
+        cls.conversation = LearnerPrompt.objects.create(learner=cls.learner, text='Hi', title='Hi')
+        for role, text in (('user', 'Hi'), ('assistant', 'Hello!')):
+            Response.objects.create(prompt=cls.conversation, role=role, text=text)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+        self.path = f'/api/learners/conversations/{self.conversation.pk}/'
+
+    def get(self, path, expected_status=200, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, expected_status, response.content)
+        return response.json()
+
+    def test_fields_limit_the_response(self):
+        with mock.patch.object(ConversationSerializer, 'get_last_message') as get_last_message:
+            self.assertEqual(self.get(self.path, fields='id,title'), {'id': self.conversation.pk, 'title': 'Hi'})
+        get_last_message.assert_not_called()
+
+        body = self.get(self.path, fields='id,messages.role,messages.text')
+        self.assertEqual(body['messages'], [{'role': 'user', 'text': 'Hi'}, {'role': 'assistant', 'text': 'Hello!'}])
+        self.assertEqual(self.get('/api/users/me/', fields='username'), {'username': 'sparse-learner'})
+
+    def test_expand_nests_the_relation(self):
+        self.assertNotIn('learner', self.get(self.path))
+        body = self.get(self.path, fields='id,learner.username', expand='learner')
+        self.assertEqual(body, {'id': self.conversation.pk, 'learner': {'username': 'sparse-learner'}})
+
+    def test_unknown_names_are_rejected(self):
+        for params, error in (
+            ({'fields': 'id,bogus'}, {'fields': ['Unknown field(s): bogus']}),
+            ({'fields': 'id,messages.bogus'}, {'fields': ['Unknown field(s): messages.bogus']}),
+            ({'fields': 'title.length'}, {'fields': ['Unknown field(s): title']}),
+            ({'expand': 'title'}, {'expand': ['Cannot expand: title']}),
+            ({'expand': 'messages.prompt'}, {'expand': ['Cannot expand: messages.prompt']}),
+            ({'expand': 'learner.teacher'}, {'expand': ['Cannot expand: learner.teacher']}),
+        ):
+            self.assertEqual(self.get(self.path, expected_status=400, **params), error, params)
+        self.assertEqual(self.get('/api/users/me/', expected_status=400, fields='secret'), {'fields': ['Unknown field(s): secret']})
+        self.get('/api/learners/conversations/', expected_status=400, fields='bogus')
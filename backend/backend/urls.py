@@ -1,17 +1,29 @@
 # backend/urls.py
 
-from django.contrib import admin
+from django.conf import settings
+from django.conf.urls.static import static
 from django.urls import path, include
+from django.urls.resolvers import RoutePattern, URLResolver
+
+
+def lazy_include(route, urlconf, namespace=None):
+    """
+    path(route, include(urlconf)) without importing urlconf until a request
+    under route (or a reverse()) needs it, keeping rarely used stacks out of
+    cold start.
+    """
+    return URLResolver(RoutePattern(route, is_endpoint=False), urlconf, app_name=namespace, namespace=namespace)
+
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    lazy_include('admin/', 'backend.admin_urls', namespace='admin'),
 
     # dj-rest-auth endpoints
-    path('api/auth/', include('dj_rest_auth.urls')),
-    path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
+    lazy_include('api/auth/', 'dj_rest_auth.urls'),
+    lazy_include('api/auth/registration/', 'dj_rest_auth.registration.urls'),
 
     # (Optional) email confirmation via allauth
-    path('api/auth/', include('allauth.urls')),  
+    lazy_include('api/auth/', 'allauth.urls'),
 
     path('api/users/', include('users.urls')),
 
@@ -22,3 +34,7 @@ urlpatterns = [
 
 
 ]
+
+# Serve uploaded media in development
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
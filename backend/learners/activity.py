@@ -0,0 +1,122 @@
+# learners/activity.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, DurationField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import localdate
+
+from .archive import decode_payload
+from .models import ArchivedConversation, LearnerDailyActivity, LearnerPrompt, Response
+
+# Events closer together than IDLE_GAP count as continuous activity; an event
+# after a longer pause starts a new session worth SESSION_CREDIT.
+IDLE_GAP = timedelta(minutes=5)
+SESSION_CREDIT = timedelta(minutes=1)
+
+
+def record_activity(learner_id, at, messages=0, answers=0, answer_characters=0, conversations=0):
+    """Fold one event into the learner's rollup row for that day (one UPDATE in the common case)"""
+    day = localdate(at)
+    active_credit = Case(
+        When(
+            last_activity_at__gte=at - IDLE_GAP,
+            last_activity_at__lte=at,
+            then=Value(at) - F('last_activity_at'),
+        ),
+        default=Value(SESSION_CREDIT),
+        output_field=DurationField(),
+    )
+    updated = LearnerDailyActivity.objects.filter(learner_id=learner_id, date=day).update(
+        message_count=F('message_count') + messages,
+        answer_count=F('answer_count') + answers,
+        answer_characters=F('answer_characters') + answer_characters,
+        conversations_started=F('conversations_started') + conversations,
+        active_time=F('active_time') + active_credit,
+        last_activity_at=Greatest(F('last_activity_at'), Value(at)),
+    )
+    if updated:
+        return
+
+    try:
+        with transaction.atomic():
+            LearnerDailyActivity.objects.create(
+                learner_id=learner_id,
+                date=day,
+                message_count=messages,
+                answer_count=answers,
+                answer_characters=answer_characters,
+                conversations_started=conversations,
+                active_time=SESSION_CREDIT,
+                last_activity_at=at,
+            )
+    except IntegrityError:
+        # Another request created today's row first
+        record_activity(learner_id, at, messages, answers, answer_characters, conversations)
+
+
+def rebuild_activity(start, end=None):
+    """
+    Recompute the rollup rows for dates in [start, end] from the raw tables.
+    Used to backfill and to repair drift; returns the number of rows written.
+
+    `end` defaults to yesterday: today's rows are still being incremented by
+    record_activity(). Rebuilding today explicitly locks the rollup table for
+    the whole rebuild, so increments wait and land on the rebuilt rows rather
+    than being lost. A message saved just before the lock may then be counted
+    twice until the next rebuild.
+    """
+    today = localdate()
+    if end is None:
+        end = today - timedelta(days=1)
+    with transaction.atomic():
+        if end >= today:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {LearnerDailyActivity._meta.db_table} IN EXCLUSIVE MODE")
+        return _rebuild(start, end)
+
+
+def _rebuild(start, end):
+    conversations = LearnerPrompt.objects.filter(created_at__date__gte=start, created_at__date__lte=end)
+    messages = Response.objects.filter(created_at__date__gte=start, created_at__date__lte=end)
+
+    events = defaultdict(list)
+    for learner_id, created_at in conversations.values_list('learner_id', 'created_at').iterator():
+        events[(learner_id, localdate(created_at))].append((created_at, 'conversation', 0))
+    rows = messages.values_list('prompt__learner_id', 'created_at', 'role', 'blob__length')
+    for learner_id, created_at, role, length in rows.iterator():
+        events[(learner_id, localdate(created_at))].append((created_at, role, length))
+    # Archived messages left learners_response; they are all older than their archive
+    archives = ArchivedConversation.objects.filter(archived_at__date__gte=start)
+    for learner_id, payload in archives.values_list('conversation__learner_id', 'payload').iterator():
+        for message in decode_payload(payload):
+            created_at = parse_datetime(message['created_at'])
+            day = localdate(created_at)
+            if start <= day <= end:
+                events[(learner_id, day)].append((created_at, message['role'], len(message['text'])))
+
+    rollups = []
+    for (learner_id, day), day_events in events.items():
+        rollup = LearnerDailyActivity(learner_id=learner_id, date=day)
+        for at, kind, length in sorted(day_events):
+            if kind == 'conversation':
+                rollup.conversations_started += 1
+            elif kind == 'user':
+                rollup.message_count += 1
+            else:
+                rollup.answer_count += 1
+                rollup.answer_characters += length
+
+            last = rollup.last_activity_at
+            if last is not None and at - IDLE_GAP <= last <= at:
+                rollup.active_time += at - last
+            else:
+                rollup.active_time += SESSION_CREDIT
+            rollup.last_activity_at = at
+        rollups.append(rollup)
+
+    LearnerDailyActivity.objects.filter(date__gte=start, date__lte=end).delete()
+    LearnerDailyActivity.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
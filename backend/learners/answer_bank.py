@@ -0,0 +1,193 @@
+# learners/answer_bank.py
+"""
+Pre-generated answers to the most frequent opening questions of each grade.
+
+`build_answer_bank` mines learners' messages for the questions asked most
+often per grade (compared after normalize_prompt()), generates an answer for
+each with a bounded number of concurrent AI requests and stores them in
+BankedAnswer. generate_ai_response() serves a match for the first question of
+a conversation without calling the AI service; banked answers are generated
+without conversation context, so later turns always go to the model.
+
+An entry is served only while it was generated by the configured model and
+services.PROMPT_VERSION, and is younger than ANSWER_BANK_MAX_AGE_DAYS; the job
+regenerates entries before that.
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.timezone import now
+
+from .compression import decompress
+from .models import BankedAnswer, MessageBlob, Response
+
+KEY_LENGTH = 255
+MIN_WORDS = 3
+# Longer messages are pasted homework or context-specific, not common questions
+MAX_PROMPT_CHARS = 200
+# Lookups (including misses) are cached for this long; a rebuilt bank is served within it
+CACHE_SECONDS = 300
+
+
+@dataclass
+class Candidate:
+    grade: str
+    prompt_key: str
+    prompt: str
+    occurrences: int
+
+
+def normalize_prompt(text):
+    """Case-folded words without punctuation, single-spaced; questions with the same key share an answer"""
+    words = re.findall(r'\w+', unicodedata.normalize('NFKC', text).casefold())
+    return ' '.join(words)[:KEY_LENGTH]
+
+
+def max_age():
+    return timedelta(days=settings.ANSWER_BANK_MAX_AGE_DAYS)
+
+
+def current_entries():
+    """Entries that may be served: generated by the current model and prompt, and not too old"""
+    from .services import PROMPT_VERSION
+
+    return BankedAnswer.objects.filter(
+        model=settings.TOGETHER_MODEL, prompt_version=PROMPT_VERSION, generated_at__gte=now() - max_age(),
+    )
+
+
+def lookup(prompt_text, grade):
+    """The banked answer for a learner's opening question, or None"""
+    if not settings.ANSWER_BANK or not grade or len(prompt_text) > MAX_PROMPT_CHARS:
+        return None
+    prompt_key = normalize_prompt(prompt_text)
+    if not prompt_key:
+        return None
+
+    from .services import PROMPT_VERSION
+
+    digest = hashlib.sha1(f"{settings.TOGETHER_MODEL}:{PROMPT_VERSION}:{prompt_key}".encode('utf-8')).hexdigest()
+    cache_key = f"answer-bank:{grade}:{digest}"
+    answer = cache.get(cache_key)
+    if answer is None:
+        answer = current_entries().filter(grade=grade, prompt_key=prompt_key).values_list('answer', flat=True).first()
+        # '' caches a miss
+        cache.set(cache_key, answer or '', CACHE_SECONDS)
+    return answer or None
+
+
+def mine(since, top, min_count, grades=None):
+    """The `top` most frequent questions per grade asked at least `min_count` times since then"""
+    from .services import is_greeting_message
+
+    # Identical texts share a blob, so exact repeats are counted in the database;
+    # variants differing in case or punctuation are merged below
+    rows = (
+        Response.objects
+        .filter(role='user', created_at__gte=since, blob__length__lte=MAX_PROMPT_CHARS)
+        .exclude(prompt__learner__grade='')
+        .values_list('prompt__learner__grade', 'blob_id')
+        .annotate(count=Count('id'))
+    )
+    if grades:
+        rows = rows.filter(prompt__learner__grade__in=grades)
+    rows = list(rows)
+    texts = {
+        blob_id: decompress(text)
+        for blob_id, text in MessageBlob.objects.filter(id__in={blob_id for _, blob_id, _ in rows}).values_list('id', 'text')
+    }
+
+    wordings = defaultdict(Counter)  # (grade, key) -> wording -> count
+    for grade, blob_id, count in rows:
+        text = texts[blob_id].strip()
+        prompt_key = normalize_prompt(text)
+        # Greetings never reach the bank lookup, see generate_ai_response()
+        if len(prompt_key.split()) < MIN_WORDS or is_greeting_message(text):
+            continue
+        wordings[grade, prompt_key][text] += count
+
+    by_grade = defaultdict(list)
+    for (grade, prompt_key), counts in wordings.items():
+        occurrences = sum(counts.values())
+        if occurrences >= min_count:
+            prompt = counts.most_common(1)[0][0]
+            by_grade[grade].append(Candidate(grade, prompt_key, prompt, occurrences))
+    return {
+        grade: sorted(candidates, key=lambda candidate: -candidate.occurrences)[:top]
+        for grade, candidates in sorted(by_grade.items())
+    }
+
+
+def needs_generation(entry, refresh_before):
+    from .services import PROMPT_VERSION
+
+    return (
+        entry is None
+        or entry.model != settings.TOGETHER_MODEL
+        or entry.prompt_version != PROMPT_VERSION
+        or entry.generated_at < refresh_before
+    )
+
+
+def refresh(candidates, concurrency, refresh_before, dry_run=False):
+    """
+    Store the mined questions of the grades, generating answers for those
+    without a current entry, and drop the grades' entries no longer mined.
+    Returns counts of generated, kept, failed and removed entries.
+    """
+    from .services import PROMPT_VERSION, GenerationError, fetch_completion
+
+    mined_at = now()
+    grades = {candidate.grade for candidate in candidates}
+    existing = {
+        (entry.grade, entry.prompt_key): entry
+        for entry in BankedAnswer.objects.filter(grade__in=grades)
+    }
+    pending = [
+        candidate for candidate in candidates
+        if needs_generation(existing.get((candidate.grade, candidate.prompt_key)), refresh_before)
+    ]
+    mined = {(candidate.grade, candidate.prompt_key) for candidate in candidates}
+    stale = [entry.pk for key, entry in existing.items() if key not in mined]
+    counts = {'generated': 0, 'kept': len(candidates) - len(pending), 'failed': 0, 'removed': len(stale)}
+    if dry_run:
+        counts['generated'] = len(pending)
+        return counts
+
+    def generate(candidate):
+        try:
+            return fetch_completion(candidate.prompt, candidate.grade)
+        except GenerationError:
+            return None
+
+    # Workers only talk to the AI service; all database writes happen here
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        answers = dict(zip([(candidate.grade, candidate.prompt_key) for candidate in pending], executor.map(generate, pending)))
+
+    for candidate in candidates:
+        key = (candidate.grade, candidate.prompt_key)
+        fields = {'prompt': candidate.prompt, 'occurrences': candidate.occurrences, 'mined_at': mined_at}
+        if key in answers:
+            answer = answers[key]
+            if not answer:
+                counts['failed'] += 1
+                # An older answer, if any, stays until it is too old to be served
+                BankedAnswer.objects.filter(grade=candidate.grade, prompt_key=candidate.prompt_key).update(**fields)
+                continue
+            fields.update(
+                answer=answer, model=settings.TOGETHER_MODEL, prompt_version=PROMPT_VERSION, generated_at=now(),
+            )
+            counts['generated'] += 1
+        BankedAnswer.objects.update_or_create(grade=candidate.grade, prompt_key=candidate.prompt_key, defaults=fields)
+
+    BankedAnswer.objects.filter(pk__in=stale).delete()
+    return counts
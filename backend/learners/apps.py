@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LearnersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "learners"
+
+    def ready(self):
+        import learners.signals
+        import learners.quotas
@@ -0,0 +1,169 @@
+# learners/archive.py
+import json
+import zlib
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from backend.routers import PRIMARY_DB, use_primary
+from users.response_cache import ALL_CONVERSATIONS, bump
+from .compression import decompress
+from .models import ArchivedConversation, LearnerPrompt, Response
+
+COMPRESSION_LEVEL = 9
+
+
+def archive_conversation(conversation):
+    """
+    Move a conversation's messages into a compressed ArchivedConversation row.
+    The activity rollups keep counting the messages (rebuild_activity reads
+    archives too), and restoring them does not count them again.
+    """
+    with transaction.atomic():
+        messages = list(
+            Response.objects
+            .filter(prompt=conversation)
+            .order_by('created_at', 'id')
+            .values('id', 'role', 'created_at', text=F('blob__text'))
+        )
+        for message in messages:
+            message['created_at'] = message['created_at'].isoformat()
+            message['text'] = decompress(message['text'])
+
+        payload = zlib.compress(json.dumps(messages).encode('utf-8'), COMPRESSION_LEVEL)
+        ArchivedConversation.objects.create(
+            conversation=conversation,
+            payload=payload,
+            message_count=len(messages),
+            last_message=messages[-1]['text'] if messages else None,
+        )
+        Response.objects.filter(prompt=conversation).delete()
+        # update() rather than save() so updated_at (and list ordering) is untouched
+        LearnerPrompt.objects.filter(pk=conversation.pk).update(archived_at=now())
+        # update() and the fast delete send no signals for the response cache
+        transaction.on_commit(lambda: bump(f'conversations:{conversation.learner_id}', ALL_CONVERSATIONS))
+    return len(messages)
+
+
+def decode_payload(payload):
+    """The messages stored in an ArchivedConversation payload"""
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+def load_archived_messages(conversation):
+    """Decode an archived conversation's messages without restoring them"""
+    return decode_payload(conversation.archive.payload)
+
+
+def restore_conversation(conversation):
+    """
+    Move an archived conversation's messages back into the live table. Writes,
+    so only call it from write requests; reads serve the archive as it is.
+    """
+    if conversation.archived_at is None:
+        return conversation
+
+    # The locking read must not be routed to a replica
+    with use_primary(), transaction.atomic(using=PRIMARY_DB):
+        archive = ArchivedConversation.objects.select_for_update().filter(conversation=conversation).first()
+        if archive is not None:
+            messages = decode_payload(archive.payload)
+            created = Response.objects.bulk_create([
+                Response(id=message['id'], prompt=conversation, role=message['role'], text=message['text'])
+                for message in messages
+            ])
+            # bulk_create applies auto_now_add, so put the original timestamps back
+            for response, message in zip(created, messages):
+                response.created_at = parse_datetime(message['created_at'])
+            Response.objects.bulk_update(created, ['created_at'])
+            archive.delete()
+
+        conversation.archived_at = None
+        conversation.restored_at = now()
+        LearnerPrompt.objects.filter(pk=conversation.pk).update(
+            archived_at=None,
+            restored_at=conversation.restored_at,
+        )
+        transaction.on_commit(
+            lambda: bump(f'conversations:{conversation.learner_id}', ALL_CONVERSATIONS), using=PRIMARY_DB,
+        )
+    return conversation
+
+
+def ensure_response_partitions(months_ahead=3):
+    """
+    Create the monthly learners_response partitions for the current month and
+    the next `months_ahead` months. Returns the names of partitions created.
+
+    Rows written for a month before its partition exists land in the default
+    partition, and PostgreSQL refuses a new partition overlapping rows there.
+    Those rows are moved into the new partition while the default one is
+    detached.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+
+    created = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT to_char(month, 'YYYY_MM'), month, month + interval '1 month'
+            FROM generate_series(
+                date_trunc('month', now()),
+                date_trunc('month', now()) + make_interval(months => %s),
+                interval '1 month'
+            ) AS month
+            """,
+            [months_ahead],
+        )
+        for suffix, start, end in cursor.fetchall():
+            name = f'learners_response_p{suffix}'
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            with transaction.atomic():
+                cursor.execute(
+                    "SELECT EXISTS (SELECT 1 FROM learners_response_default WHERE created_at >= %s AND created_at < %s)",
+                    [start, end],
+                )
+                if cursor.fetchone()[0]:
+                    _split_default_partition(cursor, name, start, end)
+                else:
+                    cursor.execute(
+                        f"CREATE TABLE {name} PARTITION OF learners_response FOR VALUES FROM (%s) TO (%s)",
+                        [start, end],
+                    )
+            created.append(name)
+    return created
+
+
+def _split_default_partition(cursor, name, start, end):
+    """Create the partition for [start, end) and move its rows out of the default partition"""
+    cursor.execute(
+        """
+        SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum)
+        FROM pg_attribute
+        WHERE attrelid = 'learners_response'::regclass AND attnum > 0 AND NOT attisdropped
+        """
+    )
+    columns = cursor.fetchone()[0]
+    cursor.execute("ALTER TABLE learners_response DETACH PARTITION learners_response_default")
+    cursor.execute(
+        f"CREATE TABLE {name} PARTITION OF learners_response FOR VALUES FROM (%s) TO (%s)",
+        [start, end],
+    )
+    # Straight from table to table: the statement-level ref_count triggers on
+    # learners_response do not fire, and the moved rows keep their blobs
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM learners_response_default WHERE created_at >= %s AND created_at < %s
+            RETURNING {columns}
+        )
+        INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+        """,
+        [start, end],
+    )
+    cursor.execute("ALTER TABLE learners_response ATTACH PARTITION learners_response_default DEFAULT")
@@ -0,0 +1,150 @@
+# learners/blobs.py
+"""
+Content-addressed storage of message bodies.
+
+Each distinct text is stored once in MessageBlob, keyed by its SHA-256, and
+every Response points at its blob. Response.text reads and writes through
+the blob. Inserts (save and bulk_create) look the text up and add it if it
+is new. Bodies are stored compressed (see learners/compression.py); full-text
+search runs over the search vectors stored with them.
+
+Statement-level triggers on learners_response (migration 0012) keep
+MessageBlob.ref_count exact for every insert, delete (archiving included) and
+blob change made through that table. Dropping or truncating a partition
+bypasses them; run `gc_message_blobs --recount` afterwards. A blob at zero
+references is garbage. collect_garbage() deletes such blobs once they are
+older than a grace period, because a new blob is interned just before its
+first message is inserted and may briefly sit at zero.
+"""
+
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils.timezone import now
+
+from .models import MessageBlob
+
+GRACE = timedelta(hours=1)
+BATCH_SIZE = 1000
+RELATIONS = ('learners_response', 'learners_messageblob')
+
+
+def recount():
+    """Recompute every ref_count from learners_response; returns the number of blobs corrected"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Hold off message inserts and deletes while the counts are rebuilt
+        cursor.execute("LOCK TABLE learners_response IN SHARE MODE")
+        cursor.execute(
+            """
+            UPDATE learners_messageblob AS blob
+            SET ref_count = counts.actual
+            FROM (
+                SELECT blob.id, count(response.blob_id) AS actual
+                FROM learners_messageblob AS blob
+                LEFT JOIN learners_response AS response ON response.blob_id = blob.id
+                GROUP BY blob.id
+            ) AS counts
+            WHERE counts.id = blob.id AND blob.ref_count <> counts.actual
+            """
+        )
+        return cursor.rowcount
+
+
+def collect_garbage(grace=GRACE, dry_run=False, batch_size=BATCH_SIZE):
+    """Delete blobs no message references; returns (blobs, characters of text) removed"""
+    candidates = MessageBlob.objects.filter(ref_count=0, created_at__lt=now() - grace)
+    if dry_run:
+        totals = candidates.aggregate(blobs=Count('id'), size=Sum('length'))
+        return totals['blobs'] or 0, totals['size'] or 0
+
+    blobs = size = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                candidates.select_for_update(skip_locked=True)
+                .values_list('id', 'length')[:batch_size]
+            )
+            if not batch:
+                return blobs, size
+            # PROTECT on Response.blob re-checks that nothing points at them
+            MessageBlob.objects.filter(id__in=[blob_id for blob_id, _ in batch], ref_count=0).delete()
+            blobs += len(batch)
+            size += sum(length for _, length in batch)
+
+
+def headlines(texts, terms):
+    """ts_headline() snippets of the given texts for a web-search query, in one round trip"""
+    if not texts:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT ts_headline('english', text, websearch_to_tsquery('english', %s), 'MaxWords=30, MinWords=10')
+            FROM unnest(%s::text[]) WITH ORDINALITY AS texts(text, position)
+            ORDER BY position
+            """,
+            [terms, list(texts)],
+        )
+        return [headline for headline, in cursor.fetchall()]
+
+
+def relation_sizes(name):
+    """(table bytes, index bytes) of a table, summed over its partitions if it has any"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT coalesce(sum(pg_table_size(relid)), 0), coalesce(sum(pg_indexes_size(relid)), 0)
+            FROM (SELECT relid FROM pg_partition_tree(%s::regclass) UNION SELECT %s::regclass) AS tree
+            """,
+            [name, name],
+        )
+        return cursor.fetchone()
+
+
+def storage_report(top=10):
+    """Characters referenced by messages versus stored once in blobs, compressed bytes, table/index sizes and the most shared blobs"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT count(*), coalesce(sum(blob.length), 0)
+            FROM learners_response AS response
+            JOIN learners_messageblob AS blob ON blob.id = response.blob_id
+            """
+        )
+        messages, referenced = cursor.fetchone()
+        cursor.execute(
+            """
+            SELECT count(*), count(*) FILTER (WHERE ref_count = 0), count(*) FILTER (WHERE get_byte(text, 0) <> 0),
+                   coalesce(sum(length), 0), coalesce(sum(octet_length(text)), 0), coalesce(sum(pg_column_size(text)), 0)
+            FROM learners_messageblob
+            """
+        )
+        blobs, unreferenced, compressed, distinct, stored_bytes, stored_on_disk = cursor.fetchone()
+
+    shared = (
+        MessageBlob.objects.filter(ref_count__gt=1)
+        .order_by('-ref_count')
+        .only('digest', 'ref_count', 'length', 'text')[:top]
+    )
+    return {
+        'messages': messages,
+        'blobs': blobs,
+        'unreferenced_blobs': unreferenced,
+        'compressed_blobs': compressed,
+        'referenced_characters': referenced,
+        'distinct_characters': distinct,
+        'saved_characters': referenced - distinct,
+        'stored_bytes': stored_bytes,
+        'stored_bytes_on_disk': stored_on_disk,
+        'relations': {name: dict(zip(('table_bytes', 'index_bytes'), relation_sizes(name))) for name in RELATIONS},
+        'most_shared': [
+            {
+                'digest': blob.digest[:12],
+                'references': blob.ref_count,
+                'saved_characters': (blob.ref_count - 1) * blob.length,
+                'text': blob.text[:60],
+            }
+            for blob in shared
+        ],
+    }
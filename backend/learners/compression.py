@@ -0,0 +1,114 @@
+# learners/compression.py
+"""
+zstd compression of message bodies with a trained dictionary per grade.
+
+A stored body starts with a format byte:
+- RAW (0): UTF-8 text as is, for bodies under MESSAGE_COMPRESSION_MIN_BYTES
+  or ones compression would not shrink.
+- ZSTD (1): a zstd frame. The frame header carries the id of the dictionary it
+  was written with (0 for none), so a body can be read whichever grade's
+  dictionary was current when it was written.
+
+Dictionaries are trained from recent messages by `train_text_dictionaries` and
+stored in TextDictionary. New bodies use the newest dictionary for the
+learner's grade, falling back to the one trained across all grades.
+"""
+
+import threading
+import time
+
+import zstandard
+from django.conf import settings
+
+RAW, ZSTD = 0, 1
+MIN_BYTES = getattr(settings, 'MESSAGE_COMPRESSION_MIN_BYTES', 256)
+COMPRESSION_LEVEL = 9
+ALL_GRADES = ''
+# How long a process keeps a grade's dictionary before checking for a newer one
+CURRENT_SECONDS = 300
+
+_by_id = {}  # dict_id -> ZstdCompressionDict; dictionaries never change, so these are kept
+_current = {}  # grade -> (checked at, ZstdCompressionDict or None)
+_local = threading.local()  # zstd (de)compressors are not thread-safe
+
+
+class PackedText(bytes):
+    """A stored message body, not decompressed yet"""
+
+
+def load_dictionary(dict_id, data):
+    dictionary = zstandard.ZstdCompressionDict(bytes(data))
+    dictionary.precompute_compress(level=COMPRESSION_LEVEL)
+    return _by_id.setdefault(dict_id, dictionary)
+
+
+def dictionary_by_id(dict_id):
+    dictionary = _by_id.get(dict_id)
+    if dictionary is None:
+        from .models import TextDictionary
+        dictionary = load_dictionary(dict_id, TextDictionary.objects.get(dict_id=dict_id).data)
+    return dictionary
+
+
+def current_dictionary(grade):
+    """Newest dictionary for the grade (or for all grades), or None"""
+    grade = grade or ALL_GRADES
+    checked = _current.get(grade)
+    if checked is None or time.monotonic() - checked[0] > CURRENT_SECONDS:
+        from .models import TextDictionary
+        latest = (
+            TextDictionary.objects.filter(grade__in={grade, ALL_GRADES})
+            .order_by('-grade', '-created_at')
+            .values_list('dict_id', flat=True)
+            .first()
+        )
+        dictionary = None if latest is None else _by_id.get(latest) or dictionary_by_id(latest)
+        checked = _current[grade] = (time.monotonic(), dictionary)
+    return checked[1]
+
+
+def forget_dictionaries():
+    """Make this process look up the current dictionaries again, e.g. after training"""
+    _current.clear()
+
+
+def _compressor(dictionary):
+    compressors = _local.__dict__.setdefault('compressors', {})
+    dict_id = dictionary.dict_id() if dictionary is not None else 0
+    compressor = compressors.get(dict_id)
+    if compressor is None:
+        compressor = compressors[dict_id] = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary)
+    return compressor
+
+
+def _decompressor(dict_id):
+    decompressors = _local.__dict__.setdefault('decompressors', {})
+    decompressor = decompressors.get(dict_id)
+    if decompressor is None:
+        dictionary = dictionary_by_id(dict_id) if dict_id else None
+        decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return decompressor
+
+
+def compress(text, dictionary=None):
+    raw = text.encode('utf-8')
+    if len(raw) >= MIN_BYTES:
+        frame = _compressor(dictionary).compress(raw)
+        if len(frame) < len(raw):
+            return PackedText(bytes([ZSTD]) + frame)
+    return PackedText(bytes([RAW]) + raw)
+
+
+def decompress(packed):
+    packed = bytes(packed)
+    if packed[0] == RAW:
+        return packed[1:].decode('utf-8')
+    frame = packed[1:]
+    dict_id = zstandard.get_frame_parameters(frame).dict_id
+    return _decompressor(dict_id).decompress(frame).decode('utf-8')
+
+
+def dictionary_id(packed):
+    """Id of the dictionary a stored body was compressed with; 0 for none, None if stored raw"""
+    packed = bytes(packed)
+    return zstandard.get_frame_parameters(packed[1:]).dict_id if packed[0] == ZSTD else None
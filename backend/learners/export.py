@@ -0,0 +1,110 @@
+# learners/export.py
+import csv
+import zlib
+
+from backend.fastjson import dumps
+
+from .archive import load_archived_messages
+from .compression import decompress
+from .models import Response
+
+CHUNK_SIZE = 2000  # rows fetched per round trip from the server-side cursor
+FLUSH_BYTES = 64 * 1024  # bytes buffered before handing a chunk to the WSGI server
+
+CSV_HEADER = [
+    'conversation_id', 'conversation_title', 'learner_id', 'learner_username',
+    'message_id', 'role', 'text', 'created_at',
+]
+
+
+class Echo:
+    """csv.writer target that hands back each formatted row instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_message_rows(conversations):
+    """
+    Yield one tuple per message of the given conversations, grouped by
+    conversation. Live messages stream through a server-side cursor; archived
+    conversations are decoded one at a time.
+    """
+    live = (
+        Response.objects
+        .filter(prompt__in=conversations.filter(archived_at__isnull=True))
+        .order_by('-prompt_id', 'created_at')
+        .values_list(
+            'prompt_id', 'prompt__title', 'prompt__learner_id', 'prompt__learner__username',
+            'id', 'role', 'blob__text', 'created_at',
+        )
+    )
+    for row in live.iterator(chunk_size=CHUNK_SIZE):
+        # Same ISO timestamp format as the archived payloads
+        yield row[:-2] + (decompress(row[-2]), row[-1].isoformat())
+
+    archived = (
+        conversations
+        .filter(archived_at__isnull=False)
+        .select_related('archive', 'learner')
+        .only('id', 'title', 'learner__id', 'learner__username', 'archive__payload')
+    )
+    for conversation in archived.iterator(chunk_size=100):
+        for message in load_archived_messages(conversation):
+            yield (
+                conversation.id, conversation.title, conversation.learner.id, conversation.learner.username,
+                message['id'], message['role'], message['text'], message['created_at'],
+            )
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    """One conversation line followed by one line per message, per conversation"""
+    current = None
+    for conversation_id, title, learner_id, username, message_id, role, text, created_at in rows:
+        if conversation_id != current:
+            current = conversation_id
+            yield dumps({
+                'type': 'conversation',
+                'id': conversation_id,
+                'title': title,
+                'learner': learner_id,
+                'learner_username': username,
+            }) + b'\n'
+        yield dumps({
+            'type': 'message',
+            'conversation': conversation_id,
+            'id': message_id,
+            'role': role,
+            'text': text,
+            'created_at': created_at,
+        }) + b'\n'
+
+
+def buffered(lines):
+    """Join small str or bytes lines into FLUSH_BYTES-sized byte chunks"""
+    buffer, size = [], 0
+    for line in lines:
+        data = line if isinstance(line, bytes) else line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
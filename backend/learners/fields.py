@@ -0,0 +1,68 @@
+# learners/fields.py
+from django.core.exceptions import FieldError
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .compression import PackedText, compress, decompress
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """Keeps the stored bytes until the attribute is read, then decompresses once"""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, PackedText):
+            value = instance.__dict__[self.field.attname] = decompress(value)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text stored as zstd-compressed bytes; see learners/compression.py.
+
+    Assign a str. Instances decompress on first read of the attribute;
+    values()/values_list() return the stored PackedText, which decompress()
+    turns back into text. Set `compression_dictionary` on the instance before
+    saving to compress with that dictionary.
+
+    The stored bytes depend on the dictionary, so the text cannot be compared
+    in the database: lookups other than isnull raise FieldError. Look blobs up
+    by digest instead.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def get_lookup(self, lookup_name):
+        if lookup_name != 'isnull':
+            raise FieldError(
+                f"{self.model.__name__}.{self.name} is stored compressed and cannot be "
+                f"filtered with '{lookup_name}'; look it up by digest instead."
+            )
+        return super().get_lookup(lookup_name)
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else PackedText(value)
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, str):
+            return compress(value, getattr(model_instance, 'compression_dictionary', None))
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        # Only reached when saving, e.g. from update(); lookups are rejected above
+        if isinstance(value, str):
+            value = compress(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.timezone import now
+
+from learners.archive import archive_conversation
+from learners.models import LearnerPrompt
+
+
+class Command(BaseCommand):
+    help = (
+        "Move conversations untouched for N months into compressed cold storage. "
+        "Archived conversations are restored automatically when next opened."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=6, help='Archive conversations idle for this many months')
+        parser.add_argument('--limit', type=int, default=None, help='Archive at most this many conversations')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = now() - timedelta(days=30 * options['months'])
+        candidates = (
+            LearnerPrompt.objects
+            .filter(archived_at__isnull=True, updated_at__lt=cutoff)
+            .filter(Q(restored_at__isnull=True) | Q(restored_at__lt=cutoff))
+            .order_by('updated_at')
+        )
+        if options['limit']:
+            candidates = candidates[:options['limit']]
+
+        conversations = messages = 0
+        for conversation in candidates.iterator():
+            if options['dry_run']:
+                messages += conversation.messages.count()
+            else:
+                messages += archive_conversation(conversation)
+            conversations += 1
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {conversations} conversation(s), {messages} message(s)"))
@@ -0,0 +1,111 @@
+import random
+import statistics
+import time
+
+import zstandard
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from learners import compression
+from learners.compression import compress, decompress
+from learners.models import MessageBlob, Response
+from learners.services import HISTORY_WINDOW
+
+SENTENCES = (
+    "Plants use sunlight, water and carbon dioxide to make their own food.",
+    "This process is called photosynthesis and it happens in the leaves.",
+    "The green pigment chlorophyll absorbs the light energy.",
+    "Water moves up from the roots through tiny tubes in the stem.",
+    "Oxygen is released into the air as a by-product.",
+    "A fraction has a numerator on top and a denominator underneath.",
+    "To add fractions with different denominators, first find a common denominator.",
+    "Multiply the numerator and the denominator by the same number to get an equivalent fraction.",
+    "The water cycle moves water between the oceans, the air and the land.",
+    "When water vapour cools it condenses into tiny droplets that form clouds.",
+    "Great question! Let's work through it step by step.",
+    "Can you think of an example from your own life?",
+    "Remember to check your answer by estimating first.",
+    "Volcanoes form where molten rock from inside the Earth reaches the surface.",
+    "The heart pumps blood through arteries, capillaries and veins.",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark message storage: disk usage and history-load latency for plain text versus "
+        "zstd and zstd with the trained dictionary. Uses recent messages (or --synthetic ones) "
+        "copied into temporary tables; nothing is written to the real tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000, help='Recent messages to copy')
+        parser.add_argument('--synthetic', action='store_true', help='Generate varied answers instead of copying messages')
+        parser.add_argument('--grade', default=None, help="Use this grade's dictionary (default: the all-grades one)")
+        parser.add_argument('--loads', type=int, default=500, help='Timed history loads per storage format')
+
+    def handle(self, *args, **options):
+        texts = self.synthetic(options['messages']) if options['synthetic'] else self.recent(options['messages'])
+        if not texts:
+            raise CommandError("No messages to benchmark; try --synthetic")
+        if options['synthetic']:
+            # Trained on a separate synthetic sample, not on the messages measured; not saved
+            trained = zstandard.train_dictionary(16 * 1024, [text.encode('utf-8') for text in self.synthetic(5000)])
+            dictionary = compression.load_dictionary(trained.dict_id(), trained.as_bytes())
+        else:
+            dictionary = compression.current_dictionary(options['grade'])
+        formats = {
+            'plain': ('text', lambda text: text, lambda value: value),
+            'zstd': ('bytea', compress, decompress),
+            'zstd+dict': ('bytea', lambda text: compress(text, dictionary), decompress),
+        }
+        if dictionary is None:
+            del formats['zstd+dict']
+            self.stdout.write("No trained dictionary yet; run train_text_dictionaries to include zstd+dict")
+
+        conversations = max(1, len(texts) // HISTORY_WINDOW)
+        self.stdout.write(
+            f"{len(texts)} messages in {conversations} histories of {HISTORY_WINDOW}, "
+            f"threshold {compression.MIN_BYTES} B\n"
+        )
+        self.stdout.write(f"{'format':<10} {'table':>10} {'index':>10} {'B/message':>10} {'load p50 ms':>12} {'load p95 ms':>12}")
+        with transaction.atomic(), connection.cursor() as cursor:
+            for name, (column_type, encode, decode) in formats.items():
+                table = f"bench_{name.replace('+', '_')}"
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {table} (conversation integer, position integer, text {column_type}) "
+                    "ON COMMIT DROP"
+                )
+                rows = [(index // HISTORY_WINDOW, index % HISTORY_WINDOW, encode(text)) for index, text in enumerate(texts)]
+                cursor.executemany(f"INSERT INTO {table} VALUES (%s, %s, %s)", rows)
+                cursor.execute(f"CREATE INDEX ON {table} (conversation, position)")
+                cursor.execute(f"ANALYZE {table}")
+                cursor.execute(f"SELECT pg_table_size('{table}'), pg_indexes_size('{table}')")
+                table_bytes, index_bytes = cursor.fetchone()
+
+                samples = []
+                for _ in range(options['loads']):
+                    conversation = random.randrange(conversations)
+                    start = time.perf_counter()
+                    cursor.execute(f"SELECT text FROM {table} WHERE conversation = %s ORDER BY position", [conversation])
+                    [decode(value) for value, in cursor.fetchall()]
+                    samples.append((time.perf_counter() - start) * 1000)
+                samples.sort()
+                self.stdout.write(
+                    f"{name:<10} {table_bytes:>10} {index_bytes:>10} {table_bytes / len(texts):>10.1f} "
+                    f"{statistics.median(samples):>12.3f} {samples[int(len(samples) * 0.95)]:>12.3f}"
+                )
+            transaction.set_rollback(True)
+
+    def recent(self, count):
+        blob_ids = Response.objects.order_by('-created_at').values_list('blob_id', flat=True)[:count]
+        blobs = dict(MessageBlob.objects.filter(id__in=list(set(blob_ids))).values_list('id', 'text'))
+        return [decompress(blobs[blob_id]) for blob_id in blob_ids]
+
+    def synthetic(self, count):
+        texts = []
+        for index in range(count):
+            if index % 2 == 0:
+                texts.append(random.choice(SENTENCES).split(',')[0].rstrip('.') + '?')
+            else:
+                texts.append(' '.join(random.sample(SENTENCES, random.randint(3, 9))))
+        return texts
@@ -0,0 +1,82 @@
+import gzip
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from backend.compression import brotli
+from backend.fastjson import ORJSONRenderer, sse_event
+from users.models import User
+from learners.models import LearnerPrompt, Response
+from learners.serializers import ConversationSerializer
+
+SAMPLE_ANSWER = (
+    "Photosynthesis is how plants make their own food. They take in sunlight, water "
+    "and carbon dioxide, and turn them into sugar and oxygen. "
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark rendering time and bytes on the wire for the conversation list and "
+        "detail payloads (stdlib JSON vs orjson, raw/gzip/brotli), plus SSE frame encoding. "
+        "Sample data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=20, help='Conversations in the list payload')
+        parser.add_argument('--messages', type=int, default=40, help='Messages per conversation')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed renders per case')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            conversations = self.create_sample(options['conversations'], options['messages'])
+            queryset = LearnerPrompt.objects.filter(pk__in=[c.pk for c in conversations]).prefetch_related('messages')
+            payloads = {
+                'list': ConversationSerializer(queryset, many=True).data,
+                'detail': ConversationSerializer(queryset.first()).data,
+            }
+            transaction.set_rollback(True)
+
+        iterations = options['iterations']
+        self.stdout.write(f"{'payload':<8} {'renderer':<9} {'render ms':>10} {'raw B':>10} {'gzip B':>9} {'br B':>9}")
+        for name, data in payloads.items():
+            for label, renderer in (('stdlib', JSONRenderer()), ('orjson', ORJSONRenderer())):
+                ms = self.time(lambda: renderer.render(data), iterations)
+                content = renderer.render(data)
+                br = len(brotli.compress(content, quality=4)) if brotli else '-'
+                self.stdout.write(
+                    f"{name:<8} {label:<9} {ms:>10.3f} {len(content):>10} {len(gzip.compress(content)):>9} {br:>9}"
+                )
+
+        frames = [{'text': char, 'done': False} for char in SAMPLE_ANSWER * 10]
+        stdlib = self.time(lambda: [f"data: {json.dumps(frame)}\n\n" for frame in frames], iterations)
+        fast = self.time(lambda: [sse_event(frame) for frame in frames], iterations)
+        self.stdout.write(f"\nSSE frames ({len(frames)}): stdlib {stdlib:.3f} ms, orjson {fast:.3f} ms")
+
+    def create_sample(self, count, messages):
+        learner = User.objects.create(
+            username='bench-serialization', email='bench-serialization@example.com',
+            role=User.Role.LEARNER, grade='5',
+        )
+        conversations = []
+        for index in range(count):
+            conversation = LearnerPrompt.objects.create(learner=learner, title=f'Question {index}', text='Why?')
+            Response.objects.bulk_create([
+                Response(prompt=conversation, role='user' if turn % 2 == 0 else 'assistant',
+                         text='Why is the sky blue?' if turn % 2 == 0 else SAMPLE_ANSWER * 4)
+                for turn in range(messages)
+            ])
+            conversations.append(conversation)
+        return conversations
+
+    def time(self, func, iterations):
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
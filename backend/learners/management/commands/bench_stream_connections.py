@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from users.models import User
+from learners.models import LearnerPrompt
+from learners import quotas, views
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark peak DB connections held versus concurrent streamed chat turns. "
+        "The upstream LLM is replaced by a fake stream, so no API calls are made."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', default='1,5,10,25', help='Comma-separated concurrency levels')
+        parser.add_argument('--chunks', type=int, default=20, help='Chunks per fake upstream stream')
+        parser.add_argument('--delay', type=float, default=0.05, help='Seconds between fake upstream chunks')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['streams'].split(',')]
+        learner = User.objects.create(
+            username='bench-stream-learner',
+            email='bench-stream-learner@example.com',
+            role=User.Role.LEARNER,
+            grade='5',
+        )
+        try:
+            self.stdout.write(f"{'streams':>8} {'peak held':>10} {'peak backends':>14} {'seconds':>8}")
+            for level in levels:
+                held, backends, elapsed = self.run_level(learner, level, options['chunks'], options['delay'])
+                self.stdout.write(f"{level:>8} {held:>10} {backends:>14} {elapsed:>8.2f}")
+        finally:
+            learner.delete()
+
+    def fake_stream(self, chunks, delay):
+        def generate_ai_response(*args, **kwargs):
+            def generate():
+                for _ in range(chunks):
+                    time.sleep(delay)
+                    yield f"data: {json.dumps({'text': 'x', 'done': False})}\n\n"
+                yield f"data: {json.dumps({'text': '', 'done': True})}\n\n"
+            return generate()
+        return generate_ai_response
+
+    def run_level(self, learner, level, chunks, delay):
+        conversations = [
+            LearnerPrompt.objects.create(learner=learner, text='benchmark question')
+            for _ in range(level)
+        ]
+        factory = APIRequestFactory()
+        view = views.MessageCreateView.as_view()
+        held = {}
+        lock = threading.Lock()
+        peak = {'held': 0, 'backends': 0}
+        done = threading.Event()
+
+        def record_held():
+            with lock:
+                held[threading.get_ident()] = connections['default'].connection is not None
+                peak['held'] = max(peak['held'], sum(held.values()))
+
+        def run_turn(conversation):
+            request = factory.post(
+                f'/api/learners/conversations/{conversation.id}/messages/?stream=true',
+                {'text': 'benchmark question'},
+                format='json',
+            )
+            force_authenticate(request, user=learner)
+            response = view(request, conversation_id=conversation.id)
+            for _ in response.streaming_content:
+                record_held()
+            response.close()
+            with lock:
+                held[threading.get_ident()] = False
+            connections.close_all()
+
+        def sample_backends():
+            if connection.vendor != 'postgresql':
+                return
+            with connections['default'].cursor() as cursor:
+                while not done.is_set():
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                    )
+                    peak['backends'] = max(peak['backends'], cursor.fetchone()[0])
+                    time.sleep(delay)
+            connections['default'].close()
+
+        sampler = threading.Thread(target=sample_backends)
+        workers = [threading.Thread(target=run_turn, args=(conversation,)) for conversation in conversations]
+        started = time.perf_counter()
+        # One learner sends every turn, far beyond the chat limits
+        with mock.patch.object(views, 'generate_ai_response', self.fake_stream(chunks, delay)), \
+                mock.patch.object(quotas, 'check'):
+            sampler.start()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        sampler.join()
+
+        LearnerPrompt.objects.filter(id__in=[c.id for c in conversations]).delete()
+        return peak['held'], peak['backends'], elapsed
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from learners import answer_bank
+
+
+class Command(BaseCommand):
+    help = (
+        "Mine the most frequent opening questions per grade from recent messages and pre-generate "
+        "their answers into the answer bank. Entries from another model or prompt version, or older "
+        "than --refresh-days, are regenerated; questions no longer among the most frequent are dropped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Mine messages from this many days')
+        parser.add_argument('--top', type=int, default=100, help='Bank at most this many questions per grade')
+        parser.add_argument('--min-count', type=int, default=5, help='Only questions asked at least this often')
+        parser.add_argument('--grade', action='append', help='Only these grades (repeatable)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent requests to the AI service')
+        parser.add_argument('--refresh-days', type=int, default=7, help='Regenerate answers older than this')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        mined = answer_bank.mine(
+            now() - timedelta(days=options['days']), options['top'], options['min_count'], options['grade'],
+        )
+        refresh_before = now() - timedelta(days=options['refresh_days'])
+        verb = 'would generate' if options['dry_run'] else 'generated'
+        for grade, candidates in mined.items():
+            if options['dry_run'] and options['verbosity'] > 1:
+                for candidate in candidates:
+                    self.stdout.write(f"  grade {grade} x{candidate.occurrences}: {candidate.prompt}")
+            counts = answer_bank.refresh(
+                candidates, max(1, options['concurrency']), refresh_before, dry_run=options['dry_run'],
+            )
+            self.stdout.write(
+                f"grade {grade}: {len(candidates)} question(s), {verb} {counts['generated']}, "
+                f"{counts['kept']} up to date, {counts['failed']} failed, {counts['removed']} removed"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Banked questions for {len(mined)} grade(s)"))
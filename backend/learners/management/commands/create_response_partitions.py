@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from learners.archive import ensure_response_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the upcoming monthly partitions of learners_response (PostgreSQL only). "
+        "Run it regularly (e.g. daily from cron) so new messages never land in the default partition."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+
+    def handle(self, *args, **options):
+        created = ensure_response_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) created"))
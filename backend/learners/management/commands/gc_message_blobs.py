@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from learners.blobs import collect_garbage, recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete message blobs that no message references any more. "
+        "--recount first rebuilds every reference count from the messages table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=1, help='Keep unreferenced blobs younger than this')
+        parser.add_argument('--recount', action='store_true', help='Repair reference counts before collecting')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(f"Corrected {recount()} reference count(s)")
+
+        blobs, size = collect_garbage(timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {blobs} blob(s), {size} character(s) of text"))
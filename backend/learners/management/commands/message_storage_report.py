@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from learners.blobs import storage_report
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{num_bytes} B"
+        num_bytes /= 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how much message text is shared and compressed: characters referenced by messages "
+        "versus stored once in blobs, compressed bytes, table and index sizes, and the most shared blobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='List this many of the most shared blobs')
+
+    def handle(self, *args, **options):
+        report = storage_report(top=options['top'])
+        ratio = report['messages'] / report['blobs'] if report['blobs'] else 0
+
+        self.stdout.write(f"Messages: {report['messages']}, blobs: {report['blobs']} ({ratio:.2f} messages per blob)")
+        self.stdout.write(f"Unreferenced blobs: {report['unreferenced_blobs']}, compressed: {report['compressed_blobs']}")
+        self.stdout.write(f"Characters referenced by messages: {report['referenced_characters']:,}")
+        self.stdout.write(f"Characters stored once in blobs: {report['distinct_characters']:,}")
+        self.stdout.write(
+            f"Bytes stored in blobs: {_size(report['stored_bytes'])} "
+            f"({_size(report['stored_bytes_on_disk'])} after TOAST)"
+        )
+        for name, sizes in report['relations'].items():
+            self.stdout.write(f"{name}: table {_size(sizes['table_bytes'])}, indexes {_size(sizes['index_bytes'])}")
+
+        if report['most_shared']:
+            self.stdout.write("Most shared:")
+            for blob in report['most_shared']:
+                self.stdout.write(
+                    f"  {blob['digest']}  x{blob['references']}  saves {blob['saved_characters']:,} chars  {blob['text']!r}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Deduplication saved {report['saved_characters']:,} characters"))
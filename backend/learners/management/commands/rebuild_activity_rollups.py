@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localdate
+
+from learners.activity import rebuild_activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per learner per day activity rollups from messages and conversations. "
+        "Rollups are maintained on write; run this periodically to backfill or repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Rebuild this many most recent days')
+        parser.add_argument(
+            '--include-today', action='store_true',
+            help="Also rebuild today's rows (briefly blocks live activity updates)",
+        )
+
+    def handle(self, *args, **options):
+        today = localdate()
+        end = today if options['include_today'] else today - timedelta(days=1)
+        start = end - timedelta(days=options['days'] - 1)
+        count = rebuild_activity(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup row(s) from {start} to {end}"))
@@ -0,0 +1,91 @@
+import secrets
+
+import zstandard
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from learners import compression
+from learners.compression import compress, decompress
+from learners.models import MessageBlob, Response, TextDictionary
+from users.models import User
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a zstd dictionary per grade (and one across all grades) from recent messages. "
+        "New messages use it right away in this process, and in other workers within a few minutes; "
+        "--recompress also rewrites the grade's stored messages when that makes them smaller."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grade', action='append', help='Train only these grades (repeatable; "all" for the shared one)')
+        parser.add_argument('--samples', type=int, default=5000, help='Train on this many recent messages per grade')
+        parser.add_argument('--min-samples', type=int, default=200, help='Skip grades with fewer messages')
+        parser.add_argument('--size', type=int, default=16 * 1024, help='Dictionary size in bytes')
+        parser.add_argument('--recompress', action='store_true')
+
+    def handle(self, *args, **options):
+        grades = options['grade'] or [*User.Grade.values, 'all']
+        for grade in grades:
+            grade = compression.ALL_GRADES if grade == 'all' else grade
+            label = f"grade {grade}" if grade else "all grades"
+            messages = Response.objects.all()
+            if grade:
+                messages = messages.filter(prompt__learner__grade=grade)
+
+            blob_ids = messages.order_by('-created_at').values('blob_id')[:options['samples']]
+            texts = [decompress(text) for text in MessageBlob.objects.filter(id__in=blob_ids).values_list('text', flat=True)]
+            if len(texts) < options['min_samples']:
+                self.stdout.write(f"{label}: skipped, {len(texts)} distinct message(s)")
+                continue
+            try:
+                dictionary = zstandard.train_dictionary(
+                    options['size'], [text.encode('utf-8') for text in texts], dict_id=self.new_dict_id(),
+                )
+            except zstandard.ZstdError as error:
+                self.stdout.write(f"{label}: skipped, {error}")
+                continue
+
+            TextDictionary.objects.create(
+                grade=grade, dict_id=dictionary.dict_id(), data=dictionary.as_bytes(), samples=len(texts),
+            )
+            compression.forget_dictionaries()
+            dictionary = compression.dictionary_by_id(dictionary.dict_id())
+
+            long_texts = [text for text in texts if len(text.encode('utf-8')) >= compression.MIN_BYTES]
+            raw = sum(len(text.encode('utf-8')) for text in long_texts)
+            plain = sum(len(compress(text)) for text in long_texts)
+            trained = sum(len(compress(text, dictionary)) for text in long_texts)
+            self.stdout.write(
+                f"{label}: dictionary {dictionary.dict_id()} from {len(texts)} messages; "
+                f"{len(long_texts)} above the threshold: {raw} B raw, {plain} B zstd, {trained} B with the dictionary"
+            )
+            if options['recompress']:
+                rewritten = self.recompress(messages, dictionary)
+                self.stdout.write(f"{label}: recompressed {rewritten} stored message(s)")
+
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def new_dict_id(self):
+        """Random id in the range zstd leaves for user dictionaries (1-32767 are reserved)"""
+        while True:
+            dict_id = 32768 + secrets.randbelow(2**31 - 32768)
+            if not TextDictionary.objects.filter(dict_id=dict_id).exists():
+                return dict_id
+
+    def recompress(self, messages, dictionary):
+        """Rewrite the stored bodies of these messages with the dictionary where that is smaller"""
+        rewritten = []
+        blobs = MessageBlob.objects.filter(id__in=messages.values('blob_id')).values_list('id', 'text')
+        for blob_id, stored in blobs.iterator(chunk_size=BATCH_SIZE):
+            packed = compress(decompress(stored), dictionary)
+            if len(packed) < len(stored):
+                rewritten.append((packed, blob_id))
+        with connection.cursor() as cursor:
+            for start in range(0, len(rewritten), BATCH_SIZE):
+                cursor.executemany(
+                    "UPDATE learners_messageblob SET text = %s WHERE id = %s", rewritten[start:start + BATCH_SIZE],
+                )
+        return len(rewritten)
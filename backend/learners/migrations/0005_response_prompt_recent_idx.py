@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "learners",
+            "0004_alter_learnerprompt_options_alter_response_options_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="response",
+            index=models.Index(
+                fields=["prompt", "-created_at"], name="response_prompt_recent_idx"
+            ),
+        ),
+    ]
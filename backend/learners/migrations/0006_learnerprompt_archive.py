@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0005_response_prompt_recent_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="learnerprompt",
+            name="archived_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="learnerprompt",
+            name="restored_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="ArchivedConversation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("payload", models.BinaryField()),
+                ("message_count", models.PositiveIntegerField(default=0)),
+                ("last_message", models.TextField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "conversation",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archive",
+                        to="learners.learnerprompt",
+                    ),
+                ),
+            ],
+        ),
+    ]
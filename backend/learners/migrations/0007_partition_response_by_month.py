@@ -0,0 +1,113 @@
+# Converts learners_response into a table range-partitioned by month on
+# created_at. PostgreSQL only; other backends keep the plain table.
+
+from django.db import migrations
+
+MONTHS_AHEAD = 3
+
+
+def month_partitions(cursor, first_month, months_ahead):
+    cursor.execute(
+        """
+        SELECT to_char(month, 'YYYY_MM'), month, month + interval '1 month'
+        FROM generate_series(
+            date_trunc('month', %s::timestamptz),
+            date_trunc('month', now()) + make_interval(months => %s),
+            interval '1 month'
+        ) AS month
+        """,
+        [first_month, months_ahead],
+    )
+    return cursor.fetchall()
+
+
+def partition_response(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE learners_response RENAME TO learners_response_legacy")
+        cursor.execute(
+            """
+            CREATE TABLE learners_response (
+                LIKE learners_response_legacy INCLUDING DEFAULTS INCLUDING STORAGE
+            ) PARTITION BY RANGE (created_at)
+            """
+        )
+        cursor.execute("ALTER TABLE learners_response ADD PRIMARY KEY (id, created_at)")
+        cursor.execute("CREATE SEQUENCE learners_response_part_id_seq OWNED BY learners_response.id")
+        cursor.execute(
+            "ALTER TABLE learners_response ALTER COLUMN id SET DEFAULT nextval('learners_response_part_id_seq')"
+        )
+        cursor.execute(
+            "SELECT setval('learners_response_part_id_seq', COALESCE(MAX(id), 0) + 1, false) "
+            "FROM learners_response_legacy"
+        )
+
+        cursor.execute("SELECT COALESCE(MIN(created_at), now()) FROM learners_response_legacy")
+        first_month = cursor.fetchone()[0]
+        for suffix, start, end in month_partitions(cursor, first_month, MONTHS_AHEAD):
+            cursor.execute(
+                f"CREATE TABLE learners_response_p{suffix} PARTITION OF learners_response "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        cursor.execute("CREATE TABLE learners_response_default PARTITION OF learners_response DEFAULT")
+
+        cursor.execute("INSERT INTO learners_response SELECT * FROM learners_response_legacy")
+        cursor.execute("DROP TABLE learners_response_legacy")
+
+        cursor.execute("CREATE INDEX learners_response_prompt_id_idx ON learners_response (prompt_id)")
+        cursor.execute(
+            "CREATE INDEX response_prompt_recent_idx ON learners_response (prompt_id, created_at DESC)"
+        )
+        cursor.execute(
+            """
+            ALTER TABLE learners_response
+            ADD CONSTRAINT learners_response_prompt_id_fk
+            FOREIGN KEY (prompt_id) REFERENCES learners_learnerprompt (id)
+            DEFERRABLE INITIALLY DEFERRED
+            """
+        )
+
+
+def unpartition_response(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE learners_response RENAME TO learners_response_partitioned")
+        cursor.execute(
+            "CREATE TABLE learners_response (LIKE learners_response_partitioned INCLUDING STORAGE)"
+        )
+        cursor.execute("ALTER TABLE learners_response ADD PRIMARY KEY (id)")
+        cursor.execute("ALTER TABLE learners_response ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute("INSERT INTO learners_response SELECT * FROM learners_response_partitioned")
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('learners_response', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            "FROM learners_response"
+        )
+        cursor.execute("DROP TABLE learners_response_partitioned CASCADE")
+        cursor.execute("CREATE INDEX learners_response_prompt_id_idx ON learners_response (prompt_id)")
+        cursor.execute(
+            "CREATE INDEX response_prompt_recent_idx ON learners_response (prompt_id, created_at DESC)"
+        )
+        cursor.execute(
+            """
+            ALTER TABLE learners_response
+            ADD CONSTRAINT learners_response_prompt_id_fk
+            FOREIGN KEY (prompt_id) REFERENCES learners_learnerprompt (id)
+            DEFERRABLE INITIALLY DEFERRED
+            """
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0006_learnerprompt_archive"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_response, unpartition_response),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:39
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0007_partition_response_by_month"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="response",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.SearchVector(
+                    "text", config="english"
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="learnerprompt",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="learnerprompt_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="response",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="response_search_vector_idx"
+            ),
+        ),
+    ]
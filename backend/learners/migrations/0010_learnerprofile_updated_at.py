@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0009_learnerdailyactivity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="learnerprofile",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0010_learnerprofile_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="learnerprofile",
+            name="daily_token_quota",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="learnerprofile",
+            name="messages_per_minute",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,170 @@
+# Moves message bodies out of learners_response into the content-addressed
+# learners_messageblob table (see learners/blobs.py). Existing texts are
+# interned in SQL, and triggers on learners_response keep ref_count in step
+# with inserts, deletes (including cascades and archiving) and blob changes.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+INTERN_TEXTS = """
+INSERT INTO learners_messageblob (digest, text, ref_count, created_at)
+SELECT encode(sha256(convert_to(text, 'UTF8')), 'hex'), text, count(*), min(created_at)
+FROM learners_response
+GROUP BY text;
+
+UPDATE learners_response AS response
+SET blob_id = blob.id
+FROM learners_messageblob AS blob
+WHERE blob.digest = encode(sha256(convert_to(response.text, 'UTF8')), 'hex');
+
+-- Run the deferred FK checks now so the columns can be altered below
+SET CONSTRAINTS ALL IMMEDIATE;
+"""
+
+RESTORE_TEXTS = """
+UPDATE learners_response AS response
+SET text = blob.text
+FROM learners_messageblob AS blob
+WHERE blob.id = response.blob_id;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+"""
+
+# Statement-level triggers: a bulk insert or delete touches each blob once,
+# not once per message. Transition tables allow a single event per trigger.
+REF_COUNT_TRIGGERS = """
+CREATE FUNCTION learners_messageblob_ref_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE learners_messageblob AS blob SET ref_count = blob.ref_count + delta.n
+        FROM (SELECT blob_id, count(*) AS n FROM new_rows GROUP BY blob_id) AS delta
+        WHERE blob.id = delta.blob_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE learners_messageblob AS blob SET ref_count = blob.ref_count - delta.n
+        FROM (SELECT blob_id, count(*) AS n FROM old_rows GROUP BY blob_id) AS delta
+        WHERE blob.id = delta.blob_id;
+    ELSE
+        UPDATE learners_messageblob AS blob SET ref_count = blob.ref_count + delta.n
+        FROM (
+            SELECT blob_id, sum(n) AS n
+            FROM (SELECT blob_id, 1 AS n FROM new_rows UNION ALL SELECT blob_id, -1 FROM old_rows) AS changes
+            GROUP BY blob_id
+            HAVING sum(n) <> 0
+        ) AS delta
+        WHERE blob.id = delta.blob_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER learners_response_blob_ref_count_insert
+AFTER INSERT ON learners_response REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION learners_messageblob_ref_count();
+
+CREATE TRIGGER learners_response_blob_ref_count_delete
+AFTER DELETE ON learners_response REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION learners_messageblob_ref_count();
+
+CREATE TRIGGER learners_response_blob_ref_count_update
+AFTER UPDATE ON learners_response REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION learners_messageblob_ref_count();
+"""
+
+DROP_REF_COUNT_TRIGGERS = """
+DROP TRIGGER learners_response_blob_ref_count_update ON learners_response;
+DROP TRIGGER learners_response_blob_ref_count_delete ON learners_response;
+DROP TRIGGER learners_response_blob_ref_count_insert ON learners_response;
+DROP FUNCTION learners_messageblob_ref_count();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0011_learnerprofile_chat_limits"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("text", models.TextField()),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "search_vector",
+                    models.GeneratedField(
+                        db_persist=True,
+                        expression=django.contrib.postgres.search.SearchVector(
+                            "text", config="english"
+                        ),
+                        output_field=django.contrib.postgres.search.SearchVectorField(),
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["search_vector"], name="messageblob_search_vector_idx"
+                    ),
+                    models.Index(
+                        condition=models.Q(("ref_count", 0)),
+                        fields=["ref_count"],
+                        name="messageblob_ref_count_idx",
+                    ),
+                ],
+            },
+        ),
+        # Ordered so the reverse re-adds text as nullable, restores it, then
+        # makes it NOT NULL again before the search vector is regenerated.
+        migrations.RemoveIndex(
+            model_name="response",
+            name="response_search_vector_idx",
+        ),
+        migrations.RemoveField(
+            model_name="response",
+            name="search_vector",
+        ),
+        migrations.AlterField(
+            model_name="response",
+            name="text",
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name="response",
+            name="blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="responses",
+                to="learners.messageblob",
+            ),
+        ),
+        migrations.RunSQL(INTERN_TEXTS, RESTORE_TEXTS),
+        migrations.RemoveField(
+            model_name="response",
+            name="text",
+        ),
+        migrations.AlterField(
+            model_name="response",
+            name="blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="responses",
+                to="learners.messageblob",
+            ),
+        ),
+        migrations.RunSQL(REF_COUNT_TRIGGERS, DROP_REF_COUNT_TRIGGERS),
+    ]
@@ -0,0 +1,107 @@
+# Stores message bodies as compressed bytes (see learners/compression.py).
+# Existing bodies are converted in SQL to the uncompressed RAW format; run
+# `train_text_dictionaries --recompress` afterwards to compress them. The
+# search vector can no longer be generated from the column, so it becomes a
+# plain column written on insert, and the character length is stored too.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import learners.fields
+from django.db import migrations, models
+
+FILL_COLUMNS = """
+UPDATE learners_messageblob
+SET search_vector = to_tsvector('english'::regconfig, text), length = char_length(text);
+"""
+
+TEXT_TO_BYTEA = """
+ALTER TABLE learners_messageblob
+ALTER COLUMN text TYPE bytea USING '\\x00'::bytea || convert_to(text, 'UTF8');
+"""
+
+BYTEA_TO_TEXT = """
+ALTER TABLE learners_messageblob
+ALTER COLUMN text TYPE text USING convert_from(substring(text from 2), 'UTF8');
+"""
+
+
+def store_raw(apps, schema_editor):
+    """Rewrite compressed bodies in the RAW format so the column can go back to text"""
+    from learners.compression import RAW, decompress
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT id, text FROM learners_messageblob WHERE get_byte(text, 0) <> %s", [RAW])
+        rows = [(bytes([RAW]) + decompress(packed).encode("utf-8"), blob_id) for blob_id, packed in cursor.fetchall()]
+        cursor.executemany("UPDATE learners_messageblob SET text = %s WHERE id = %s", rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0012_message_blobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TextDictionary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("grade", models.CharField(blank=True, max_length=2)),
+                ("dict_id", models.PositiveBigIntegerField(unique=True)),
+                ("data", models.BinaryField()),
+                ("samples", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["grade", "-created_at"], name="textdictionary_grade_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="messageblob",
+            name="messageblob_search_vector_idx",
+        ),
+        migrations.RemoveField(
+            model_name="messageblob",
+            name="search_vector",
+        ),
+        migrations.AddField(
+            model_name="messageblob",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.AddField(
+            model_name="messageblob",
+            name="length",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(FILL_COLUMNS, migrations.RunSQL.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(TEXT_TO_BYTEA, BYTEA_TO_TEXT)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="messageblob",
+                    name="text",
+                    field=learners.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+        migrations.RunPython(migrations.RunPython.noop, store_raw),
+        migrations.AddIndex(
+            model_name="messageblob",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="messageblob_search_vector_idx"
+            ),
+        ),
+    ]
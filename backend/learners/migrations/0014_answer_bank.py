@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-19 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0013_compressed_message_text"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BankedAnswer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("grade", models.CharField(max_length=2)),
+                ("prompt_key", models.CharField(max_length=255)),
+                ("prompt", models.TextField()),
+                ("answer", models.TextField()),
+                ("occurrences", models.PositiveIntegerField(default=0)),
+                ("model", models.CharField(max_length=100)),
+                ("prompt_version", models.PositiveSmallIntegerField()),
+                ("generated_at", models.DateTimeField()),
+                ("mined_at", models.DateTimeField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("grade", "prompt_key"),
+                        name="unique_banked_answer_prompt",
+                    )
+                ],
+            },
+        ),
+    ]
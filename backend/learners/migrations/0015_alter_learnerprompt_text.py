@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:11
+
+from django.db import migrations, models
+
+
+# LearnerPrompt.text has been nullable in the model since before these
+# migrations; this catches the schema up. It used to ride along in 0005,
+# where it re-runs harmlessly on databases that already applied that version.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("learners", "0014_answer_bank"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="learnerprompt",
+            name="text",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,14 @@
-from django.db import models
+import hashlib
+from datetime import timedelta
+from django.db import models, router, transaction
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from users.models import User
 
+from . import compression
+from .fields import CompressedTextField
+
 User = get_user_model()
 
 # Create your models here.
@@ -11,6 +18,10 @@ class LearnerProfile(models.Model):
     school = models.CharField(max_length=100, default='School')
     parent = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='children')
     teacher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='students')
+    # Chat limits set by the learner's parent or teacher; null uses the project default
+    messages_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    daily_token_quota = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Learner Profile for {self.user.email}"
@@ -21,6 +32,8 @@ class LearnerPrompt(models.Model):
     title = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    archived_at = models.DateTimeField(null=True, blank=True)
+    restored_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Conversation with {self.learner.email}: {self.title or self.text[:50]}"
@@ -32,6 +45,75 @@ class LearnerPrompt(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Trigram index so title autocomplete (icontains) stays index-backed
+            GinIndex(fields=['title'], name='learnerprompt_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
+def text_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class MessageBlobManager(models.Manager):
+    def get_queryset(self):
+        # The search vector is only needed by the search endpoint's WHERE clause
+        return super().get_queryset().defer('search_vector')
+
+    def intern(self, texts, grade=None):
+        """{text: blob id} for the given texts, inserting the ones not stored yet"""
+        dictionary = compression.current_dictionary(grade)
+        blobs = []
+        for text in set(texts):
+            blob = MessageBlob(
+                digest=text_digest(text),
+                text=text,
+                length=len(text),
+                search_vector=SearchVector(models.Value(text), config='english'),
+            )
+            blob.compression_dictionary = dictionary
+            blobs.append(blob)
+        # One upsert whether or not the text is new; the no-op DO UPDATE makes
+        # PostgreSQL return the id of an existing row too. Referencing it bumps
+        # ref_count on that row anyway, so this adds no lock contention.
+        self.bulk_create(blobs, update_conflicts=True, unique_fields=['digest'], update_fields=['digest'])
+        return {blob.text: blob.id for blob in blobs}
+
+class MessageBlob(models.Model):
+    """
+    One distinct message body, shared by every Response with that text
+    (content-addressed by its SHA-256). ref_count is kept by database
+    triggers on learners_response; see learners/blobs.py. The text is stored
+    compressed, so its length and search vector are stored alongside it.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    text = CompressedTextField()
+    length = models.PositiveIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True)
+
+    objects = MessageBlobManager()
+
+    def __str__(self):
+        return f"Message blob {self.digest[:12]} ({self.ref_count} references)"
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='messageblob_search_vector_idx'),
+            models.Index(fields=['ref_count'], name='messageblob_ref_count_idx', condition=models.Q(ref_count=0)),
+        ]
+
+class ResponseQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        # One transaction with the blob upsert, see Response.save()
+        with transaction.atomic(using=self.db, savepoint=False):
+            Response.attach_blobs(objs)
+            return super().bulk_create(objs, *args, **kwargs)
+
+class ResponseManager(models.Manager.from_queryset(ResponseQuerySet)):
+    def get_queryset(self):
+        # Message bodies live in MessageBlob; load them with the message
+        return super().get_queryset().select_related('blob').defer('blob__search_vector')
 
 class Response(models.Model):
     ROLE_CHOICES = [
@@ -40,12 +122,136 @@ class Response(models.Model):
     ]
 
     prompt = models.ForeignKey(LearnerPrompt, on_delete=models.CASCADE, related_name='messages')
-    text = models.TextField()
+    blob = models.ForeignKey(MessageBlob, on_delete=models.PROTECT, related_name='responses')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='assistant')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ResponseManager()
+
+    _text = None
+    _text_changed = False
+
     def __str__(self):
         return f"{self.role} message in conversation with {self.prompt.learner.email}"
 
+    @property
+    def text(self):
+        if self._text is None and self.blob_id is not None:
+            self._text = self.blob.text
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        self._text_changed = True
+
+    def cached_grade(self):
+        """The learner's grade when conversation and learner are already loaded; picks the compression dictionary"""
+        prompt_field = self._meta.get_field('prompt')
+        if not prompt_field.is_cached(self):
+            return None
+        prompt = prompt_field.get_cached_value(self)
+        learner_field = prompt._meta.get_field('learner')
+        return learner_field.get_cached_value(prompt).grade if learner_field.is_cached(prompt) else None
+
+    @classmethod
+    def attach_blobs(cls, responses):
+        """Point responses whose text was set at the matching blobs, one lookup per grade"""
+        by_grade = {}
+        for response in responses:
+            if response._text_changed:
+                by_grade.setdefault(response.cached_grade(), []).append(response)
+        for grade, pending in by_grade.items():
+            ids = MessageBlob.objects.intern((response._text for response in pending), grade)
+            for response in pending:
+                response.blob_id = ids[response._text]
+                response._text_changed = False
+
+    def save(self, *args, **kwargs):
+        # The upsert locks the blob row until the message referencing it is
+        # inserted, so gc_message_blobs (which skips locked rows) cannot delete
+        # an unreferenced blob that is being reused in between
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Response, instance=self), savepoint=False):
+            self.attach_blobs([self])
+            super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['prompt', '-created_at'], name='response_prompt_recent_idx'),
+        ]
+
+class ArchivedConversation(models.Model):
+    """Compressed cold copy of a conversation's messages, see learners/archive.py"""
+    conversation = models.OneToOneField(LearnerPrompt, on_delete=models.CASCADE, related_name='archive')
+    payload = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    last_message = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of conversation {self.conversation_id} ({self.message_count} messages)"
+
+class TextDictionary(models.Model):
+    """zstd dictionary trained on one grade's messages (blank grade: all grades), see learners/compression.py"""
+    grade = models.CharField(max_length=2, blank=True)
+    dict_id = models.PositiveBigIntegerField(unique=True)
+    data = models.BinaryField()
+    samples = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Text dictionary {self.dict_id} for grade {self.grade or 'all'}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['grade', '-created_at'], name='textdictionary_grade_idx'),
+        ]
+
+class BankedAnswer(models.Model):
+    """Pre-generated answer to one of a grade's most frequent opening questions, see learners/answer_bank.py"""
+    grade = models.CharField(max_length=2)
+    prompt_key = models.CharField(max_length=255)  # answer_bank.normalize_prompt() of the question
+    prompt = models.TextField()  # most common wording, the one the answer was generated for
+    answer = models.TextField()
+    occurrences = models.PositiveIntegerField(default=0)
+    model = models.CharField(max_length=100)
+    prompt_version = models.PositiveSmallIntegerField()
+    generated_at = models.DateTimeField()
+    mined_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Banked answer for grade {self.grade}: {self.prompt[:50]}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['grade', 'prompt_key'], name='unique_banked_answer_prompt'),
+        ]
+
+class LearnerDailyActivity(models.Model):
+    """Per learner per day rollup for the teacher and parent dashboards, see learners/activity.py"""
+    learner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity')
+    date = models.DateField()
+    message_count = models.PositiveIntegerField(default=0)
+    answer_count = models.PositiveIntegerField(default=0)
+    answer_characters = models.PositiveBigIntegerField(default=0)
+    conversations_started = models.PositiveIntegerField(default=0)
+    active_time = models.DurationField(default=timedelta)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Activity of learner {self.learner_id} on {self.date}"
+
+    @property
+    def active_minutes(self):
+        return int(self.active_time.total_seconds() // 60)
+
+    @property
+    def average_answer_length(self):
+        return round(self.answer_characters / self.answer_count) if self.answer_count else 0
+
     class Meta:
-        ordering = ['created_at']
\ No newline at end of file
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['learner', 'date'], name='unique_learner_daily_activity'),
+        ]
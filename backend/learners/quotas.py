@@ -0,0 +1,205 @@
+# learners/quotas.py
+"""
+Message throttles and daily token quotas for the chat endpoint
+(POST /api/learners/conversations/<id>/messages/).
+
+Every message counts against the conversation's learner and their school:
+messages per minute and estimated LLM tokens per (UTC) day, both in fixed
+windows. Parents and teachers can set the learner's own limits
+(PATCH /api/learners/<pk>/limits/) up to the settings defaults; null falls
+back to the default and 0 pauses the learner's chat. A 0 in the settings
+disables that limit instead. Learners without a school (blank or the model
+default) are only limited individually.
+
+check() runs before the view writes anything or calls the LLM and raises
+Throttled (429 with Retry-After). charge_tokens() adds a turn's usage once
+its answer is complete, so a running answer is never cut off; the next
+message is refused instead.
+
+Counters are kept in this process, or in the default cache when
+QUOTA_COUNTER_STORE is 'cache' (the default with REDIS_URL). Per-process
+counters multiply every limit by the number of worker processes.
+
+Each learner's limits are cached and dropped when their profile is saved.
+With the per-process LocMemCache only the worker that saved the profile
+would notice, so cached limits there live LOCAL_LIMITS_TIMEOUT seconds and
+a new limit (or a pause) reaches every worker within that time.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.exceptions import Throttled
+
+from .models import LearnerProfile
+
+MINUTE = 60
+DAY = 86400
+CHARS_PER_TOKEN = 4
+LIMITS_TIMEOUT = 300
+LOCAL_LIMITS_TIMEOUT = 5
+DEFAULT_SCHOOL = LearnerProfile._meta.get_field('school').default
+
+
+class LocalCounterStore:
+    """Fixed-window counters in this process; closed windows are swept once a minute"""
+
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.next_sweep = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.counts.get(key)
+        return entry[0] if entry is not None else 0
+
+    def incr(self, key, amount, ttl):
+        now = time.time()
+        with self.lock:
+            if now >= self.next_sweep:
+                self.counts = {k: entry for k, entry in self.counts.items() if entry[1] > now}
+                self.next_sweep = now + MINUTE
+            value, expires_at = self.counts.get(key, (0, now + ttl))
+            self.counts[key] = (value + amount, expires_at)
+        return value + amount
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+class CacheCounterStore:
+    """Fixed-window counters in the default cache, shared by every worker"""
+
+    def get(self, key):
+        return cache.get(key, 0)
+
+    def incr(self, key, amount, ttl):
+        cache.add(key, 0, ttl)
+        try:
+            return cache.incr(key, amount)
+        except ValueError:
+            # The window expired between add() and incr()
+            cache.set(key, amount, ttl)
+            return amount
+
+    def clear(self):
+        pass
+
+
+store = CacheCounterStore() if getattr(settings, 'QUOTA_COUNTER_STORE', 'local') == 'cache' else LocalCounterStore()
+
+
+def school_key(school):
+    """Short stable key for a school name, or None when the learner has no school"""
+    name = (school or '').strip().lower()
+    if not name or name == DEFAULT_SCHOOL.lower():
+        return None
+    return hashlib.sha256(name.encode()).hexdigest()[:16]
+
+
+def _limits_key(learner_id):
+    return f'quota-limits:{learner_id}'
+
+
+def limits_timeout():
+    return LOCAL_LIMITS_TIMEOUT if isinstance(caches['default'], LocMemCache) else LIMITS_TIMEOUT
+
+
+def _limit(override, default):
+    """The limit in effect: None for none (a 0 default), the learner's own value when set"""
+    return (default or None) if override is None else override
+
+
+def learner_limits(learner_id):
+    """Cached {'school', 'messages_per_minute', 'daily_token_quota'} in effect for the learner"""
+    limits = cache.get(_limits_key(learner_id))
+    if limits is None:
+        row = (
+            LearnerProfile.objects.filter(user_id=learner_id)
+            .values('school', 'messages_per_minute', 'daily_token_quota')
+            .first()
+        ) or {}
+        per_minute, daily = row.get('messages_per_minute'), row.get('daily_token_quota')
+        limits = {
+            'school': school_key(row.get('school')),
+            'messages_per_minute': _limit(per_minute, settings.LEARNER_MESSAGES_PER_MINUTE),
+            'daily_token_quota': _limit(daily, settings.LEARNER_DAILY_TOKENS),
+        }
+        cache.set(_limits_key(learner_id), limits, limits_timeout())
+    return limits
+
+
+def _window(seconds):
+    """(current window number, whole seconds until it closes)"""
+    now = time.time()
+    number = int(now // seconds)
+    return number, math.ceil((number + 1) * seconds - now)
+
+
+def _scopes(learner_id, limits):
+    """(scope, messages per minute, tokens per day) pairs the learner's messages count against"""
+    scopes = [(f'learner:{learner_id}', limits['messages_per_minute'], limits['daily_token_quota'])]
+    if limits['school']:
+        scopes.append((
+            f"school:{limits['school']}",
+            _limit(None, settings.SCHOOL_MESSAGES_PER_MINUTE),
+            _limit(None, settings.SCHOOL_DAILY_TOKENS),
+        ))
+    return scopes
+
+
+def check(learner_id):
+    """Count one message for the learner and their school; raises Throttled if a limit is spent"""
+    scopes = _scopes(learner_id, learner_limits(learner_id))
+    day, day_left = _window(DAY)
+    minute, minute_left = _window(MINUTE)
+
+    for scope, per_minute, daily_tokens in scopes:
+        if per_minute == 0 or daily_tokens == 0:
+            raise Throttled(detail='Chat is paused for this learner.')
+    # Token quotas first, so a refused message does not also use up a per-minute slot
+    for scope, _, daily_tokens in scopes:
+        if daily_tokens is not None and store.get(f'quota:{scope}:tokens:{day}') >= daily_tokens:
+            raise Throttled(wait=day_left, detail='Daily token quota reached.')
+    for scope, per_minute, _ in scopes:
+        if per_minute is not None and store.incr(f'quota:{scope}:messages:{minute}', 1, MINUTE) > per_minute:
+            raise Throttled(wait=minute_left, detail='Too many messages, please slow down.')
+
+
+def estimate_tokens(*texts):
+    return math.ceil(sum(len(text) for text in texts if text) / CHARS_PER_TOKEN)
+
+
+def charge_tokens(learner_id, tokens):
+    """Add a finished turn's tokens to the learner's and school's daily usage"""
+    if tokens <= 0:
+        return
+    day, _ = _window(DAY)
+    for scope, _, _ in _scopes(learner_id, learner_limits(learner_id)):
+        store.incr(f'quota:{scope}:tokens:{day}', tokens, DAY)
+
+
+def usage(learner_id):
+    """The learner's own usage in the current windows"""
+    minute, minute_left = _window(MINUTE)
+    day, day_left = _window(DAY)
+    return {
+        'messages_this_minute': store.get(f'quota:learner:{learner_id}:messages:{minute}'),
+        'tokens_today': store.get(f'quota:learner:{learner_id}:tokens:{day}'),
+        'tokens_reset_in': day_left,
+    }
+
+
+@receiver(post_save, sender=LearnerProfile)
+@receiver(post_delete, sender=LearnerProfile)
+def learner_limits_changed(sender, instance, **kwargs):
+    cache.delete(_limits_key(instance.user_id))
@@ -1,12 +1,51 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import LearnerProfile, LearnerPrompt, Response
+from .models import LearnerProfile, LearnerPrompt, Response, LearnerDailyActivity
+from .archive import load_archived_messages
+from . import quotas
+from backend.sparse_fields import SparseFieldsMixin
 
-class LearnerProfileSerializer(serializers.ModelSerializer):
+USER_SUMMARY = 'users.serializers.UserSummarySerializer'
+
+class LearnerProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LearnerProfile
         fields = '__all__'
+        # Only the learner's parent or teacher sets these, through LearnerLimitsSerializer
+        read_only_fields = ['messages_per_minute', 'daily_token_quota']
+        expandable_fields = {
+            'user': (USER_SUMMARY, {}),
+            'parent': (USER_SUMMARY, {}),
+            'teacher': (USER_SUMMARY, {}),
+        }
+
+class LearnerLimitsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    usage = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LearnerProfile
+        fields = ['id', 'user', 'messages_per_minute', 'daily_token_quota', 'usage']
+        read_only_fields = ['user']
 
-class ResponseSerializer(serializers.ModelSerializer):
+    def get_usage(self, obj):
+        return quotas.usage(obj.user_id)
+
+    def validate(self, attrs):
+        # Parents and teachers may lower or pause (0) a learner's limits, not raise them
+        request = self.context.get('request')
+        if request is not None and request.user.role != 'ADMIN':
+            defaults = {
+                'messages_per_minute': settings.LEARNER_MESSAGES_PER_MINUTE,
+                'daily_token_quota': settings.LEARNER_DAILY_TOKENS,
+            }
+            for field, default in defaults.items():
+                value = attrs.get(field)
+                if value is not None and default and value > default:
+                    raise serializers.ValidationError({field: f'Ensure this value is at most {default}, the default limit.'})
+        return attrs
+
+class ResponseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    text = serializers.CharField()  # Stored in MessageBlob, see Response.text
     prompt = serializers.CharField(write_only=True, required=False)  # For frontend compatibility
 
     class Meta:
@@ -19,7 +58,7 @@ class ResponseSerializer(serializers.ModelSerializer):
             data['text'] = data.pop('prompt')
         return data
 
-class ConversationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     messages = ResponseSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     prompt = serializers.CharField(write_only=True, required=True, source='text', allow_blank=True)  # For frontend compatibility
@@ -28,7 +67,44 @@ class ConversationSerializer(serializers.ModelSerializer):
         model = LearnerPrompt
         fields = ['id', 'title', 'prompt', 'created_at', 'updated_at', 'messages', 'last_message', 'last_message']
         read_only_fields = ['learner', 'title','text']
+        expandable_fields = {'learner': (USER_SUMMARY, {})}
 
     def get_last_message(self, obj):
-        last_message = obj.messages.last()
+        if obj.archived_at is not None:
+            return obj.archive.last_message
+        prefetched = getattr(obj, '_prefetched_objects_cache', {}).get('messages')
+        if prefetched is not None:
+            last_message = prefetched[len(prefetched) - 1] if prefetched else None
+        else:
+            last_message = obj.messages.last()
         return last_message.text if last_message else None
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.archived_at is not None and 'messages' in data:
+            # Archived conversations are listed straight from cold storage
+            data['messages'] = load_archived_messages(instance)
+        return data
+
+class MessageSearchResultSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    conversation = serializers.IntegerField(source='prompt_id', read_only=True)
+    conversation_title = serializers.CharField(read_only=True)
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Response
+        fields = ['id', 'conversation', 'conversation_title', 'role', 'created_at', 'rank', 'headline']
+
+class ConversationTitleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = LearnerPrompt
+        fields = ['id', 'title']
+
+class LearnerActivitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    active_minutes = serializers.IntegerField(read_only=True)
+    average_answer_length = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = LearnerDailyActivity
+        fields = ['learner', 'date', 'message_count', 'conversations_started', 'active_minutes', 'average_answer_length']
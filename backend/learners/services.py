@@ -1,10 +1,14 @@
 # learners/services.py
-import requests
 from django.conf import settings
 import json
 import logging
 import random
 from datetime import datetime
+from . import answer_bank
+from .compression import decompress
+from .models import Response
+from backend.fastjson import loads, sse_event
+from backend.routers import release_connections
 
 logger = logging.getLogger(__name__)
 
@@ -82,7 +86,27 @@ def get_simple_greeting_response(user_greeting, greeting):
     else:
         return f"{greeting}! What would you like to learn about today?"
 
-def format_conversation_history(conversation_history, max_messages=10):
+HISTORY_WINDOW = 10
+# Bump when the prompt template or generation parameters change: answer bank
+# entries generated under an older version are no longer served
+PROMPT_VERSION = 1
+
+class GenerationError(Exception):
+    """The AI service did not produce an answer"""
+
+def load_conversation_history(conversation, max_messages=HISTORY_WINDOW):
+    """Load the most recent messages of a conversation, oldest first, for AI context"""
+    rows = (
+        Response.objects
+        .filter(prompt=conversation)
+        .order_by('-created_at', '-id')
+        .values_list('role', 'blob__text')[:max_messages]
+    )
+    history = [{'role': role, 'text': decompress(text)} for role, text in rows.iterator()]
+    history.reverse()
+    return history
+
+def format_conversation_history(conversation_history, max_messages=HISTORY_WINDOW):
     """Format conversation history for AI context, prioritizing recent and relevant messages"""
     if not conversation_history or len(conversation_history) == 0:
         return ""
@@ -100,36 +124,20 @@ def format_conversation_history(conversation_history, max_messages=10):
     
     return formatted_history
 
-def generate_ai_response(prompt_text, stream=False, user_grade=None, conversation_history=None):
-    """Generate AI response using Together AI API with optional streaming support and grade-appropriate content"""
-    logger.info(f"Generating AI response for prompt: {prompt_text[:100]}...")
+def stream_text(text):
+    """SSE frames for a ready answer, one character per frame like the live stream"""
+    for char in text:
+        yield sse_event({'text': char, 'done': False})
+    yield sse_event({'text': '', 'done': True})
 
-    headers = {
+def api_headers():
+    return {
         "Authorization": f"Bearer {settings.TOGETHER_API_KEY}",
         "Content-Type": "application/json"
     }
 
-    # Get appropriate greeting
-    greeting = get_greeting()
-    
-    # Check if this is a greeting message
-    is_greeting = is_greeting_message(prompt_text)
-    
-    if is_greeting:
-        # For greetings, provide a simple, natural response
-        simple_response = get_simple_greeting_response(prompt_text, greeting)
-        
-        if stream:
-            # For streaming, yield the simple response character by character
-            def generate_simple_response():
-                for char in simple_response:
-                    yield f"data: {json.dumps({'text': char, 'done': False})}\n\n"
-                yield f"data: {json.dumps({'text': '', 'done': True})}\n\n"
-            return generate_simple_response()
-        else:
-            # For non-streaming, return the simple response directly
-            return simple_response
-    
+def build_payload(prompt_text, greeting, user_grade=None, conversation_history=None, stream=False):
+    """Chat completion request body for a question"""
     # Get grade-appropriate context for non-greeting messages
     grade_context = get_grade_level_context(user_grade) if user_grade else "Provide clear and educational responses appropriate for the student's level."
     
@@ -154,7 +162,7 @@ Remember to:
 - If the student is asking follow-up questions, build upon what was discussed before
 - Be direct and natural - don't repeat phrases like 'I'm happy to help' or 'I'm here to assist'"""
 
-    payload = {
+    return {
         "model": settings.TOGETHER_MODEL,
         "messages": [
             {"role": "system", "content": f"You are a knowledgeable AI teacher. {grade_context} Provide clear, direct educational responses. Don't use repetitive phrases like 'I'm happy to help' or 'I'm here to assist you' - just teach naturally."},
@@ -168,6 +176,62 @@ Remember to:
         "stream": stream  # Enable streaming when requested
     }
 
+def fetch_completion(prompt_text, user_grade=None):
+    """One non-streaming answer for offline jobs; raises GenerationError instead of returning an apology"""
+    import requests
+
+    # Neutral greeting: the answer may be served at any time of day
+    payload = build_payload(prompt_text, "Hello", user_grade)
+    try:
+        response = requests.post(settings.TOGETHER_API_URL, json=payload, headers=api_headers(), timeout=60)
+    except requests.exceptions.RequestException as e:
+        raise GenerationError(str(e)) from e
+    if response.status_code != 200:
+        raise GenerationError(handle_error_response(response))
+    try:
+        return response.json()["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError, ValueError) as e:
+        raise GenerationError(f"Unexpected API response: {e}") from e
+
+def generate_ai_response(prompt_text, stream=False, user_grade=None, conversation_history=None, use_bank=True):
+    """Generate AI response using Together AI API with optional streaming support and grade-appropriate content"""
+    logger.info(f"Generating AI response for prompt: {prompt_text[:100]}...")
+
+    headers = api_headers()
+
+    # Get appropriate greeting
+    greeting = get_greeting()
+    
+    # Check if this is a greeting message
+    is_greeting = is_greeting_message(prompt_text)
+    
+    if is_greeting:
+        # For greetings, provide a simple, natural response
+        simple_response = get_simple_greeting_response(prompt_text, greeting)
+        
+        if stream:
+            # For streaming, yield the simple response character by character
+            return stream_text(simple_response)
+        else:
+            # For non-streaming, return the simple response directly
+            return simple_response
+
+    # Frequent opening questions are answered from the pre-generated bank;
+    # banked answers ignore context, so not once the conversation is under way
+    if use_bank and not any(message['role'] == 'assistant' for message in conversation_history or ()):
+        banked = answer_bank.lookup(prompt_text, user_grade)
+        if stream:
+            # The lookup may have reopened the connection the view released before streaming
+            release_connections()
+        if banked is not None:
+            logger.info("Serving answer from the answer bank")
+            return stream_text(banked) if stream else banked
+
+    payload = build_payload(prompt_text, greeting, user_grade, conversation_history, stream)
+
+    # Imported on first use: the HTTP client stack is only needed once a question reaches the LLM
+    import requests
+
     try:
         logger.info("Sending request to Together AI API...")
         
@@ -184,7 +248,7 @@ Remember to:
             def generate():
                 if response.status_code != 200:
                     error_msg = handle_error_response(response)
-                    yield f"data: {json.dumps({'text': error_msg, 'done': True})}\n\n"
+                    yield sse_event({'text': error_msg, 'done': True})
                     return
 
                 accumulated_text = ""
@@ -195,10 +259,10 @@ Remember to:
                             if line_text.startswith('data: '):
                                 json_str = line_text[6:]  # Remove 'data: ' prefix
                                 if json_str.strip() == '[DONE]':
-                                    yield f"data: {json.dumps({'text': '', 'done': True})}\n\n"
+                                    yield sse_event({'text': '', 'done': True})
                                     break
                                 
-                                chunk = json.loads(json_str)
+                                chunk = loads(json_str)
                                 if 'choices' in chunk and len(chunk['choices']) > 0:
                                     delta = chunk['choices'][0].get('delta', {})
                                     if 'content' in delta:
@@ -206,7 +270,7 @@ Remember to:
                                         accumulated_text += text_chunk
                                         # Send each character individually for smooth typing animation
                                         for char in text_chunk:
-                                            yield f"data: {json.dumps({'text': char, 'done': False})}\n\n"
+                                            yield sse_event({'text': char, 'done': False})
                         except Exception as e:
                             logger.error(f"Error processing stream chunk: {str(e)}")
                             continue
@@ -0,0 +1,21 @@
+# learners/signals.py
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import LearnerPrompt, Response
+from .activity import record_activity
+
+@receiver(post_save, sender=LearnerPrompt)
+def count_conversation_started(sender, instance, created, **kwargs):
+    if created:
+        record_activity(instance.learner_id, instance.created_at, conversations=1)
+
+@receiver(post_save, sender=Response)
+def count_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    learner_id = instance.prompt.learner_id
+    if instance.role == 'user':
+        record_activity(learner_id, instance.created_at, messages=1)
+    else:
+        record_activity(learner_id, instance.created_at, answers=1, answer_characters=len(instance.text))
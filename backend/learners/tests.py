@@ -1,3 +1,669 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import zstandard
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldError
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.perf_budget import EndpointBudgetTestCase
+from backend.routers import release_connections
+from users.models import User
+from . import answer_bank, compression, export, quotas
+from .activity import rebuild_activity
+from .archive import archive_conversation, ensure_response_partitions, restore_conversation
+from .models import (
+    ArchivedConversation, BankedAnswer, LearnerDailyActivity, LearnerProfile, LearnerPrompt, MessageBlob, Response,
+    TextDictionary,
+)
+from .services import PROMPT_VERSION, generate_ai_response
+
+ROLES = ('admin', 'learner', 'teacher', 'parent')
+
+
+def stub_answer(prompt_text, stream=False, **kwargs):
+    """Stands in for the upstream LLM"""
+    answer = 'Leaves turn sunlight into food.'
+    if stream:
+        return iter([f'data: {{"text": "{char}", "done": false}}\n\n' for char in answer])
+    return answer
+
+
+class LearnerEndpointBudgetTests(EndpointBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.conversation = LearnerPrompt.objects.filter(learner=cls.users['learner']).first()
+        cls.profile = LearnerProfile.objects.get(user=cls.users['learner'])
+
+    def test_conversation_list(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/learners/conversations/', max_queries=5, max_ms=1000)
+
+    def test_conversation_list_sparse(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/learners/conversations/?fields=id,title,updated_at', max_queries=4, max_ms=150)
+
+    def test_conversation_detail(self):
+        path = f'/api/learners/conversations/{self.conversation.pk}/'
+        for role in ROLES:
+            self.measure(role, 'GET', path, max_queries=7, max_ms=150, label='/api/learners/conversations/<id>/')
+
+    def test_search(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/learners/conversations/search/?q=sunlight', max_queries=5, max_ms=300)
+
+    def test_autocomplete(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/learners/conversations/autocomplete/?q=plants', max_queries=4, max_ms=150)
+
+    def test_activity(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/learners/activity/', max_queries=4, max_ms=300)
+
+    def test_export(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/learners/conversations/export/?output=ndjson', max_queries=5, max_ms=1000)
+
+    def test_profile_detail(self):
+        path = f'/api/learners/{self.profile.pk}/'
+        for role in ('admin', 'learner'):
+            self.measure(role, 'GET', path, max_queries=2, max_ms=150, label='/api/learners/<pk>/')
+
+    def test_limits(self):
+        path = f'/api/learners/{self.profile.pk}/limits/'
+        for role in ROLES:
+            self.measure(role, 'GET', path, max_queries=2, max_ms=150, label='/api/learners/<pk>/limits/')
+
+    def test_create_conversation(self):
+        self.measure(
+            'learner', 'POST', '/api/learners/conversations/', max_queries=9, max_ms=300,
+            data={'prompt': 'How do bees make honey?'}, expected_status=201,
+        )
+
+    @mock.patch('learners.views.generate_ai_response', side_effect=stub_answer)
+    def test_send_message(self, generate):
+        path = f'/api/learners/conversations/{self.conversation.pk}/messages/'
+        label = '/api/learners/conversations/<id>/messages/'
+        self.measure('learner', 'POST', path, max_queries=13, max_ms=300, data={'text': 'And at night?'}, label=label)
+        self.measure(
+            'learner', 'POST', path + '?stream=true', max_queries=13, max_ms=300,
+            data={'text': 'What about cacti?'}, label=label + '?stream=true',
+        )
+        self.assertEqual(generate.call_count, 2)
+
+
+def make_learner(username, **fields):
+    user = User.objects.create(
+        username=username, email=f'{username}@example.com', role=User.Role.LEARNER, grade='5',
+        first_name=username.title(), last_name='Test', gender=User.Gender.OTHER, phone_number='0000000000',
+    )
+    LearnerProfile.objects.create(user=user, grade='5', **fields)
+    return user
+
+
+def make_conversation(learner, *texts):
+    """A conversation whose messages alternate user/assistant"""
+    conversation = LearnerPrompt.objects.create(learner=learner, text=texts[0], title=texts[0])
+    for index, text in enumerate(texts):
+        Response.objects.create(prompt=conversation, role='user' if index % 2 == 0 else 'assistant', text=text)
+    return conversation
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.learner = make_learner('archived-learner')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+        self.conversation = make_conversation(self.learner, 'What is a prime?', 'A number with two divisors.')
+        self.original = list(Response.objects.filter(prompt=self.conversation).order_by('id').values_list('id', 'role', 'created_at'))
+        self.assertEqual(archive_conversation(self.conversation), 2)
+        self.conversation.refresh_from_db()
+
+    def test_archive_moves_messages(self):
+        self.assertIsNotNone(self.conversation.archived_at)
+        self.assertFalse(Response.objects.filter(prompt=self.conversation).exists())
+        archive = ArchivedConversation.objects.get(conversation=self.conversation)
+        self.assertEqual(archive.message_count, 2)
+        self.assertEqual(archive.last_message, 'A number with two divisors.')
+
+    def test_detail_serves_archive_without_restoring(self):
+        response = self.client.get(f'/api/learners/conversations/{self.conversation.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['text'] for message in response.data['messages']],
+                         ['What is a prime?', 'A number with two divisors.'])
+        self.conversation.refresh_from_db()
+        self.assertIsNotNone(self.conversation.archived_at)
+        self.assertFalse(Response.objects.filter(prompt=self.conversation).exists())
+
+    def test_list_loads_archives_up_front(self):
+        make_conversation(self.learner, 'Second question', 'Second answer')
+        for index in range(3):
+            archive_conversation(make_conversation(self.learner, f'Old question {index}', f'Old answer {index}'))
+        # Groups, conversations with their archives, messages: however many are archived
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/learners/conversations/?fields=id,last_message')
+        self.assertEqual(response.status_code, 200)
+        last_messages = {row['last_message'] for row in response.data}
+        self.assertIn('A number with two divisors.', last_messages)
+        self.assertIn('Old answer 2', last_messages)
+
+    def test_rebuilt_activity_counts_archived_messages(self):
+        today = timezone.localdate()
+        rebuild_activity(today, today)
+        activity = LearnerDailyActivity.objects.get(learner=self.learner, date=today)
+        self.assertEqual((activity.conversations_started, activity.message_count, activity.answer_count), (1, 1, 1))
+        self.assertEqual(activity.answer_characters, len('A number with two divisors.'))
+
+    @mock.patch('learners.views.generate_ai_response', side_effect=stub_answer)
+    def test_message_restores_original_rows(self, generate):
+        response = self.client.post(f'/api/learners/conversations/{self.conversation.pk}/messages/', {'text': 'Is 9 prime?'})
+        self.assertEqual(response.status_code, 200)
+        self.conversation.refresh_from_db()
+        self.assertIsNone(self.conversation.archived_at)
+        self.assertIsNotNone(self.conversation.restored_at)
+        self.assertFalse(ArchivedConversation.objects.filter(conversation=self.conversation).exists())
+        restored = list(Response.objects.filter(prompt=self.conversation).order_by('id').values_list('id', 'role', 'created_at'))
+        self.assertEqual(restored[:2], self.original)
+        self.assertEqual(len(restored), 4)
+
+
+class ResponsePartitionTests(TestCase):
+    def test_late_partition_takes_over_rows_from_the_default_partition(self):
+        learner = make_learner('partition-learner')
+        conversation = make_conversation(learner, 'Written early', 'Answered early')
+        month = (timezone.now().replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        name = f'learners_response_p{month:%Y_%m}'
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {name}')
+        # Moves the rows into the default partition
+        Response.objects.filter(prompt=conversation).update(created_at=month + timedelta(days=1))
+        blob_counts = dict(MessageBlob.objects.filter(responses__prompt=conversation).values_list('id', 'ref_count'))
+
+        self.assertEqual(ensure_response_partitions(months_ahead=1), [name])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {name}')
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute('SELECT count(*) FROM learners_response_default WHERE prompt_id = %s', [conversation.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(Response.objects.filter(prompt=conversation).count(), 2)
+        self.assertEqual(
+            dict(MessageBlob.objects.filter(pk__in=blob_counts).values_list('id', 'ref_count')), blob_counts,
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.learner = make_learner('search-learner')
+        cls.other = make_learner('search-other')
+        cls.passing = make_conversation(
+            cls.learner, 'Tell me about mountains',
+            'Some mountains are volcanoes that formed over millions of years from layers of rock.',
+        )
+        cls.focused = make_conversation(
+            cls.learner, 'Why do volcanoes erupt?', 'Volcanoes erupt when magma rises. Active volcanoes erupt often.',
+        )
+        make_conversation(cls.other, 'Volcanoes on other planets', 'Mars has the largest volcano.')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+
+    def search(self, terms):
+        response = self.client.get('/api/learners/conversations/search/', {'q': terms})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_best_matches_come_first(self):
+        results = self.search('volcanoes erupt')
+        self.assertEqual(
+            [(result['conversation'], result['role']) for result in results],
+            [(self.focused.pk, 'assistant'), (self.focused.pk, 'user')],
+        )
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertEqual(results[0]['conversation_title'], 'Why do volcanoes erupt?')
+
+        ranked = self.search('volcano')
+        self.assertEqual(len(ranked), 3)
+        self.assertEqual(ranked[0]['conversation'], self.focused.pk)
+        self.assertEqual(ranked[-1]['conversation'], self.passing.pk)
+
+    def test_headlines_highlight_the_matched_terms(self):
+        [result, _] = self.search('volcanoes erupt')
+        self.assertIn('<b>Volcanoes</b> <b>erupt</b> when magma rises', result['headline'])
+
+    def test_results_are_scoped_to_visible_conversations(self):
+        self.assertNotIn('Mars', json.dumps(self.search('volcano')))
+        self.assertEqual(self.search(''), [])
+
+    def test_autocomplete_matches_visible_titles(self):
+        response = self.client.get('/api/learners/conversations/autocomplete/', {'q': 'VOLCANO'})
+        self.assertEqual([row['id'] for row in response.json()], [self.focused.pk])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = User.objects.create(username='export-parent', email='export-parent@example.com', role=User.Role.PARENT)
+        cls.learner = make_learner('export-learner', parent=cls.parent)
+        cls.other = make_learner('export-other')
+        cls.live = make_conversation(cls.learner, 'Hi, "quoted", text', 'Hello!\nHow can I help?')
+        cls.archived = make_conversation(cls.learner, 'An old question', 'An old answer')
+        archive_conversation(cls.archived)
+        make_conversation(cls.other, 'Not yours', 'Private')
+
+    def export(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/learners/conversations/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, body = self.export(self.learner)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="conversations.csv"')
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], export.CSV_HEADER)
+        self.assertEqual(
+            [(int(row[0]), row[1], row[3], row[5], row[6]) for row in rows[1:]],
+            [
+                (self.live.pk, self.live.title, 'export-learner', 'user', 'Hi, "quoted", text'),
+                (self.live.pk, self.live.title, 'export-learner', 'assistant', 'Hello!\nHow can I help?'),
+                (self.archived.pk, 'An old question', 'export-learner', 'user', 'An old question'),
+                (self.archived.pk, 'An old question', 'export-learner', 'assistant', 'An old answer'),
+            ],
+        )
+
+    def test_ndjson(self):
+        response, body = self.export(self.learner, output='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            [(line['type'], line['id'] if line['type'] == 'conversation' else line['text']) for line in lines],
+            [
+                ('conversation', self.live.pk), ('message', 'Hi, "quoted", text'), ('message', 'Hello!\nHow can I help?'),
+                ('conversation', self.archived.pk), ('message', 'An old question'), ('message', 'An old answer'),
+            ],
+        )
+        self.assertEqual(lines[0]['learner_username'], 'export-learner')
+        self.assertEqual(lines[1]['conversation'], self.live.pk)
+
+    def test_gzip_wraps_the_same_body(self):
+        _, plain = self.export(self.learner, output='ndjson')
+        response, body = self.export(self.learner, output='ndjson', gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="conversations.ndjson.gz"')
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_exports_are_scoped_to_visible_conversations(self):
+        def exported(user):
+            _, body = self.export(user, output='ndjson')
+            return {line['id'] for line in map(json.loads, body.splitlines()) if line['type'] == 'conversation'}
+
+        mine = {self.live.pk, self.archived.pk}
+        self.assertEqual(exported(self.parent), mine)
+        self.assertEqual(exported(self.other), set(LearnerPrompt.objects.filter(learner=self.other).values_list('id', flat=True)))
+        admin = User.objects.create(username='export-admin', email='export-admin@example.com', role=User.Role.ADMIN)
+        self.assertTrue(mine < exported(admin))
+
+    def test_unknown_output_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.learner)
+        self.assertEqual(client.get('/api/learners/conversations/export/', {'output': 'xml'}).status_code, 400)
+
+
+class ActivityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='activity-admin', role=User.Role.ADMIN, is_staff=True)
+        cls.learners = [make_learner(f'activity-learner{index}') for index in range(2)]
+        LearnerDailyActivity.objects.bulk_create([
+            LearnerDailyActivity(learner=learner, date=date(2026, 3, 1) + timedelta(days=day), message_count=1)
+            for learner in cls.learners
+            for day in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_pages_follow_learner_and_date(self):
+        url = '/api/learners/activity/?start=2026-03-01&end=2026-03-31&limit=4'
+        rows = []
+        self.client.get(url)  # loads the admin's cached relationships
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            rows += [(row['learner'], row['date']) for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(rows, [
+            (learner.pk, str(date(2026, 3, 1) + timedelta(days=day))) for learner in self.learners for day in range(3)
+        ])
+
+    def test_rebuild_leaves_today_alone_unless_asked(self):
+        today = timezone.localdate()
+        make_conversation(self.learners[0], 'Live question', 'Live answer')
+        LearnerDailyActivity.objects.filter(learner=self.learners[0], date=today).update(message_count=5)
+        self.assertEqual(rebuild_activity(today), 0)
+        self.assertEqual(LearnerDailyActivity.objects.get(learner=self.learners[0], date=today).message_count, 5)
+        self.assertEqual(rebuild_activity(today, today), 1)
+        self.assertEqual(LearnerDailyActivity.objects.get(learner=self.learners[0], date=today).message_count, 1)
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ('learner=abc', 'after=abc', 'after=1:not-a-date', 'start=yesterday'):
+            response = self.client.get(f'/api/learners/activity/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+@override_settings(LEARNER_MESSAGES_PER_MINUTE=2, LEARNER_DAILY_TOKENS=1000)
+class QuotaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = User.objects.create(username='quota-parent', email='quota-parent@example.com', role=User.Role.PARENT)
+        cls.learner = make_learner('quota-learner', parent=cls.parent)
+        cls.profile = LearnerProfile.objects.get(user=cls.learner)
+        cls.conversation = make_conversation(cls.learner, 'Why is the sky blue?', 'Scattering.')
+
+    def setUp(self):
+        cache.clear()
+        quotas.store.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+        self.path = f'/api/learners/conversations/{self.conversation.pk}/messages/'
+
+    def send(self):
+        with mock.patch('learners.views.generate_ai_response', side_effect=stub_answer):
+            return self.client.post(self.path, {'text': 'And at sunset?'})
+
+    def test_messages_per_minute(self):
+        self.assertEqual([self.send().status_code for _ in range(3)], [200, 200, 429])
+        self.assertIn('Retry-After', self.send())
+
+    def test_invalid_messages_do_not_use_slots(self):
+        self.assertEqual([self.client.post(self.path, {}).status_code for _ in range(3)], [400, 400, 400])
+        self.assertEqual(quotas.usage(self.learner.pk)['messages_this_minute'], 0)
+        self.assertEqual(self.send().status_code, 200)
+
+    def test_daily_tokens(self):
+        quotas.charge_tokens(self.learner.pk, 1000)
+        response = self.send()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(quotas.usage(self.learner.pk)['tokens_today'], 1000)
+
+    def test_zero_pauses_chat(self):
+        LearnerProfile.objects.filter(pk=self.profile.pk).update(daily_token_quota=0)
+        cache.clear()
+        self.assertEqual(self.send().status_code, 429)
+
+    def test_parents_cannot_raise_limits(self):
+        client = APIClient()
+        client.force_authenticate(self.parent)
+        path = f'/api/learners/{self.profile.pk}/limits/'
+        self.assertEqual(client.patch(path, {'daily_token_quota': 5000}, format='json').status_code, 400)
+        response = client.patch(path, {'daily_token_quota': 0, 'messages_per_minute': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['daily_token_quota'], 0)
+
+
+LONG_TEXT = ' '.join(f'Photosynthesis step {index} turns light, water and carbon dioxide into sugar.' for index in range(10))
+
+
+class StreamingConnectionTests(TransactionTestCase):
+    """Runs outside a test transaction: connections inside an atomic block are never released"""
+
+    def setUp(self):
+        cache.clear()
+        self.learner = make_learner('streaming-learner')
+        self.conversation = make_conversation(self.learner, 'How do plants eat?', 'They make food.')
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+        self.held = []
+
+    def upstream(self, prompt_text, stream=False, **kwargs):
+        self.held.append(connection.connection is not None)
+        for chunk in stub_answer(prompt_text, stream=True):
+            self.held.append(connection.connection is not None)
+            yield chunk
+
+    def test_connection_is_released_while_the_turn_streams(self):
+        with mock.patch('learners.views.generate_ai_response', side_effect=self.upstream):
+            response = self.client.post(
+                f'/api/learners/conversations/{self.conversation.pk}/messages/?stream=true', {'text': 'And at night?'},
+            )
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
+
+        self.assertTrue(self.held)
+        self.assertFalse(any(self.held))
+        # The final insert reacquired a connection
+        self.assertEqual(
+            self.conversation.messages.filter(role='assistant').order_by('id').last().text,
+            'Leaves turn sunlight into food.',
+        )
+
+    def test_connections_in_an_atomic_block_are_kept(self):
+        with transaction.atomic():
+            User.objects.count()
+            release_connections()
+            self.assertIsNotNone(connection.connection)
+        release_connections()
+        self.assertIsNone(connection.connection)
+
+
+def train_dictionary():
+    samples = [
+        f'Question {index}: why do {thing} need {need}? Because {thing} use {need} to grow and stay healthy.'.encode()
+        for index in range(300)
+        for thing, need in [('plants', 'sunlight'), ('animals', 'water'), ('people', 'food')]
+    ]
+    return zstandard.train_dictionary(2048, samples)
+
+
+class MessageStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.learner = make_learner('storage-learner')
+
+    def setUp(self):
+        compression.forget_dictionaries()
+        self.addCleanup(compression.forget_dictionaries)
+
+    def answer(self, text):
+        return make_conversation(self.learner, 'Question', text).messages.get(role='assistant')
+
+    def stored(self, response):
+        return bytes(MessageBlob.objects.filter(pk=response.blob_id).values_list('text', flat=True).get())
+
+    def test_short_text_is_stored_raw(self):
+        response = self.answer('Hi')
+        packed = self.stored(response)
+        self.assertEqual(packed[0], compression.RAW)
+        self.assertIsNone(compression.dictionary_id(packed))
+        self.assertEqual(Response.objects.get(pk=response.pk).text, 'Hi')
+
+    def test_long_text_without_dictionary(self):
+        response = self.answer(LONG_TEXT)
+        packed = self.stored(response)
+        self.assertEqual(packed[0], compression.ZSTD)
+        self.assertEqual(compression.dictionary_id(packed), 0)
+        self.assertLess(len(packed), len(LONG_TEXT))
+        self.assertEqual(Response.objects.get(pk=response.pk).text, LONG_TEXT)
+
+    def test_long_text_with_dictionary(self):
+        trained = train_dictionary()
+        TextDictionary.objects.create(grade='5', dict_id=trained.dict_id(), data=trained.as_bytes(), samples=900)
+        text = ' '.join(f'Question {index}: why do plants need sunlight?' for index in range(20))
+        response = self.answer(text)
+        packed = self.stored(response)
+        self.assertEqual(compression.dictionary_id(packed), trained.dict_id())
+        self.assertEqual(compression.decompress(packed), text)
+        self.assertEqual(Response.objects.get(pk=response.pk).text, text)
+
+    def test_text_lookups_are_rejected(self):
+        with self.assertRaises(FieldError):
+            MessageBlob.objects.filter(text='Hi').exists()
+        self.assertFalse(MessageBlob.objects.filter(text__isnull=True).exists())
+
+    def test_ref_count_follows_inserts_and_deletes(self):
+        conversation = make_conversation(self.learner, 'Shared text', 'Shared text')
+        blob = MessageBlob.objects.get(responses__prompt=conversation, responses__role='user')
+        self.assertEqual(blob.ref_count, 2)
+        Response.objects.bulk_create([Response(prompt=conversation, role='user', text='Shared text') for _ in range(3)])
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 5)
+        Response.objects.filter(pk__in=list(conversation.messages.values_list('pk', flat=True)[:2])).delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 3)
+
+    def test_ref_count_follows_archive_and_restore(self):
+        conversation = make_conversation(self.learner, 'Archived text', 'Archived text')
+        blob = MessageBlob.objects.get(responses__prompt=conversation, responses__role='user')
+        archive_conversation(conversation)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+        conversation.refresh_from_db()
+        restore_conversation(conversation)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+
+
+class MessageMigrationTests(TransactionTestCase):
+    """0012 (blobs) and 0013 (compression) forwards and backwards, keeping every text"""
+    before = [('learners', '0011_learnerprofile_chat_limits')]
+    after = [('learners', '0013_compressed_message_text')]
+
+    def setUp(self):
+        # Created with the current model: users' migrations are not rolled back
+        self.learner = User.objects.create(username='migrated-learner', email='migrated-learner@example.com', role=User.Role.LEARNER)
+        executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate, executor.loader.graph.leaf_nodes())
+        self.apps = self.migrate(self.before)
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_forwards_and_backwards(self):
+        conversation = self.apps.get_model('learners', 'LearnerPrompt').objects.create(
+            learner_id=self.learner.pk, text='Hi', title='Hi',
+        )
+        OldResponse = self.apps.get_model('learners', 'Response')
+        texts = ['Hi', 'Hi', LONG_TEXT]
+        OldResponse.objects.bulk_create([OldResponse(prompt=conversation, role='user', text=text) for text in texts])
+
+        apps = self.migrate(self.after)
+        blobs = apps.get_model('learners', 'MessageBlob').objects
+        self.assertEqual(
+            sorted((blob.ref_count, blob.length) for blob in blobs.all()), [(1, len(LONG_TEXT)), (2, 2)],
+        )
+        # Existing bodies are converted RAW; compress one as the --recompress job would
+        long_blob = blobs.filter(length=len(LONG_TEXT))
+        self.assertEqual(bytes(long_blob.values_list('text', flat=True).get())[0], compression.RAW)
+        long_blob.update(text=LONG_TEXT)
+        self.assertEqual(bytes(long_blob.values_list('text', flat=True).get())[0], compression.ZSTD)
+
+        apps = self.migrate(self.before)
+        self.assertEqual(
+            list(apps.get_model('learners', 'Response').objects.order_by('id').values_list('text', flat=True)), texts,
+        )
+
+
+class AnswerBankTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.learner = make_learner('bank-learner')
+        cls.older = User.objects.create(
+            username='bank-older', email='bank-older@example.com', role=User.Role.LEARNER, grade='7',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def bank(self, prompt, answer, **fields):
+        fields = {
+            'model': settings.TOGETHER_MODEL, 'prompt_version': PROMPT_VERSION, 'generated_at': timezone.now(), **fields,
+        }
+        return BankedAnswer.objects.create(
+            grade='5', prompt_key=answer_bank.normalize_prompt(prompt), prompt=prompt, answer=answer,
+            mined_at=timezone.now(), **fields,
+        )
+
+    def test_mining_counts_normalized_prompts_per_grade(self):
+        make_conversation(self.learner, 'What is photosynthesis?', 'An answer', 'What is photosynthesis?', 'An answer',
+                          'what is PHOTOSYNTHESIS', 'An answer', 'Why is the sky blue?', 'An answer',
+                          'Why is the sky blue?', 'An answer', 'Hello there', 'Hi!')
+        make_conversation(self.older, 'How do volcanoes erupt?', 'An answer', 'How do volcanoes erupt?', 'An answer')
+
+        mined = answer_bank.mine(timezone.now() - timedelta(days=1), top=1, min_count=2)
+        self.assertEqual(sorted(mined), ['5', '7'])
+        [top] = mined['5']
+        self.assertEqual((top.prompt_key, top.prompt, top.occurrences), ('what is photosynthesis', 'What is photosynthesis?', 3))
+        self.assertEqual([candidate.prompt for candidate in mined['7']], ['How do volcanoes erupt?'])
+        self.assertEqual(answer_bank.mine(timezone.now() - timedelta(days=1), top=5, min_count=4), {})
+
+    @mock.patch('requests.post', side_effect=AssertionError('the AI service was called'))
+    @mock.patch('learners.services.fetch_completion', side_effect=AssertionError('the AI service was called'))
+    def test_fresh_entry_is_streamed_without_the_ai_service(self, fetch_completion, post):
+        self.bank('What is photosynthesis?', 'Plants make food from light.')
+        frames = list(generate_ai_response('what is photosynthesis', stream=True, user_grade='5', conversation_history=[]))
+        text = ''.join(json.loads(frame.removeprefix('data: '))['text'] for frame in frames)
+        self.assertEqual(text, 'Plants make food from light.')
+        fetch_completion.assert_not_called()
+        post.assert_not_called()
+
+    def test_stale_entries_are_not_served(self):
+        prompt = 'Why is the sky blue?'
+        entry = self.bank(prompt, 'Scattering.')
+        self.assertEqual(answer_bank.lookup(prompt, '5'), 'Scattering.')
+        for stale in (
+            {'model': 'another/model'},
+            {'prompt_version': PROMPT_VERSION + 1},
+            {'generated_at': timezone.now() - answer_bank.max_age() - timedelta(minutes=1)},
+        ):
+            cache.clear()
+            current = {'model': settings.TOGETHER_MODEL, 'prompt_version': PROMPT_VERSION, 'generated_at': timezone.now()}
+            BankedAnswer.objects.filter(pk=entry.pk).update(**{**current, **stale})
+            self.assertIsNone(answer_bank.lookup(prompt, '5'), stale)
+        self.assertIsNone(answer_bank.lookup(prompt, '7'))
+
+    def test_generation_respects_the_concurrency_bound(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def fetch_completion(prompt, grade):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return f'Answer to {prompt}'
+
+        candidates = [answer_bank.Candidate('5', f'question number {index}', f'Question number {index}?', 5)
+                      for index in range(8)]
+        with mock.patch('learners.services.fetch_completion', side_effect=fetch_completion):
+            counts = answer_bank.refresh(candidates, concurrency=2, refresh_before=timezone.now())
+        self.assertEqual(counts['generated'], 8)
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(BankedAnswer.objects.filter(grade='5').count(), 8)
 
-# Create your tests here.
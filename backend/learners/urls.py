@@ -2,14 +2,24 @@
 from django.urls import path
 from .views import (
     LearnerProfileDetailView,
+    LearnerLimitsView,
     PromptListCreateView,
     ConversationDetailView,
-    MessageCreateView
+    MessageCreateView,
+    ConversationSearchView,
+    ConversationAutocompleteView,
+    LearnerActivityView,
+    ConversationExportView,
 )
 
 urlpatterns = [
     path('<int:pk>/', LearnerProfileDetailView.as_view(), name='learner-profile-detail'),
+    path('<int:pk>/limits/', LearnerLimitsView.as_view(), name='learner-limits'),
+    path('activity/', LearnerActivityView.as_view(), name='learner-activity'),
     path('conversations/', PromptListCreateView.as_view(), name='conversation-list-create'),
+    path('conversations/export/', ConversationExportView.as_view(), name='conversation-export'),
+    path('conversations/search/', ConversationSearchView.as_view(), name='conversation-search'),
+    path('conversations/autocomplete/', ConversationAutocompleteView.as_view(), name='conversation-autocomplete'),
     path('conversations/<int:pk>/', ConversationDetailView.as_view(), name='conversation-detail'),
     path('conversations/<int:conversation_id>/messages/', MessageCreateView.as_view(), name='message-create'),
 ]
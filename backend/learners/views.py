@@ -1,49 +1,110 @@
 from django.shortcuts import render
 
 from rest_framework import generics, permissions
+from rest_framework.pagination import BasePagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from users.permissions import IsAdminOrIsSelf, CanViewPrompt
-from .models import LearnerProfile, LearnerPrompt, Response
+from users.permissions import IsAdminOrIsSelf, CanManageLearner, CanViewPrompt
+from users.relationships import in_group, visible_learner_ids
+from users.authentication import CHAT_AUTHENTICATION_CLASSES
+from users.response_cache import conversation_scopes, response_cache
+from .models import LearnerProfile, LearnerPrompt, Response, LearnerDailyActivity
 from .serializers import (
     LearnerProfileSerializer, 
+    LearnerLimitsSerializer,
     ConversationSerializer,
-    ResponseSerializer
+    ResponseSerializer,
+    MessageSearchResultSerializer,
+    ConversationTitleSerializer,
+    LearnerActivitySerializer,
 )
-from rest_framework.exceptions import PermissionDenied
-from .services import generate_ai_response
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from .services import generate_ai_response, load_conversation_history
+from .archive import restore_conversation
+from .blobs import headlines
+from . import quotas
+from .export import buffered, gzipped, iter_csv, iter_message_rows, iter_ndjson
 from django.http import StreamingHttpResponse
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F, Max, Q
 from rest_framework.response import Response as DRFResponse
 from rest_framework import status
 import json
-from django.utils.timezone import now
+from django.utils.timezone import now, localdate
+from datetime import date, timedelta
+from backend.routers import PrimaryDatabaseMixin, release_connections
+from backend.conditional import make_etag, not_modified, set_validators
+from backend.fastjson import loads
+from backend.sparse_fields import expanded, expands_relations, field_requested
+
+def get_visible_learners(user):
+    """
+    Ids of the learners whose data the user may see: themselves for learners,
+    their students/children for teachers/parents. None means every learner (admins).
+    """
+    return visible_learner_ids(user)
+
+def get_visible_conversations(user):
+    """Conversations the user may see: all for admins, their own for learners, their students'/children's otherwise"""
+    learner_users = get_visible_learners(user)
+    if learner_users is None:
+        return LearnerPrompt.objects.all()
+    return LearnerPrompt.objects.filter(learner__in=learner_users)
+
+def get_limit(request, default, maximum):
+    try:
+        return max(1, min(int(request.query_params.get('limit', default)), maximum))
+    except ValueError:
+        return default
 
 # Custom permission so only learners can create prompts
 class IsLearner(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='Learner').exists()
+        return in_group(request.user, 'Learner')
 
 class LearnerProfileDetailView(generics.RetrieveUpdateAPIView):
     queryset = LearnerProfile.objects.select_related('user').all()
     serializer_class = LearnerProfileSerializer
     permission_classes = [IsAuthenticated, IsAdminOrIsSelf]
 
+class LearnerLimitsView(generics.RetrieveUpdateAPIView):
+    """
+    GET /api/learners/<pk>/limits/          → chat limits and today's usage of learner profile pk
+    PUT / PATCH /api/learners/<pk>/limits/  → set messages_per_minute / daily_token_quota (null = default)
+    """
+    queryset = LearnerProfile.objects.all()
+    serializer_class = LearnerLimitsSerializer
+    permission_classes = [IsAuthenticated, CanManageLearner]
+
 class PromptListCreateView(generics.ListCreateAPIView):
     serializer_class = ConversationSerializer
+    authentication_classes = CHAT_AUTHENTICATION_CLASSES
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'ADMIN':
-            return LearnerPrompt.objects.all()
-        elif user.role == 'LEARNER':
-            return LearnerPrompt.objects.filter(learner=user)
-        elif user.role == 'TEACHER':
-            learner_users = user.students.values_list('user', flat=True)
-            return LearnerPrompt.objects.filter(learner__in=learner_users)
-        elif user.role == 'PARENT':
-            learner_users = user.children.values_list('user', flat=True)
-            return LearnerPrompt.objects.filter(learner__in=learner_users)
-        return LearnerPrompt.objects.none()
+        conversations = get_visible_conversations(self.request.user)
+        # Load only what the requested fieldset (?fields= / ?expand=) will render
+        if field_requested(self.request, 'messages') or field_requested(self.request, 'last_message'):
+            # Archived conversations render from their archive row instead
+            conversations = conversations.prefetch_related('messages').select_related('archive')
+            if not field_requested(self.request, 'messages'):
+                conversations = conversations.defer('archive__payload')
+        if expanded(self.request, 'learner'):
+            conversations = conversations.select_related('learner')
+        return conversations
+
+    def list(self, request, *args, **kwargs):
+        if expands_relations(request):
+            # The expanded learner is not part of the cached scopes
+            return super().list(request, *args, **kwargs)
+        scopes = conversation_scopes(request.user)
+        cached = response_cache.lookup(request, 'conversations', scopes)
+        if cached is not None:
+            return cached
+        response = super().list(request, *args, **kwargs)
+        response_cache.store(request, 'conversations', scopes, response.data)
+        return response
 
     def perform_create(self, serializer):
         if self.request.user.role != 'LEARNER':
@@ -76,15 +137,9 @@ class ResponseListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        if user.role == 'LEARNER':
-            return Response.objects.filter(prompt__learner=user)
-        elif user.role == 'TEACHER':
-            learner_users = user.students.values_list('user', flat=True)
-            return Response.objects.filter(prompt__learner__in=learner_users)
-        elif user.role == 'PARENT':
-            learner_users = user.children.values_list('user', flat=True)
-            return Response.objects.filter(prompt__learner__in=learner_users)
-        return Response.objects.none()
+        if user.role not in ('LEARNER', 'TEACHER', 'PARENT'):
+            return Response.objects.none()
+        return Response.objects.filter(prompt__learner__in=get_visible_learners(user))
 
 class PromptDetailView(generics.RetrieveAPIView):
     queryset = LearnerPrompt.objects.all()
@@ -96,18 +151,7 @@ class ConversationListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'ADMIN':
-            return LearnerPrompt.objects.all()
-        elif user.role == 'LEARNER':
-            return LearnerPrompt.objects.filter(learner=user)
-        elif user.role == 'TEACHER':
-            learner_users = user.students.values_list('user', flat=True)
-            return LearnerPrompt.objects.filter(learner__in=learner_users)
-        elif user.role == 'PARENT':
-            learner_users = user.children.values_list('user', flat=True)
-            return LearnerPrompt.objects.filter(learner__in=learner_users)
-        return LearnerPrompt.objects.none()
+        return get_visible_conversations(self.request.user)
 
     def perform_create(self, serializer):
         if self.request.user.role != 'LEARNER':
@@ -128,24 +172,189 @@ class ConversationListCreateView(generics.ListCreateAPIView):
 
 class ConversationDetailView(generics.RetrieveAPIView):
     serializer_class = ConversationSerializer
+    authentication_classes = CHAT_AUTHENTICATION_CLASSES
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'ADMIN':
-            return LearnerPrompt.objects.all()
-        elif user.role == 'LEARNER':
-            return LearnerPrompt.objects.filter(learner=user)
-        elif user.role == 'TEACHER':
-            learner_users = user.students.values_list('user', flat=True)
-            return LearnerPrompt.objects.filter(learner__in=learner_users)
-        elif user.role == 'PARENT':
-            learner_users = user.children.values_list('user', flat=True)
-            return LearnerPrompt.objects.filter(learner__in=learner_users)
-        return LearnerPrompt.objects.none()
-
-class MessageCreateView(generics.CreateAPIView):
+        # Archived conversations are served read-only from the archive; the
+        # next message (MessageCreateView) restores them
+        conversations = get_visible_conversations(self.request.user).select_related('archive')
+        if expanded(self.request, 'learner'):
+            conversations = conversations.select_related('learner')
+        return conversations
+
+    def retrieve(self, request, *args, **kwargs):
+        conversation = self.get_object()
+        if expands_relations(request):
+            # The expanded learner changes without touching the conversation's version stamps
+            return DRFResponse(self.get_serializer(conversation).data)
+        # Message high-water mark: one aggregate over the (prompt, created_at) index
+        stamp = Response.objects.filter(prompt=conversation).aggregate(
+            last_id=Max('id'), last_at=Max('created_at'), count=Count('id'),
+        )
+        last_modified = max(filter(None, [conversation.updated_at, stamp['last_at']]))
+        etag = make_etag(
+            'conversation', conversation.pk, conversation.updated_at.isoformat(), conversation.archived_at,
+            stamp['last_id'], stamp['count'], request.META.get('QUERY_STRING', ''),
+        )
+        cached = not_modified(request, etag, last_modified)
+        if cached is not None:
+            return cached
+        serializer = self.get_serializer(conversation)
+        return set_validators(DRFResponse(serializer.data), etag, last_modified)
+
+class ConversationSearchView(generics.ListAPIView):
+    """
+    GET /api/learners/conversations/search/?q=<terms>[&limit=n]
+    Full-text search over the messages of conversations the user may see, best matches first.
+    """
+    serializer_class = MessageSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 20
+    max_limit = 50
+
+    def get_terms(self):
+        return self.request.query_params.get('q', '').strip()
+
+    def get_queryset(self):
+        terms = self.get_terms()
+        if not terms:
+            return Response.objects.none()
+
+        query = SearchQuery(terms, search_type='websearch', config='english')
+        return (
+            Response.objects
+            .filter(prompt__in=get_visible_conversations(self.request.user), blob__search_vector=query)
+            .annotate(
+                conversation_title=F('prompt__title'),
+                rank=SearchRank(F('blob__search_vector'), query),
+            )
+            .order_by('-rank', '-created_at')[:get_limit(self.request, self.default_limit, self.max_limit)]
+        )
+
+    def list(self, request, *args, **kwargs):
+        results = list(self.get_queryset())
+        # Bodies are stored compressed, so the page's texts are highlighted in a second round trip
+        for result, headline in zip(results, headlines([result.text for result in results], self.get_terms())):
+            result.headline = headline
+        return DRFResponse(self.get_serializer(results, many=True).data)
+
+class ConversationAutocompleteView(generics.ListAPIView):
+    """
+    GET /api/learners/conversations/autocomplete/?q=<text>
+    Conversation titles containing the text (trigram-indexed), most recent first.
+    """
+    serializer_class = ConversationTitleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_limit = 10
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            return LearnerPrompt.objects.none()
+        return (
+            get_visible_conversations(self.request.user)
+            .filter(title__icontains=text)
+            .only('id', 'title')[:self.max_limit]
+        )
+
+class ActivityPagination(BasePagination):
+    """
+    Keyset pages over (learner, date): ?after=<learner id>:<YYYY-MM-DD> resumes
+    behind the last row of the previous page, so every page is one range scan
+    of the unique (learner, date) index.
+    """
+    default_limit = 100
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        after = request.query_params.get('after')
+        if after:
+            try:
+                learner_id, day = after.split(':', 1)
+                learner_id, day = int(learner_id), date.fromisoformat(day)
+            except ValueError:
+                raise ValidationError({'after': 'Expected <learner id>:<YYYY-MM-DD>'})
+            queryset = queryset.filter(Q(learner_id__gt=learner_id) | Q(learner_id=learner_id, date__gt=day))
+        limit = get_limit(request, self.default_limit, self.max_limit)
+        rows = list(queryset[:limit + 1])
+        self.after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            self.after = f'{rows[-1].learner_id}:{rows[-1].date.isoformat()}'
+        return rows
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.after is not None:
+            next_url = replace_query_param(self.request.build_absolute_uri(), 'after', self.after)
+        return DRFResponse({'next': next_url, 'results': data})
+
+class LearnerActivityView(generics.ListAPIView):
+    """
+    GET /api/learners/activity/?start=YYYY-MM-DD&end=YYYY-MM-DD[&learner=<user id>][&limit=n]
+    Daily activity rollups for the learners the user may see (default: last 30 days),
+    in pages ordered by learner and date; follow `next` for the rest.
+    """
+    serializer_class = LearnerActivitySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ActivityPagination
+    default_days = 30
+    max_days = 366
+
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            end = date.fromisoformat(params['end']) if 'end' in params else localdate()
+            start = date.fromisoformat(params['start']) if 'start' in params else end - timedelta(days=self.default_days - 1)
+        except ValueError:
+            raise ValidationError({'detail': 'start and end must be YYYY-MM-DD dates'})
+        start = max(start, end - timedelta(days=self.max_days - 1))
+
+        queryset = LearnerDailyActivity.objects.filter(date__range=(start, end))
+        learner_users = get_visible_learners(self.request.user)
+        if learner_users is not None:
+            queryset = queryset.filter(learner__in=learner_users)
+        if 'learner' in params:
+            try:
+                queryset = queryset.filter(learner=int(params['learner']))
+            except ValueError:
+                raise ValidationError({'learner': 'Expected a user id'})
+        return queryset.order_by('learner_id', 'date')
+
+class ConversationExportView(APIView):
+    """
+    GET /api/learners/conversations/export/?output=csv|ndjson[&gzip=true]
+    Streams the transcripts of every conversation the user may see.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    formats = {
+        'csv': (iter_csv, 'text/csv'),
+        'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    }
+
+    def get(self, request):
+        output = request.query_params.get('output', 'csv').lower()
+        if output not in self.formats:
+            return DRFResponse({'detail': 'output must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+
+        encode, content_type = self.formats[output]
+        chunks = buffered(encode(iter_message_rows(get_visible_conversations(request.user))))
+        filename = f'conversations.{output}'
+        if request.query_params.get('gzip', 'false').lower() == 'true':
+            chunks = gzipped(chunks)
+            content_type = 'application/gzip'
+            filename += '.gz'
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class MessageCreateView(PrimaryDatabaseMixin, generics.CreateAPIView):
     serializer_class = ResponseSerializer
+    authentication_classes = CHAT_AUTHENTICATION_CLASSES
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
@@ -157,6 +366,12 @@ class MessageCreateView(generics.CreateAPIView):
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+
+        # Refuse over-limit messages before anything is written or sent
+        # upstream; invalid ones were turned away above without using a slot
+        quotas.check(conversation.learner_id)
+
+        restore_conversation(conversation)
         
         # Check if this is the first message in the conversation
         existing_user_messages = Response.objects.filter(prompt=conversation, role='user').count()
@@ -176,35 +391,36 @@ class MessageCreateView(generics.CreateAPIView):
 
         stream = request.query_params.get('stream', 'false').lower() == 'true'
 
+        # Use the user message text if available, otherwise use the conversation's text
+        prompt_text = user_message.text if user_message else conversation.text
+
+        # Get the recent conversation window for context
+        conversation_history = load_conversation_history(conversation)
+
+        # Pass user's grade and conversation history to the AI response generation
+        user_grade = self.request.user.grade
+        prompt_tokens = quotas.estimate_tokens(prompt_text, *(message['text'] for message in conversation_history))
+
         if stream:
-            # Use the user message text if available, otherwise use the conversation's text
-            prompt_text = user_message.text if user_message else conversation.text
-            
-            # Get conversation history for context
-            conversation_history = []
-            previous_responses = Response.objects.filter(prompt=conversation).order_by('created_at')
-            for response in previous_responses:
-                conversation_history.append({
-                    'role': response.role,
-                    'text': response.text,
-                    'created_at': response.created_at
-                })
-            
-            # Pass user's grade and conversation history to the AI response generation
-            user_grade = self.request.user.grade
+            # Everything the turn needs from the DB is loaded; hand the connection
+            # back instead of holding it for the whole upstream generation. The
+            # final insert below reacquires one (from the pool when DB_POOL is on).
+            release_connections()
+
             ai_stream = generate_ai_response(prompt_text, stream=True, user_grade=user_grade, conversation_history=conversation_history)
 
             def stream_and_store():
                 accumulated_text = ""
                 for chunk in ai_stream:
                     try:
-                        data = json.loads(chunk.strip().replace('data: ', ''))
+                        data = loads(chunk.strip().replace('data: ', ''))
                         if 'text' in data:
                             accumulated_text += data['text']
                         yield chunk
                     except Exception:
                         yield chunk
 
+                quotas.charge_tokens(conversation.learner_id, prompt_tokens + quotas.estimate_tokens(accumulated_text))
                 if accumulated_text.strip():
                     Response.objects.create(
                         prompt=conversation,
@@ -223,22 +439,8 @@ class MessageCreateView(generics.CreateAPIView):
             return response
 
         else:
-            # Use the user message text if available, otherwise use the conversation's text
-            prompt_text = user_message.text if user_message else conversation.text
-            
-            # Get conversation history for context
-            conversation_history = []
-            previous_responses = Response.objects.filter(prompt=conversation).order_by('created_at')
-            for response in previous_responses:
-                conversation_history.append({
-                    'role': response.role,
-                    'text': response.text,
-                    'created_at': response.created_at
-                })
-            
-            # Pass user's grade and conversation history to the AI response generation
-            user_grade = self.request.user.grade
             ai_response = generate_ai_response(prompt_text, stream=False, user_grade=user_grade, conversation_history=conversation_history)
+            quotas.charge_tokens(conversation.learner_id, prompt_tokens + quotas.estimate_tokens(ai_response))
             ai_message = Response.objects.create(
                 prompt=conversation,
                 role='assistant',
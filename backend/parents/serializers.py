@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from .models import ParentProfile
+from backend.sparse_fields import SparseFieldsMixin
 
-class ParentProfileSerializer(serializers.ModelSerializer):
+class ParentProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ParentProfile
         fields = '__all__'
-        read_only_fields = ['user']
\ No newline at end of file
+        read_only_fields = ['user']
+        expandable_fields = {'user': ('users.serializers.UserSummarySerializer', {})}
\ No newline at end of file
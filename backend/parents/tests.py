@@ -1,3 +1,10 @@
-from django.test import TestCase
+from backend.perf_budget import EndpointBudgetTestCase
+from .models import ParentProfile
 
-# Create your tests here.
+
+class ParentEndpointBudgetTests(EndpointBudgetTestCase):
+    def test_parent_detail(self):
+        profile = ParentProfile.objects.get(user=self.users['parent'])
+        for role in ('admin', 'parent'):
+            self.measure(role, 'GET', f'/api/parents/{profile.pk}/', max_queries=2, max_ms=150,
+                         label='/api/parents/<pk>/')
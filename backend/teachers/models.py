@@ -7,6 +7,7 @@ class TeacherProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='teacher_profile')
     subject = models.CharField(max_length=100)
     school = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
     # e.g., subjects, experience_years, etc.
 
     def __str__(self):
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from .models import TeacherProfile
+from backend.sparse_fields import SparseFieldsMixin
 
-class TeacherProfileSerializer(serializers.ModelSerializer):
+class TeacherProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TeacherProfile
         fields = '__all__'
+        expandable_fields = {'user': ('users.serializers.UserSummarySerializer', {})}
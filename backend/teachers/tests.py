@@ -1,3 +1,15 @@
-from django.test import TestCase
+from backend.perf_budget import EndpointBudgetTestCase
+from .models import TeacherProfile
 
-# Create your tests here.
+
+class TeacherEndpointBudgetTests(EndpointBudgetTestCase):
+    def test_teacher_list(self):
+        for role in ('admin', 'teacher'):
+            self.measure(role, 'GET', '/api/teachers/', max_queries=2, max_ms=150)
+            self.measure(role, 'GET', '/api/teachers/?expand=user', max_queries=2, max_ms=150)
+
+    def test_teacher_detail(self):
+        profile = TeacherProfile.objects.get(user=self.users['teacher'])
+        for role in ('admin', 'teacher'):
+            self.measure(role, 'GET', f'/api/teachers/{profile.pk}/', max_queries=2, max_ms=150,
+                         label='/api/teachers/<pk>/')
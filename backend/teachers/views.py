@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from users.permissions import IsAdminOrIsSelf
 from .models import TeacherProfile
 from .serializers import TeacherProfileSerializer
+from backend.sparse_fields import expanded
 
 class TeacherProfileDetailView(generics.RetrieveUpdateAPIView):
     """
@@ -17,4 +18,10 @@ class TeacherProfileDetailView(generics.RetrieveUpdateAPIView):
 
 class TeacherProfileListCreateView(generics.ListCreateAPIView):
     queryset = TeacherProfile.objects.all()
-    serializer_class = TeacherProfileSerializer
\ No newline at end of file
+    serializer_class = TeacherProfileSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if expanded(self.request, 'user'):
+            queryset = queryset.select_related('user')
+        return queryset
\ No newline at end of file
@@ -4,6 +4,11 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
-    
-def ready(self):
-    import users.signals
\ No newline at end of file
+
+    def ready(self):
+        # users.signals stays disconnected: it still imports the profile
+        # models from users.models, where they no longer live
+        import users.relationships
+        import users.authentication
+        import users.availability
+        import users.response_cache
@@ -0,0 +1,145 @@
+# users/authentication.py
+"""
+Authentication backends for the API.
+
+CachedTokenAuthentication is DRF token auth with a bounded in-process LRU of
+token key → (user, token), so repeat calls skip the token/user join for up to
+AUTH_TOKEN_CACHE_TTL seconds. Entries are evicted when the token is deleted
+(logout) or the user is saved (password change, deactivation, role change),
+but only in the process that made the change: other workers keep accepting
+a revoked token until their entry expires, at most AUTH_TOKEN_CACHE_TTL
+seconds later.
+
+SignedAccessTokenAuthentication accepts short-lived signed access tokens
+(`Authorization: Bearer <token>`, see SIMPLE_JWT) and builds the user from the
+token claims, so it needs no database query at all. It is only enabled on
+the chat endpoints via CHAT_AUTHENTICATION_CLASSES.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+
+
+class TokenUserCache:
+    """Thread-safe LRU of token key → (user, token, expiry) with a per-user reverse index"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.keys_by_user = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, token, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+        # Each request gets its own copies so per-request attributes never leak
+        return copy.copy(user), copy.copy(token)
+
+    def set(self, key, user, token):
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (copy.copy(user), copy.copy(token), time.monotonic() + self.ttl)
+            self.keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self._remove(next(iter(self.entries)))
+
+    def evict_key(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def evict_user(self, user_id):
+        with self.lock:
+            for key in list(self.keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            keys = self.keys_by_user.get(entry[0].pk)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_user[entry[0].pk]
+
+
+token_cache = TokenUserCache(
+    maxsize=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 15),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        # request.auth is the Token either way, so logout can delete it
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+def issue_access_token(user):
+    """Signed access token carrying the claims the chat endpoints need"""
+    token = AccessToken.for_user(user)
+    token['role'] = user.role
+    token['grade'] = user.grade
+    token['username'] = user.username
+    return token
+
+
+class SignedAccessTokenAuthentication(JWTStatelessUserAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user = User(
+                pk=validated_token[jwt_settings.USER_ID_CLAIM],
+                role=validated_token['role'],
+                grade=validated_token.get('grade', ''),
+                username=validated_token.get('username', ''),
+                is_active=True,
+            )
+        except KeyError:
+            raise InvalidToken('Token is missing user claims')
+        user._state.adding = False
+        return user
+
+
+CHAT_AUTHENTICATION_CLASSES = [SignedAccessTokenAuthentication, CachedTokenAuthentication]
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.evict_key(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        token_cache.evict_user(instance.pk)
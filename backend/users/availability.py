@@ -0,0 +1,154 @@
+# users/availability.py
+"""
+In-memory username availability index.
+
+A Bloom filter of lower-cased usernames answers "definitely free" without a
+query; only probable hits are confirmed against the database (case
+insensitively, through the UPPER(username) index). The filter is warmed from
+the users table on first use and is rebuilt when deletions have left too many
+stale entries.
+
+Users saved in this process are added by the post_save receiver. Every
+REFRESH_SECONDS the filter picks up users created or saved by other
+processes: ids above the highest one it has seen, and rows whose updated_at
+moved since the last poll (user_updated_at_idx). A name taken elsewhere can
+therefore be reported free for up to REFRESH_SECONDS. Renames must write
+updated_at: QuerySet.update() and save(update_fields=...) without it are
+not seen by other processes.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import User
+
+FALSE_POSITIVE_RATE = 0.01
+REFRESH_SECONDS = getattr(settings, 'USERNAME_INDEX_REFRESH_SECONDS', 5)
+MAX_BATCH = 20
+SUGGESTION_COUNT = 3
+# Saves committed just before a poll may carry an older updated_at, so each
+# poll looks back this far past the previous one
+POLL_OVERLAP = timedelta(minutes=1)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = max(capacity, 1024)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class UsernameIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.max_id = 0
+        self.stale = 0
+        self.refreshed_at = 0.0
+        self.polled_since = None
+
+    def warm(self):
+        """(Re)build the filter from every username in the database"""
+        started = timezone.now()
+        rows = User.objects.order_by().values_list('id', 'username')
+        total = User.objects.count()
+        bloom = BloomFilter(capacity=total * 2)
+        max_id = 0
+        for pk, username in rows.iterator(chunk_size=5000):
+            bloom.add(username.lower())
+            max_id = max(max_id, pk)
+        with self.lock:
+            self.bloom, self.max_id, self.stale = bloom, max_id, 0
+            self.refreshed_at, self.polled_since = time.monotonic(), started - POLL_OVERLAP
+
+    def add(self, pk, username):
+        key = username.lower()
+        with self.lock:
+            if self.bloom is None:
+                return
+            if key not in self.bloom:
+                self.bloom.add(key)
+            self.max_id = max(self.max_id, pk)
+
+    def mark_stale(self):
+        with self.lock:
+            self.stale += 1
+
+    def _refresh(self):
+        if self.bloom is None or self.stale > self.bloom.count // 10 or self.bloom.count > self.bloom.capacity:
+            self.warm()
+            return
+        if time.monotonic() - self.refreshed_at < REFRESH_SECONDS:
+            return
+        # Users created or renamed by other processes since the last look
+        started = timezone.now()
+        changed = User.objects.filter(Q(id__gt=self.max_id) | Q(updated_at__gte=self.polled_since))
+        for pk, username in changed.order_by().values_list('id', 'username'):
+            self.add(pk, username)
+        self.refreshed_at, self.polled_since = time.monotonic(), started - POLL_OVERLAP
+
+    def taken(self, usernames):
+        """The subset of usernames (compared case-insensitively) that already belong to a user"""
+        self._refresh()
+        with self.lock:
+            probable = {name.upper() for name in usernames if name.lower() in self.bloom}
+        if not probable:
+            return set()
+        confirmed = set(
+            User.objects.annotate(username_upper=Upper('username'))
+            .filter(username_upper__in=probable)
+            .values_list('username_upper', flat=True)
+        )
+        return {name for name in usernames if name.upper() in confirmed}
+
+    def is_available(self, username):
+        return not self.taken([username])
+
+    def suggest(self, username, count=SUGGESTION_COUNT):
+        """Free variations of a taken username; only ones the filter has never seen are offered"""
+        base = username.rstrip('0123456789_') or username
+        candidates = [f'{base}{n}' for n in range(1, 100)] + [f'{base}_{n}' for n in range(1, 100)]
+        with self.lock:
+            return [candidate for candidate in candidates if candidate.lower() not in self.bloom][:count]
+
+
+username_index = UsernameIndex()
+
+
+@receiver(post_save, sender=User)
+def username_saved(sender, instance, update_fields=None, **kwargs):
+    # New and renamed users are visible here at once, other processes pick
+    # them up on their next poll; a renamed user's old name stays in the
+    # filter and the database check settles it
+    if update_fields is None or 'username' in update_fields:
+        username_index.add(instance.pk, instance.username)
+
+
+@receiver(post_delete, sender=User)
+def username_deleted(sender, instance, **kwargs):
+    username_index.mark_stale()
@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from users.models import User
+from users.serializers import UsernameEmailLoginSerializer
+
+PASSWORD = 'bench-login-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark login validation throughput (single thread, so logins/sec per core) "
+        "for username, email, wrong-password and unknown-user attempts, comparing the "
+        "previous two-pass authenticate() flow with UsernameEmailLoginSerializer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Attempts per scenario')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        request = APIRequestFactory().post('/api/auth/login/')
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='bench-login', email='bench-login@example.com', password=PASSWORD,
+                first_name='Bench', last_name='Login', role=User.Role.LEARNER, grade='5',
+                gender=User.Gender.OTHER, phone_number='',
+            )
+            scenarios = [
+                ('username', user.username, PASSWORD),
+                ('email', user.email, PASSWORD),
+                ('wrong password', user.username, 'wrong'),
+                ('unknown user', 'nobody@example.com', PASSWORD),
+            ]
+            self.stdout.write(f"{'scenario':<16} {'flow':<12} {'logins/s':>9} {'queries':>8}")
+            for name, login, password in scenarios:
+                for flow, attempt in (('two-pass', self.two_pass), ('single-pass', self.single_pass)):
+                    rate, queries = self.measure(lambda: attempt(request, login, password), iterations)
+                    self.stdout.write(f"{name:<16} {flow:<12} {rate:>9.1f} {queries:>8}")
+            transaction.set_rollback(True)
+
+    def two_pass(self, request, login, password):
+        # The previous UsernameEmailLoginSerializer.validate
+        user = authenticate(username=login, password=password)
+        if user is None:
+            user = authenticate(email=login, password=password)
+        return user
+
+    def single_pass(self, request, login, password):
+        serializer = UsernameEmailLoginSerializer(
+            data={'login': login, 'password': password}, context={'request': request},
+        )
+        return serializer.validated_data['user'] if serializer.is_valid() else None
+
+    def measure(self, attempt, iterations):
+        with CaptureQueriesContext(connection) as queries:
+            attempt()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            attempt()
+        elapsed = time.perf_counter() - start
+        return iterations / elapsed, len(queries)
@@ -0,0 +1,124 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so every import is cold. Prints one JSON line of
+# phase timings on stdout; -X importtime writes per-module timings to stderr.
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+marks = {}
+import django
+from django.apps.config import AppConfig
+
+ready_times = {}
+create = AppConfig.create.__func__
+
+def timed_create(cls, entry):
+    app_config = create(cls, entry)
+    ready = app_config.ready
+    def timed_ready():
+        began = time.perf_counter()
+        ready()
+        ready_times[app_config.label] = time.perf_counter() - began
+    app_config.ready = timed_ready
+    return app_config
+
+AppConfig.create = classmethod(timed_create)
+
+from django.conf import settings
+settings.INSTALLED_APPS
+marks['settings'] = time.perf_counter()
+django.setup(set_prefix=False)
+marks['apps'] = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+marks['wsgi'] = time.perf_counter()
+
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': sys.argv[1], 'REQUEST_METHOD': 'GET', 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(application(environ, lambda code, headers, exc_info=None: status.append(code)))
+marks['first_request'] = time.perf_counter()
+
+print(json.dumps({
+    'phases': {name: at - start for name, at in marks.items()},
+    'ready': ready_times,
+    'status': status[0] if status else None,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile a cold start in a fresh interpreter: time to settings, app registry "
+        "(with each AppConfig.ready), WSGI handler and first served request, plus import "
+        "time per package and the slowest top-level imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/users/csrf/', help='URL served as the first request')
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to run; timings are medians')
+        parser.add_argument('--top', type=int, default=15, help='Rows in the package and module tables')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'PYTHONDONTWRITEBYTECODE': '0'}
+        env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'))
+        runs = [self.cold_start(options['path'], env) for _ in range(max(1, options['runs']))]
+
+        status = runs[-1]['status']
+        self.stdout.write(f"First request {options['path']} → {status}")
+        self.stdout.write(f"\n{'phase':<16} {'ms since start':>15}")
+        for phase in ('settings', 'apps', 'wsgi', 'first_request'):
+            self.stdout.write(f"{phase:<16} {self.median(runs, 'phases', phase):>15.1f}")
+
+        self.stdout.write(f"\n{'AppConfig.ready':<40} {'ms':>8}")
+        ready = {label: self.median(runs, 'ready', label) for label in runs[-1]['ready']}
+        for label, ms in sorted(ready.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{label:<40} {ms:>8.1f}")
+
+        packages, modules = runs[-1]['imports']
+        self.stdout.write(f"\n{'package (self import time)':<40} {'ms':>8}")
+        for package, us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{package:<40} {us / 1000:>8.1f}")
+        self.stdout.write(f"\n{'top-level import (cumulative)':<40} {'ms':>8}")
+        for module, us in sorted(modules.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{module:<40} {us / 1000:>8.1f}")
+
+    def cold_start(self, path, env):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+        if result.returncode or not lines:
+            errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+            raise RuntimeError('Cold start failed:\n' + '\n'.join(errors[-20:]))
+        run = json.loads(lines[-1])
+        run['imports'] = self.parse_importtime(result.stderr)
+        return run
+
+    def parse_importtime(self, stderr):
+        """Self time per top-level package and cumulative time per import made directly by startup code"""
+        packages = defaultdict(int)
+        modules = {}
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip())) // 2
+            name = name.strip()
+            packages[name.split('.')[0]] += int(self_us)
+            if depth == 0:
+                modules[name] = modules.get(name, 0) + int(cumulative_us)
+        return packages, modules
+
+    def median(self, runs, section, key):
+        return statistics.median(run[section].get(key, 0) * 1000 for run in runs)
@@ -0,0 +1,40 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.provisioning import ROSTER_FIELDS, RosterError, parse_roster, provision_roster
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create users, their profiles and learner→parent/teacher links from a CSV or JSON roster. "
+        f"Columns: {', '.join(ROSTER_FIELDS)} (parent/teacher are usernames or emails)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: CPU count)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        try:
+            rows = parse_roster(path.read_text(encoding='utf-8-sig'), fmt)
+        except (OSError, RosterError, json.JSONDecodeError) as exc:
+            raise CommandError(str(exc))
+
+        report = provision_roster(
+            rows,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            dry_run=options['dry_run'],
+        )
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {'; '.join(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} of {report['total']} row(s) created, {len(report['errors'])} rejected"
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_user_profile_photo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="adminprofile",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
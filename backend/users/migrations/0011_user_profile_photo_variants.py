@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_adminprofile_updated_at_user_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_photo_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:50
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0011_user_profile_photo_variants"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                django.db.models.functions.text.Upper("username"),
+                name="user_username_upper_idx",
+            ),
+        ),
+    ]
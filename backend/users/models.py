@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from django.db.models.functions import Upper
 
 
 class UserManager(BaseUserManager):
@@ -84,12 +85,23 @@ class User(AbstractUser):
     date_joined = models.DateTimeField(default=timezone.now)
     grade = models.CharField(max_length=2, choices=Grade.choices, blank=True)
     profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    profile_photo_variants = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Serve case-insensitive lookups (username__iexact / email__iexact)
+            models.Index(Upper('username'), name='user_username_upper_idx'),
+            models.Index(Upper('email'), name='user_email_upper_idx'),
+            # Polled by users.availability for users saved by other processes
+            models.Index(fields=['updated_at'], name='user_updated_at_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} ({self.role})"
 
@@ -97,6 +109,7 @@ class User(AbstractUser):
 
 class AdminProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='admin_profile')
+    updated_at = models.DateTimeField(auto_now=True)
     # add admin-specific fields here
 
 # class ParentProfile(models.Model):
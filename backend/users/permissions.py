@@ -1,4 +1,5 @@
-from rest_framework.permissions import BasePermission
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+from .relationships import can_see_learner
 
 
 class IsRole(BasePermission):
@@ -20,11 +21,15 @@ class IsRole(BasePermission):
         return user.is_authenticated and user.role == self.required_role
 
 
+class IsAdminRole(IsRole):
+    required_role = 'ADMIN'
+
+
 class IsOwnerOrRelated(BasePermission):
     """
     Object-level permission to allow access only if:
     - User is the owner (`obj.user`)
-    - OR the object is related to the user as teacher/parent
+    - OR the owner is a learner related to the user as teacher/parent
     - OR the user is an admin
     """
 
@@ -33,19 +38,10 @@ class IsOwnerOrRelated(BasePermission):
         if not user.is_authenticated:
             return False
 
-        if user.role == 'admin':
-            return True  # Admins can access anything
-
-        if hasattr(obj, 'user') and obj.user == user:
-            return True
-
-        if user.role == 'teacher' and hasattr(obj, 'teacher') and obj.teacher == user:
+        owner_id = getattr(obj, 'user_id', None)
+        if owner_id == user.pk:
             return True
-
-        if user.role == 'parent' and hasattr(obj, 'parent') and obj.parent == user:
-            return True
-
-        return False
+        return owner_id is not None and can_see_learner(user, owner_id)
 
 
 class IsAdminOrIsSelf(BasePermission):
@@ -58,22 +54,28 @@ class IsAdminOrIsSelf(BasePermission):
     def has_object_permission(self, request, view, obj):
         user = request.user
         return user.is_authenticated and (
-            user.role == 'admin' or getattr(obj, 'user', None) == user
+            user.role == 'ADMIN' or getattr(obj, 'user_id', None) == user.pk
         )
 
-class CanViewPrompt(BasePermission):
+class CanManageLearner(BasePermission):
     """
-    Learners can view only their prompts. Parents and teachers can view prompts of learners related to them.
+    Object-level permission on a LearnerProfile:
+    - Read: the learner, their parent or teacher, or an admin
+    - Write: only the parent, teacher or an admin
     """
 
     def has_object_permission(self, request, view, obj):
         user = request.user
-        if user.role == 'admin':
+        if not user.is_authenticated:
+            return False
+        if user.role == 'ADMIN' or user.pk in (obj.parent_id, obj.teacher_id):
             return True
-        if user.role == 'learner':
-            return obj.learner == user
-        if user.role == 'parent':
-            return obj.learner.parent_profile.user == user
-        if user.role == 'teacher':
-            return obj.learner.teacher_profile.user == user
-        return False
+        return request.method in SAFE_METHODS and obj.user_id == user.pk
+
+class CanViewPrompt(BasePermission):
+    """
+    Learners can view only their prompts. Parents and teachers can view prompts of learners related to them.
+    """
+
+    def has_object_permission(self, request, view, obj):
+        return can_see_learner(request.user, obj.learner_id)
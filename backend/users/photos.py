@@ -0,0 +1,125 @@
+# users/photos.py
+"""
+Profile photo pipeline.
+
+The request thread only sniffs the image header (format and dimensions) and
+stores the original under a content-hashed name, so identical uploads share
+one file. Decoding and resizing happen in a small worker pool after the
+transaction commits; the resulting WebP/JPEG variants are also content-hashed
+and therefore safe to serve with far-future cache headers.
+"""
+
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = (48, 128, 256)
+VARIANT_FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}), 'jpeg': ('JPEG', {'quality': 85, 'optimize': True})}
+ALLOWED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+MAX_UPLOAD_BYTES = getattr(settings, 'PROFILE_PHOTO_MAX_BYTES', 10 * 1024 * 1024)
+MAX_PIXELS = getattr(settings, 'PROFILE_PHOTO_MAX_PIXELS', 40_000_000)
+PHOTO_DIR = 'profile_photos'
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PROFILE_PHOTO_WORKERS', 2), thread_name_prefix='photos')
+
+
+class PhotoError(ValueError):
+    pass
+
+
+def sniff_photo(data):
+    """Check format and dimensions from the header only; returns the file extension"""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise PhotoError(f'Profile photo must be smaller than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB')
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            fmt, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, OSError):
+        raise PhotoError('Upload a valid JPEG, PNG, WebP or GIF image')
+    if fmt not in ALLOWED_FORMATS:
+        raise PhotoError('Upload a valid JPEG, PNG, WebP or GIF image')
+    if width * height > MAX_PIXELS:
+        raise PhotoError('Profile photo dimensions are too large')
+    return ALLOWED_FORMATS[fmt]
+
+
+def original_name(digest, extension):
+    return f'{PHOTO_DIR}/{digest[:2]}/{digest}.{extension}'
+
+
+def variant_name(digest, size, extension):
+    return f'{PHOTO_DIR}/{digest[:2]}/{digest}-{size}.{extension}'
+
+
+def store_profile_photo(user, upload):
+    """
+    Validate and store an uploaded photo for the user and queue its variants.
+    The caller saves the user; variants are generated once that commits.
+    """
+    data = upload.read()
+    extension = sniff_photo(data)
+    digest = hashlib.sha256(data).hexdigest()
+    name = original_name(digest, extension)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+
+    user.profile_photo.name = name
+    user.profile_photo_variants = {}
+    transaction.on_commit(lambda: executor.submit(generate_variants, user.pk, name, digest))
+    return name
+
+
+def render_variants(data, digest):
+    """Decode once and write every missing size/format; returns {size: {format: name}}"""
+    variants = {}
+    image = None
+    try:
+        for size in VARIANT_SIZES:
+            for extension, (fmt, options) in VARIANT_FORMATS.items():
+                name = variant_name(digest, size, extension)
+                variants.setdefault(str(size), {})[extension] = name
+                if default_storage.exists(name):
+                    continue  # identical upload already processed
+                if image is None:
+                    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+                    image.load()
+                    image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+                if fmt == 'JPEG' and thumbnail.mode != 'RGB':
+                    background = Image.new('RGB', thumbnail.size, (255, 255, 255))
+                    background.paste(thumbnail, mask=thumbnail.getchannel('A'))
+                    thumbnail = background
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, fmt, **options)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    finally:
+        if image is not None:
+            image.close()
+    return variants
+
+
+def generate_variants(user_id, name, digest):
+    """Worker-pool task: build the variants and record them if the photo is still current"""
+    try:
+        with default_storage.open(name) as original:
+            variants = render_variants(original.read(), digest)
+    except Exception:
+        logger.exception('Could not process profile photo %s', name)
+        return
+
+    user = User.objects.filter(pk=user_id, profile_photo=name).first()
+    if user is None:
+        return  # replaced by a newer upload meanwhile
+    user.profile_photo_variants = variants
+    user.save(update_fields=['profile_photo_variants', 'updated_at'])
@@ -0,0 +1,300 @@
+# users/provisioning.py
+"""
+Bulk roster provisioning: creates users, their role profiles and the
+learner → parent/teacher links from one CSV or JSON roster.
+
+Rows are checked with the model fields' validators (lengths, email format)
+and AUTH_PASSWORD_VALIDATORS. Passwords are hashed in a process pool, rows
+are inserted with bulk_create in batched transactions, and every rejected
+row is reported with its reason.
+"""
+
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from .models import User, AdminProfile
+from .relationships import invalidate_relationships
+from .response_cache import bump
+from learners.models import LearnerProfile
+from parents.models import ParentProfile
+from teachers.models import TeacherProfile
+
+ROSTER_FIELDS = [
+    'username', 'email', 'first_name', 'last_name', 'role', 'gender', 'phone_number',
+    'grade', 'password', 'school', 'subject', 'address', 'parent', 'teacher',
+]
+REQUIRED_FIELDS = ['username', 'email', 'first_name', 'last_name', 'role']
+# Parents and teachers are created before learners so links can point at them
+ROLE_ORDER = [User.Role.ADMIN, User.Role.PARENT, User.Role.TEACHER, User.Role.LEARNER]
+USER_COLUMNS = ['username', 'email', 'first_name', 'last_name', 'phone_number']
+PROFILE_COLUMNS = {
+    User.Role.PARENT: (ParentProfile, ['address']),
+    User.Role.TEACHER: (TeacherProfile, ['subject', 'school']),
+    User.Role.LEARNER: (LearnerProfile, ['school']),
+}
+
+
+class RosterError(ValueError):
+    pass
+
+
+def parse_roster(data, fmt):
+    """Parse roster text (CSV with a header row, or a JSON list of objects) into row dicts"""
+    if fmt == 'csv':
+        return [
+            {key.strip(): (value or '').strip() for key, value in row.items() if key}
+            for row in csv.DictReader(io.StringIO(data))
+        ]
+    if fmt == 'json':
+        rows = json.loads(data)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise RosterError('JSON roster must be a list of objects')
+        return [{key: str(value).strip() for key, value in row.items() if value is not None} for row in rows]
+    raise RosterError(f'Unsupported roster format: {fmt}')
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords across processes; blank passwords become unusable ones without hashing"""
+    to_hash = [(index, password) for index, password in enumerate(passwords) if password]
+    hashed = [make_password(None) for _ in passwords]
+    if not to_hash:
+        return hashed
+
+    if workers == 1:
+        results = map(make_password, (password for _, password in to_hash))
+        for (index, _), encoded in zip(to_hash, results):
+            hashed[index] = encoded
+        return hashed
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        results = pool.map(make_password, (password for _, password in to_hash), chunksize=32)
+        for (index, _), encoded in zip(to_hash, results):
+            hashed[index] = encoded
+    return hashed
+
+
+def field_problems(row, role):
+    """Messages from the validators of the model fields the row's values are stored in"""
+    fields = [User._meta.get_field(column) for column in USER_COLUMNS]
+    model, columns = PROFILE_COLUMNS.get(role, (None, []))
+    fields += [model._meta.get_field(column) for column in columns]
+    problems = []
+    for field in fields:
+        if row.get(field.name):
+            try:
+                field.run_validators(row[field.name])
+            except ValidationError as exc:
+                problems += [f'{field.name}: {message}' for message in exc.messages]
+
+    if row.get('password'):
+        user = User(**{column: row.get(column, '') for column in USER_COLUMNS})
+        try:
+            validate_password(row['password'], user=user)
+        except ValidationError as exc:
+            problems += [f'password: {message}' for message in exc.messages]
+    return problems
+
+
+def validate_rows(rows):
+    """Return (valid rows, errors) where errors are {'row': n, 'errors': [...]} with 1-based row numbers"""
+    errors = []
+    valid = []
+    roles = set(User.Role.values)
+    grades = set(User.Grade.values)
+    genders = set(User.Gender.values)
+    seen_usernames = set()
+    seen_emails = set()
+
+    for number, row in enumerate(rows, start=1):
+        problems = [f'{field} is required' for field in REQUIRED_FIELDS if not row.get(field)]
+        role = row.get('role', '').upper()
+        if role and role not in roles:
+            problems.append(f'role must be one of {", ".join(sorted(roles))}')
+        if role == User.Role.LEARNER and row.get('grade') not in grades:
+            problems.append('grade is required for learners (1-12)')
+        if row.get('gender') and row['gender'] not in genders:
+            problems.append('gender must be M, F or O')
+        if row.get('email'):
+            row = {**row, 'email': User.objects.normalize_email(row['email'])}
+        problems += field_problems(row, role)
+
+        username = row.get('username', '').upper()
+        email = row.get('email', '').upper()
+        if username and username in seen_usernames:
+            problems.append('duplicate username in roster')
+        if email and email in seen_emails:
+            problems.append('duplicate email in roster')
+        seen_usernames.add(username)
+        seen_emails.add(email)
+
+        if problems:
+            errors.append({'row': number, 'errors': problems})
+        else:
+            valid.append((number, {**row, 'role': role}))
+
+    # One query for collisions with existing accounts; usernames and emails are
+    # unique regardless of case, compared on the indexed Upper() expressions
+    if valid:
+        taken = User.objects.annotate(username_upper=Upper('username'), email_upper=Upper('email')).filter(
+            Q(username_upper__in=[row['username'].upper() for _, row in valid])
+            | Q(email_upper__in=[row['email'].upper() for _, row in valid])
+        ).values_list('username_upper', 'email_upper')
+        taken_usernames = {username for username, _ in taken}
+        taken_emails = {email for _, email in taken}
+        still_valid = []
+        for number, row in valid:
+            problems = []
+            if row['username'].upper() in taken_usernames:
+                problems.append('username already exists')
+            if row['email'].upper() in taken_emails:
+                problems.append('email already exists')
+            if problems:
+                errors.append({'row': number, 'errors': problems})
+            else:
+                still_valid.append((number, row))
+        valid = still_valid
+    return valid, errors
+
+
+def resolve_links(valid):
+    """Map every existing user referenced as a parent/teacher (by username or email) to (id, role)"""
+    references = {row[key] for _, row in valid for key in ('parent', 'teacher') if row.get(key)}
+    if not references:
+        return {}
+
+    known = {}
+    for pk, username, email, role in User.objects.filter(
+        Q(username__in=references) | Q(email__in=references)
+    ).values_list('pk', 'username', 'email', 'role'):
+        known[username] = known[email] = (pk, role)
+    return known
+
+
+def _build_user(row, password):
+    return User(
+        username=row['username'],
+        email=row['email'],
+        first_name=row['first_name'],
+        last_name=row['last_name'],
+        role=row['role'],
+        gender=row.get('gender', ''),
+        phone_number=row.get('phone_number', ''),
+        grade=row.get('grade', '') if row['role'] == User.Role.LEARNER else '',
+        password=password,
+    )
+
+
+def _build_profile(user, row, links):
+    if user.role == User.Role.ADMIN:
+        return AdminProfile(user=user)
+    if user.role == User.Role.PARENT:
+        return ParentProfile(user=user, address=row.get('address', ''))
+    if user.role == User.Role.TEACHER:
+        return TeacherProfile(user=user, subject=row.get('subject', ''), school=row.get('school', ''))
+    return LearnerProfile(
+        user=user,
+        grade=row.get('grade') or 'Grade',
+        school=row.get('school') or 'School',
+        parent_id=links.get(row.get('parent'), (None,))[0],
+        teacher_id=links.get(row.get('teacher'), (None,))[0],
+    )
+
+
+def _insert_batch(batch, links):
+    """Insert one batch; returns the number of users created"""
+    users = User.objects.bulk_create([user for _, user, _ in batch])
+    for user in users:
+        if user.role in (User.Role.PARENT, User.Role.TEACHER):
+            links[user.username] = links[user.email] = (user.pk, user.role)
+
+    profiles = {}
+    for (_, _, row), user in zip(batch, users):
+        profile = _build_profile(user, row, links)
+        profiles.setdefault(type(profile), []).append(profile)
+    for model, objs in profiles.items():
+        model.objects.bulk_create(objs)
+
+    # bulk_create sends no signals, so drop the cached learner lists and
+    # responses of linked parents/teachers
+    linked_ids = {
+        user_id for profile in profiles.get(LearnerProfile, [])
+        for user_id in (profile.parent_id, profile.teacher_id) if user_id
+    }
+
+    def invalidate():
+        invalidate_relationships(*linked_ids)
+        if linked_ids:
+            bump(*(f'user:{user_id}' for user_id in linked_ids))
+
+    transaction.on_commit(invalidate)
+    return len(users)
+
+
+def provision_roster(rows, batch_size=500, workers=None, dry_run=False):
+    """
+    Create every valid roster row. Returns a report:
+    {'total': n, 'created': n, 'errors': [{'row': n, 'errors': [...]}]}
+    """
+    valid, errors = validate_rows(rows)
+    links = resolve_links(valid)
+
+    # Links may also point at parents/teachers created by this same roster
+    roster_links = {
+        row[key]: row['role'] for _, row in valid
+        for key in ('username', 'email') if row['role'] in (User.Role.PARENT, User.Role.TEACHER)
+    }
+    linked = []
+    for number, row in valid:
+        problems = []
+        for key, role in (('parent', User.Role.PARENT), ('teacher', User.Role.TEACHER)):
+            reference = row.get(key)
+            if not reference:
+                continue
+            found_role = links[reference][1] if reference in links else roster_links.get(reference)
+            if found_role != role:
+                problems.append(f'{key} "{reference}" is not a known {role.lower()}')
+        if problems:
+            errors.append({'row': number, 'errors': problems})
+        else:
+            linked.append((number, row))
+
+    report = {'total': len(rows), 'created': 0, 'errors': errors}
+    if dry_run or not linked:
+        report['errors'].sort(key=lambda error: error['row'])
+        return report
+
+    linked.sort(key=lambda item: ROLE_ORDER.index(item[1]['role']))
+    passwords = hash_passwords([row.get('password', '') for _, row in linked], workers=workers)
+    pending = [(number, _build_user(row, password), row) for (number, row), password in zip(linked, passwords)]
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            with transaction.atomic():
+                report['created'] += _insert_batch(batch, links)
+        except (IntegrityError, DataError):
+            # Something raced us (or slipped past validation); retry row by row to pinpoint the offenders
+            for item in batch:
+                try:
+                    with transaction.atomic():
+                        report['created'] += _insert_batch([item], links)
+                except (IntegrityError, DataError) as exc:
+                    report['errors'].append({'row': item[0], 'errors': [str(exc).splitlines()[0]]})
+
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
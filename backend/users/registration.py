@@ -0,0 +1,62 @@
+# users/registration.py
+"""
+Registration and social-login serializers. Kept apart from users.serializers
+so the dj-rest-auth registration / allauth socialaccount stack is only
+imported when a registration endpoint is first used.
+"""
+
+from dj_rest_auth.registration.serializers import RegisterSerializer, SocialLoginSerializer
+from rest_framework import serializers
+
+from .models import User
+from .photos import store_profile_photo
+from .serializers import validate_photo_upload
+
+class CustomRegisterSerializer(RegisterSerializer):
+    first_name = serializers.CharField(max_length=150, required=True)
+    last_name = serializers.CharField(max_length=150, required=True)
+    role = serializers.ChoiceField(choices=User.Role.choices)
+    gender = serializers.ChoiceField(choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')])
+    phone_number = serializers.CharField(max_length=15)
+    grade = serializers.ChoiceField(choices=User.Grade.choices, required=False)
+    profile_photo = serializers.FileField(required=False)
+
+    def validate_profile_photo(self, upload):
+        return validate_photo_upload(upload)
+
+    def validate(self, data):
+        data = super().validate(data)
+        if data.get('role') == User.Role.LEARNER and not data.get('grade'):
+            raise serializers.ValidationError({
+                'grade': 'Grade is required for learners'
+            })
+        return data
+
+    def get_cleaned_data(self):
+        data = super().get_cleaned_data()
+        data.update({
+            'first_name': self.validated_data.get('first_name', ''),
+            'last_name': self.validated_data.get('last_name', ''),
+            'role': self.validated_data.get('role', ''),
+            'gender': self.validated_data.get('gender', ''),
+            'phone_number': self.validated_data.get('phone_number', ''),
+            'grade': self.validated_data.get('grade', ''),
+            'profile_photo': self.validated_data.get('profile_photo', None),
+        })
+        return data
+
+    def custom_signup(self, request, user):
+        user.first_name = self.cleaned_data.get('first_name')
+        user.last_name = self.cleaned_data.get('last_name')
+        user.role = self.cleaned_data.get('role')
+        user.gender = self.cleaned_data.get('gender')
+        user.phone_number = self.cleaned_data.get('phone_number')
+        if user.role == User.Role.LEARNER:
+            user.grade = self.cleaned_data.get('grade')
+        if self.cleaned_data.get('profile_photo'):
+            store_profile_photo(user, self.cleaned_data['profile_photo'])
+        user.save()
+
+class CustomSocialLoginSerializer(SocialLoginSerializer):
+    # you can customize this if needed; otherwise default works
+    pass
@@ -0,0 +1,125 @@
+# users/relationships.py
+"""
+Per-user relationship cache used by the permission classes and the scoped
+querysets: the user's role, group names and the learners they may see.
+
+Entries live in the default cache and are invalidated when a learner's
+parent/teacher changes, a profile is deleted, or the user's role or groups
+change. A request reuses the entry it loaded via the user object.
+
+Invalidation only reaches other workers through a shared cache (REDIS_URL).
+With the per-process LocMemCache an unlinked parent or teacher would keep
+access in the other workers until the entry expires, so entries there only
+live LOCAL_CACHE_TIMEOUT seconds.
+"""
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import User
+from learners.models import LearnerProfile
+
+CACHE_TIMEOUT = 300
+LOCAL_CACHE_TIMEOUT = 5
+CACHE_ATTR = '_relationships'
+
+
+def cache_key(user_id):
+    return f'relationships:{user_id}'
+
+
+def cache_timeout():
+    return LOCAL_CACHE_TIMEOUT if isinstance(caches['default'], LocMemCache) else CACHE_TIMEOUT
+
+
+def load_relationships(user):
+    if user.role == User.Role.ADMIN:
+        learners = None  # every learner
+    elif user.role == User.Role.LEARNER:
+        learners = [user.pk]
+    elif user.role == User.Role.TEACHER:
+        learners = list(LearnerProfile.objects.filter(teacher_id=user.pk).values_list('user_id', flat=True))
+    elif user.role == User.Role.PARENT:
+        learners = list(LearnerProfile.objects.filter(parent_id=user.pk).values_list('user_id', flat=True))
+    else:
+        learners = []
+    return {
+        'role': user.role,
+        'groups': list(user.groups.values_list('name', flat=True)),
+        'learners': learners,
+    }
+
+
+def get_relationships(user):
+    """Cached {'role', 'groups', 'learners'} for the user; 'learners' is None for admins"""
+    relationships = getattr(user, CACHE_ATTR, None)
+    if relationships is None:
+        key = cache_key(user.pk)
+        relationships = cache.get(key)
+        if relationships is None or relationships['role'] != user.role:
+            relationships = load_relationships(user)
+            cache.set(key, relationships, cache_timeout())
+        setattr(user, CACHE_ATTR, relationships)
+    return relationships
+
+
+def visible_learner_ids(user):
+    """Ids of the learners whose data the user may see, or None for every learner"""
+    return get_relationships(user)['learners']
+
+
+def can_see_learner(user, learner_id):
+    learners = visible_learner_ids(user)
+    return learners is None or learner_id in learners
+
+
+def in_group(user, name):
+    return name in get_relationships(user)['groups']
+
+
+def invalidate_relationships(*user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids if user_id is not None])
+
+
+@receiver(pre_save, sender=LearnerProfile)
+def remember_previous_links(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._previous_links = (None, None)
+        return
+    instance._previous_links = (
+        LearnerProfile.objects.filter(pk=instance.pk).values_list('parent_id', 'teacher_id').first()
+        or (None, None)
+    )
+
+
+@receiver(post_save, sender=LearnerProfile)
+def learner_links_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_links', (None, None))
+    current = (instance.parent_id, instance.teacher_id)
+    if previous != current:
+        invalidate_relationships(*previous, *current)
+
+
+@receiver(post_delete, sender=LearnerProfile)
+def learner_profile_deleted(sender, instance, **kwargs):
+    invalidate_relationships(instance.parent_id, instance.teacher_id, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_relationships(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # instance is a Group and pk_set holds user ids, except on clear
+        if action in ('post_add', 'post_remove'):
+            invalidate_relationships(*pk_set)
+        elif action == 'pre_clear':
+            invalidate_relationships(*instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_relationships(instance.pk)
@@ -0,0 +1,187 @@
+# users/response_cache.py
+"""
+Per-user cache of rendered GET responses for the hottest read endpoints
+(/api/users/me/, /api/users/profile/ and the conversation list).
+
+Each entry stores the rendered bytes together with a snapshot of the
+generation stamps of the scopes it was built from: `user:<id>` for a user's
+own account and profile, `conversations:<learner id>` for a learner's
+conversations and `conversations:all` for admin listings. Model signals move
+a scope to a new generation on every write, so the next read of any entry
+built from it misses. Cache-wide eviction can only cause misses, never stale
+hits, because generations are unique values rather than counters.
+
+Bumps made with QuerySet.update() or bulk_create() send no signals, so
+those writers call bump() themselves (archiving, roster provisioning).
+
+Bumps only reach other workers through a shared cache (REDIS_URL). With the
+per-process LocMemCache the other workers would serve their stale entries
+until they expire, so entries there only live LOCAL_TIMEOUT seconds.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from backend.conditional import not_modified, set_validators
+from learners.models import LearnerPrompt, LearnerProfile, Response
+from parents.models import ParentProfile
+from teachers.models import TeacherProfile
+from .models import User, AdminProfile
+from .relationships import visible_learner_ids
+
+TIMEOUT = getattr(settings, 'RESPONSE_CACHE_SECONDS', 300)
+LOCAL_TIMEOUT = 5
+ALL_CONVERSATIONS = 'conversations:all'
+
+
+def cache_timeout():
+    if isinstance(caches['default'], LocMemCache):
+        return min(TIMEOUT, LOCAL_TIMEOUT)
+    return TIMEOUT
+
+
+def user_scopes(user):
+    return [f'user:{user.pk}']
+
+
+def conversation_scopes(user):
+    learners = visible_learner_ids(user)
+    if learners is None:
+        return [ALL_CONVERSATIONS]
+    return [f'conversations:{learner_id}' for learner_id in sorted(learners)]
+
+
+def _generation_key(scope):
+    return f'response-cache:gen:{scope}'
+
+
+def _entry_key(request, endpoint):
+    path = hashlib.sha256(request.get_full_path().encode()).hexdigest()[:16]
+    return f'response-cache:{endpoint}:{request.user.pk}:{path}'
+
+
+def bump(*scopes):
+    """Move the scopes to fresh generations, invalidating every entry built from them"""
+    cache.set_many({_generation_key(scope): time.time_ns() for scope in scopes}, None)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def _count(self, endpoint, outcome):
+        with self.lock:
+            self.counts[(endpoint, outcome)] += 1
+
+    def _generations(self, scopes):
+        keys = [_generation_key(scope) for scope in scopes]
+        generations = cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in generations}
+        if missing:
+            # Start unseen scopes at a generation no stored entry can carry
+            for key, value in missing.items():
+                cache.add(key, value, None)
+            generations.update(cache.get_many(list(missing)))
+        return tuple(generations.get(key) for key in keys)
+
+    def lookup(self, request, endpoint, scopes):
+        """The cached response (or a 304 for a matching validator), or None on a miss"""
+        if not cache_timeout():
+            return None
+        generations = self._generations(scopes)
+        entry = cache.get(_entry_key(request, endpoint))
+        if entry is None or entry['scopes'] != scopes or entry['generations'] != generations:
+            self._count(endpoint, 'misses')
+            # Taken before the view reads anything, so a write racing the
+            # render leaves the stored entry already outdated
+            setattr(request, f'_response_cache_{endpoint}', generations)
+            return None
+
+        self._count(endpoint, 'hits')
+        if entry['etag']:
+            response = not_modified(request, entry['etag'], entry['last_modified'])
+            if response is not None:
+                return response
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        if entry['etag']:
+            set_validators(response, entry['etag'], entry['last_modified'])
+        return response
+
+    def store(self, request, endpoint, scopes, data, etag=None, last_modified=None):
+        """Render data with the negotiated JSON renderer and keep the bytes"""
+        renderer = getattr(request, 'accepted_renderer', None)
+        generations = getattr(request, f'_response_cache_{endpoint}', None)
+        timeout = cache_timeout()
+        if not timeout or generations is None or renderer is None or renderer.format != 'json':
+            return
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        cache.set(_entry_key(request, endpoint), {
+            'scopes': scopes,
+            'generations': generations,
+            'content': renderer.render(data, request.accepted_media_type, {'request': request}),
+            'content_type': content_type,
+            'etag': etag,
+            'last_modified': last_modified,
+        }, timeout)
+
+    def stats(self):
+        """{endpoint: {'hits', 'misses', 'hit_ratio'}} for this process"""
+        with self.lock:
+            counts = dict(self.counts)
+        endpoints = sorted({endpoint for endpoint, _ in counts})
+        stats = {}
+        for endpoint in endpoints:
+            hits, misses = counts.get((endpoint, 'hits'), 0), counts.get((endpoint, 'misses'), 0)
+            stats[endpoint] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_written(sender, instance, **kwargs):
+    bump(f'user:{instance.pk}')
+
+
+@receiver(post_save, sender=AdminProfile)
+@receiver(post_save, sender=ParentProfile)
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_save, sender=LearnerProfile)
+@receiver(post_delete, sender=AdminProfile)
+@receiver(post_delete, sender=ParentProfile)
+@receiver(post_delete, sender=TeacherProfile)
+@receiver(post_delete, sender=LearnerProfile)
+def profile_written(sender, instance, **kwargs):
+    bump(f'user:{instance.user_id}')
+
+
+@receiver(post_save, sender=LearnerPrompt)
+@receiver(post_delete, sender=LearnerPrompt)
+def conversation_written(sender, instance, **kwargs):
+    bump(f'conversations:{instance.learner_id}', ALL_CONVERSATIONS)
+
+
+# No post_delete: messages are only deleted by archiving (which keeps the
+# listing unchanged) or with their conversation, and a delete receiver would
+# stop Django from fast-deleting them
+@receiver(post_save, sender=Response)
+def message_written(sender, instance, **kwargs):
+    bump(f'conversations:{instance.prompt.learner_id}', ALL_CONVERSATIONS)
@@ -1,89 +1,123 @@
 # users/serializers.py
 
-from dj_rest_auth.registration.serializers import RegisterSerializer
 from rest_framework import serializers
+from django.core.files.storage import default_storage
 from .models import User, AdminProfile
-from dj_rest_auth.registration.serializers import SocialLoginSerializer
-from django.contrib.auth import authenticate
+from .photos import PhotoError, sniff_photo, store_profile_photo
+from backend.sparse_fields import SparseFieldsMixin
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Case, Q, Value, When
 from dj_rest_auth.serializers import LoginSerializer
+from functools import cache
 
-class CustomRegisterSerializer(RegisterSerializer):
-    first_name = serializers.CharField(max_length=150, required=True)
-    last_name = serializers.CharField(max_length=150, required=True)
-    role = serializers.ChoiceField(choices=User.Role.choices)
-    gender = serializers.ChoiceField(choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')])
-    phone_number = serializers.CharField(max_length=15)
-    grade = serializers.ChoiceField(choices=User.Grade.choices, required=False)
-    profile_photo = serializers.ImageField(required=False)
-
-    def validate(self, data):
-        data = super().validate(data)
-        if data.get('role') == User.Role.LEARNER and not data.get('grade'):
-            raise serializers.ValidationError({
-                'grade': 'Grade is required for learners'
-            })
-        return data
-
-    def get_cleaned_data(self):
-        data = super().get_cleaned_data()
-        data.update({
-            'first_name': self.validated_data.get('first_name', ''),
-            'last_name': self.validated_data.get('last_name', ''),
-            'role': self.validated_data.get('role', ''),
-            'gender': self.validated_data.get('gender', ''),
-            'phone_number': self.validated_data.get('phone_number', ''),
-            'grade': self.validated_data.get('grade', ''),
-            'profile_photo': self.validated_data.get('profile_photo', None),
-        })
-        return data
-
-    def custom_signup(self, request, user):
-        user.first_name = self.cleaned_data.get('first_name')
-        user.last_name = self.cleaned_data.get('last_name')
-        user.role = self.cleaned_data.get('role')
-        user.gender = self.cleaned_data.get('gender')
-        user.phone_number = self.cleaned_data.get('phone_number')
-        if user.role == User.Role.LEARNER:
-            user.grade = self.cleaned_data.get('grade')
-        user.save()
-
-class CustomSocialLoginSerializer(SocialLoginSerializer):
-    # you can customize this if needed; otherwise default works
-    pass
-
-class UsernameEmailLoginSerializer(serializers.Serializer):
-    login    = serializers.CharField(write_only=True)
+LOGIN_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+@cache
+def dummy_password_hash():
+    return make_password('dummy password for unknown logins')
+
+def resolve_login_user(identifier):
+    """
+    The user whose username or email matches case-insensitively, in one query.
+    An identifier containing '@' is an email first: anyone may register a
+    username equal to someone else's email address. Otherwise username matches
+    win over email matches. Exact matches win over case variants, which
+    usernames and emails may both have.
+    """
+    usernames = [Q(username=identifier), Q(username__iexact=identifier)]
+    emails = [Q(email=identifier), Q(email__iexact=identifier)]
+    ranked = emails + usernames if '@' in identifier else usernames + emails
+    return (
+        User.objects.filter(Q(username__iexact=identifier) | Q(email__iexact=identifier))
+        .order_by(Case(*(When(match, then=Value(rank)) for rank, match in enumerate(ranked))), 'pk')
+        .first()
+    )
+
+def validate_photo_upload(upload):
+    # Header-only check; the full decode happens in the photo worker pool
+    try:
+        sniff_photo(upload.read())
+    except PhotoError as exc:
+        raise serializers.ValidationError(str(exc))
+    upload.seek(0)
+    return upload
+
+class UsernameEmailLoginSerializer(LoginSerializer):
+    """
+    Accepts `login` (username or email), or dj-rest-auth's `username`/`email`.
+    The identifier resolves to one user row in one query and the password is
+    checked exactly once; unknown identifiers are checked against a dummy hash
+    so they take as long as a wrong password.
+    """
+    login    = serializers.CharField(write_only=True, required=False)
     password = serializers.CharField(write_only=True, style={'input_type': 'password'})
-    
+
     def validate(self, attrs):
-        login    = attrs.get('login')
+        identifier = (attrs.get('login') or attrs.get('username') or attrs.get('email') or '').strip()
         password = attrs.get('password')
-        user = None
+        if not identifier:
+            raise serializers.ValidationError('Must include "login" (username or email) and "password".')
 
-        # Try authenticating with username
-        user = authenticate(username=login, password=password)
-        # If no match, try authenticating with email field
+        user = resolve_login_user(identifier)
         if user is None:
-            user = authenticate(email=login, password=password)
-        
-        if not user:
+            check_password(password, dummy_password_hash())
+            raise serializers.ValidationError("Invalid credentials: username/email or password is incorrect.")
+        if not user.check_password(password):
             raise serializers.ValidationError("Invalid credentials: username/email or password is incorrect.")
 
-        if not user.is_active:
-            raise serializers.ValidationError("User account is disabled.")
+        self.validate_auth_user_status(user)
+        if 'dj_rest_auth.registration' in settings.INSTALLED_APPS:
+            self.validate_email_verification_status(user, email=user.email)
 
+        # Several backends are configured, so django.contrib.auth.login needs to be told which one
+        user.backend = LOGIN_BACKEND
         attrs['user'] = user
         return attrs
 
-class AdminProfileSerializer(serializers.ModelSerializer):
+class AdminProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AdminProfile
         fields = '__all__'
         read_only_fields = ['user']
+        expandable_fields = {'user': ('users.serializers.UserSummarySerializer', {})}
+
+class UserSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Public view of a related user, used when a relation is expanded"""
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name', 'role', 'grade')
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    profile_photo = serializers.FileField(required=False, allow_null=True)
+    profile_photo_variants = serializers.SerializerMethodField()
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 
-                 'role', 'gender', 'phone_number', 'grade', 'profile_photo')
+                 'role', 'gender', 'phone_number', 'grade', 'profile_photo', 'profile_photo_variants')
         read_only_fields = ('id', 'role')
+
+    def validate_profile_photo(self, upload):
+        return upload and validate_photo_upload(upload)
+
+    def get_profile_photo_variants(self, obj):
+        """{size: {'webp': url, 'jpeg': url}}; empty until the worker pool has produced them"""
+        request = self.context.get('request')
+        variants = {}
+        for size, names in (obj.profile_photo_variants or {}).items():
+            variants[size] = {}
+            for extension, name in names.items():
+                url = default_storage.url(name)
+                variants[size][extension] = request.build_absolute_uri(url) if request else url
+        return variants
+
+    def update(self, instance, validated_data):
+        if 'profile_photo' in validated_data:
+            upload = validated_data.pop('profile_photo')
+            if upload:
+                store_profile_photo(instance, upload)
+            else:
+                instance.profile_photo = None
+                instance.profile_photo_variants = {}
+        return super().update(instance, validated_data)
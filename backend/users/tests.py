@@ -1,3 +1,518 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend import memory
+from backend.perf_budget import PASSWORD, EndpointBudgetTestCase
+from learners.archive import archive_conversation, restore_conversation
+from learners.models import LearnerProfile, LearnerPrompt, Response
+from parents.models import ParentProfile
+from teachers.models import TeacherProfile
+from . import photos
+from .authentication import CachedTokenAuthentication, token_cache
+from .availability import username_index
+from .models import AdminProfile, User
+from .provisioning import provision_roster
+from .relationships import in_group, visible_learner_ids
+from .response_cache import response_cache
+
+ROLES = ('admin', 'learner', 'teacher', 'parent')
+
+
+class UserEndpointBudgetTests(EndpointBudgetTestCase):
+    def test_me(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/users/me/', max_queries=1, max_ms=150)
+
+    def test_profile(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/users/profile/', max_queries=2, max_ms=150)
+
+    def test_learner_profiles(self):
+        for role in ROLES:
+            self.measure(role, 'GET', '/api/users/learner-profile/', max_queries=4, max_ms=300)
+
+    def test_check_username(self):
+        self.measure(None, 'GET', '/api/users/check-username/?username=learner0', max_queries=1, max_ms=100,
+                     expected_status=400)
+        self.measure(None, 'POST', '/api/users/check-usernames/', max_queries=1, max_ms=200,
+                     data={'usernames': ['learner1', 'new-learner']})
+
+    def test_login(self):
+        self.measure(None, 'POST', '/api/auth/login/', max_queries=10, max_ms=1000,
+                     data={'login': 'learner0', 'password': PASSWORD})
+
+
+def roster_row(username, role='LEARNER', **fields):
+    row = {
+        'username': username, 'email': f'{username}@roster.example.com', 'first_name': 'Roster',
+        'last_name': 'Test', 'role': role, 'grade': '4' if role == 'LEARNER' else '',
+    }
+    row.update(fields)
+    return row
+
+
+class RosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='RosterAdmin', email='roster-admin@example.com', role=User.Role.ADMIN, is_staff=True,
+        )
+
+    def test_rows_are_validated_against_the_model_fields(self):
+        report = provision_roster([
+            roster_row('long-name', first_name='x' * 151),
+            roster_row('bad-email', email='not-an-email'),
+            roster_row('long-school', school='s' * 101),
+            roster_row('weak-password', password='123'),
+            roster_row('rosteradmin'),
+            roster_row('fine'),
+        ], workers=1)
+        errors = {error['row']: ' '.join(error['errors']) for error in report['errors']}
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(sorted(errors), [1, 2, 3, 4, 5])
+        self.assertIn('first_name', errors[1])
+        self.assertIn('email', errors[2])
+        self.assertIn('school', errors[3])
+        self.assertIn('password', errors[4])
+        self.assertIn('username already exists', errors[5])
+        self.assertTrue(User.objects.filter(username='fine').exists())
+
+    def test_links_to_parents_in_the_same_roster(self):
+        report = provision_roster([
+            roster_row('roster-child', parent='roster-parent'),
+            roster_row('roster-parent', role='PARENT', address='2 Roster Road'),
+        ], workers=1)
+        self.assertEqual((report['created'], report['errors']), (2, []))
+        profile = LearnerProfile.objects.get(user__username='roster-child')
+        self.assertEqual(profile.parent.username, 'roster-parent')
+
+    def test_api_limits_passwords_hashed_in_the_request(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        rows = [roster_row(f'pw{index}', password='a-long-enough-pass') for index in range(51)]
+        response = client.post('/api/users/roster/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='pw0').exists())
+
+        response = client.post('/api/users/roster/?dry_run=true', rows[:2], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['errors'], [])
+
+
+class CachedTokenTests(TestCase):
+    def test_auth_is_the_token_on_cache_hits(self):
+        user = User.objects.create(username='token-user', email='token-user@example.com')
+        token = Token.objects.create(user=user)
+        token_cache.clear()
+        authentication = CachedTokenAuthentication()
+        for _ in range(2):
+            authenticated, auth = authentication.authenticate_credentials(token.key)
+            self.assertEqual(authenticated.pk, user.pk)
+            self.assertIsInstance(auth, Token)
+            self.assertEqual(auth.key, token.key)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(client.post('/api/auth/logout/').status_code, 200)
+        self.assertFalse(Token.objects.filter(key=token.key).exists())
+        self.assertIsNone(token_cache.get(token.key))
+
+
+class RelationshipCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent = User.objects.create(username='rel-parent', email='rel-parent@example.com', role=User.Role.PARENT)
+        self.teacher = User.objects.create(username='rel-teacher', email='rel-teacher@example.com', role=User.Role.TEACHER)
+        self.learner = User.objects.create(username='rel-learner', email='rel-learner@example.com', role=User.Role.LEARNER)
+        self.profile = LearnerProfile.objects.create(user=self.learner, parent=self.parent, teacher=self.teacher)
+        self.conversation = LearnerPrompt.objects.create(learner=self.learner, text='Hi', title='Hi')
+
+    def visible(self, user):
+        # A fresh user object each time, as on a new request
+        return visible_learner_ids(User.objects.get(pk=user.pk))
+
+    def test_entries_are_cached(self):
+        self.assertEqual(self.visible(self.parent), [self.learner.pk])
+        user = User.objects.get(pk=self.parent.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(visible_learner_ids(user), [self.learner.pk])
+
+    def test_unlinking_revokes_access(self):
+        for user, field in ((self.parent, 'parent'), (self.teacher, 'teacher')):
+            self.assertEqual(self.visible(user), [self.learner.pk])
+            setattr(self.profile, field, None)
+            self.profile.save()
+            self.assertEqual(self.visible(user), [])
+
+    def test_unlinked_parent_loses_access_to_conversations(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=self.parent)[0].key}')
+        path = f'/api/learners/conversations/{self.conversation.pk}/'
+        self.assertEqual(client.get(path).status_code, 200)
+        self.profile.parent = None
+        self.profile.save()
+        self.assertEqual(client.get(path).status_code, 404)
+
+    def test_deleting_the_profile_revokes_access(self):
+        self.assertEqual(self.visible(self.teacher), [self.learner.pk])
+        self.profile.delete()
+        self.assertEqual(self.visible(self.teacher), [])
+
+    def test_role_and_group_changes_are_picked_up(self):
+        self.assertFalse(in_group(User.objects.get(pk=self.parent.pk), 'Parent'))
+        group, _ = Group.objects.get_or_create(name='Parent')
+        self.parent.groups.add(group)
+        self.assertTrue(in_group(User.objects.get(pk=self.parent.pk), 'Parent'))
+        group.user_set.clear()
+        self.assertFalse(in_group(User.objects.get(pk=self.parent.pk), 'Parent'))
+
+        self.parent.role = User.Role.ADMIN
+        self.parent.save()
+        self.assertIsNone(self.visible(self.parent))
+
+
+class ExpandedResponseTests(TestCase):
+    def test_expanded_profile_is_not_served_stale(self):
+        user = User.objects.create(
+            username='expand-learner', email='expand-learner@example.com', role=User.Role.LEARNER, grade='3',
+            first_name='Before',
+        )
+        LearnerProfile.objects.create(user=user, grade='3')
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        self.assertIn('ETag', client.get('/api/users/profile/'))
+        first = client.get('/api/users/profile/?expand=user')
+        self.assertNotIn('ETag', first)
+        self.assertEqual(first.data['user']['first_name'], 'Before')
+
+        user.first_name = 'After'
+        user.save()
+        second = client.get('/api/users/profile/?expand=user')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['user']['first_name'], 'After')
+
+
+class UsernameAvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='old-name', email='rename@example.com')
+        username_index.warm()
+
+    def test_free_names_are_answered_from_memory(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(username_index.is_available('never-used'))
+        with self.assertNumQueries(1):
+            self.assertFalse(username_index.is_available('OLD-NAME'))
+
+    def test_rename_in_this_process_is_seen(self):
+        self.user.username = 'New-Name'
+        self.user.save()
+        self.assertFalse(username_index.is_available('new-name'))
+        self.assertTrue(username_index.is_available('old-name'))
+
+    def test_rename_elsewhere_is_seen_after_the_next_poll(self):
+        # Saved without signals, as by another process
+        User.objects.filter(pk=self.user.pk).update(username='New-Name', updated_at=timezone.now())
+        User.objects.bulk_create([User(username='created-elsewhere', email='elsewhere@example.com')])
+        username_index.refreshed_at = 0.0
+        self.assertFalse(username_index.is_available('new-name'))
+        self.assertFalse(username_index.is_available('created-elsewhere'))
+
+
+class LoginResolutionTests(TestCase):
+    def test_email_wins_over_a_username_that_looks_like_it(self):
+        from .serializers import resolve_login_user
+
+        owner = User.objects.create(username='owner', email='owner@example.com')
+        squatter = User.objects.create(username='Owner@example.com', email='squatter@example.com')
+        self.assertEqual(resolve_login_user('owner@example.com'), owner)
+        self.assertEqual(resolve_login_user('OWNER@example.com'), owner)
+        self.assertEqual(resolve_login_user('squatter@example.com'), squatter)
+        self.assertEqual(resolve_login_user('owner'), owner)
+
+    def test_exact_match_wins_among_many_case_variants(self):
+        from .serializers import resolve_login_user
+
+        variants = ['CASE', 'case', 'Case', 'cAse', 'caSe', 'casE']
+        users = {
+            name: User.objects.create(username=name, email=f'{name}@Example.com')
+            for name in variants
+        }
+        for name in variants:
+            self.assertEqual(resolve_login_user(name), users[name])
+            self.assertEqual(resolve_login_user(f'{name}@Example.com'), users[name])
+        self.assertIn(resolve_login_user('CASE@example.com'), users.values())
+
+
+class ResponseCacheInvalidationTests(TestCase):
+    """Every write that changes a cached response moves it to a new generation"""
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+    def committed(self, write):
+        """write, running its on_commit callbacks as a real commit would"""
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+        return run
+
+    def user(self, username, role, **fields):
+        return User.objects.create(username=username, email=f'{username}@example.com', role=role, **fields)
+
+    def assertInvalidates(self, user, path, endpoint, write):
+        cache.clear()
+        client = self.client_for(user)
+        self.assertEqual(client.get(path).status_code, 200)
+        misses = response_cache.counts[(endpoint, 'misses')]
+        client.get(path)
+        self.assertEqual(response_cache.counts[(endpoint, 'misses')], misses, 'not served from the cache')
+        write()
+        response = client.get(path)
+        self.assertEqual(response_cache.counts[(endpoint, 'misses')], misses + 1, 'served a stale entry')
+        return response
+
+    def test_user(self):
+        user = self.user('cached-user', User.Role.PARENT, first_name='Before')
+
+        def rename():
+            user.first_name = 'After'
+            user.save()
+        response = self.assertInvalidates(user, '/api/users/me/', 'me', rename)
+        self.assertEqual(response.data['first_name'], 'After')
+
+    def test_profiles(self):
+        admin = self.user('cached-admin', User.Role.ADMIN)
+        parent = self.user('cached-parent', User.Role.PARENT)
+        teacher = self.user('cached-teacher', User.Role.TEACHER)
+        learner = self.user('cached-learner', User.Role.LEARNER, grade='5')
+        profiles = [
+            AdminProfile.objects.create(user=admin),
+            ParentProfile.objects.create(user=parent, address='1 Old Road'),
+            TeacherProfile.objects.create(user=teacher, subject='Maths', school='Old School'),
+            LearnerProfile.objects.create(user=learner, grade='5', school='Old School'),
+        ]
+        for profile in profiles:
+            self.assertInvalidates(profile.user, '/api/users/profile/', 'profile', profile.save)
+        response = self.assertInvalidates(parent, '/api/users/profile/', 'profile', profiles[1].delete)
+        self.assertEqual(response.status_code, 404)
+
+    def test_conversations_and_messages(self):
+        learner = self.user('cached-chat', User.Role.LEARNER, grade='5')
+        LearnerProfile.objects.create(user=learner, grade='5')
+        conversation = LearnerPrompt.objects.create(learner=learner, text='Hi', title='Before')
+        path = '/api/learners/conversations/'
+
+        def retitle():
+            conversation.title = 'After'
+            conversation.save()
+        response = self.assertInvalidates(learner, path, 'conversations', retitle)
+        self.assertEqual(response.data[0]['title'], 'After')
+        self.assertInvalidates(
+            learner, path, 'conversations',
+            lambda: Response.objects.create(prompt=conversation, role='user', text='A new message'),
+        )
+        self.assertInvalidates(
+            learner, path, 'conversations', self.committed(lambda: archive_conversation(conversation)),
+        )
+        conversation.refresh_from_db()
+        self.assertInvalidates(
+            learner, path, 'conversations', self.committed(lambda: restore_conversation(conversation)),
+        )
+
+    def test_roster_links(self):
+        parent = self.user('cached-roster-parent', User.Role.PARENT)
+        ParentProfile.objects.create(user=parent, address='1 Roster Road')
+        provision = self.committed(
+            lambda: provision_roster([roster_row('cached-roster-child', parent=parent.username)], workers=1),
+        )
+        self.assertInvalidates(parent, '/api/users/profile/', 'profile', provision)
+
+
+def png_bytes(size=(64, 48), color=(200, 40, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ProfilePhotoTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        # Variants are rendered inline instead of in the worker pool
+        patcher = mock.patch.object(photos.executor, 'submit', side_effect=lambda task, *args: task(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def client_for(self, username):
+        user = User.objects.create(username=username, email=f'{username}@example.com', role=User.Role.PARENT)
+        client = APIClient()
+        client.force_authenticate(user)
+        return user, client
+
+    def upload(self, client, data, name='photo.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.patch('/api/users/me/', {'profile_photo': SimpleUploadedFile(name, data)}, format='multipart')
+
+    def test_sniffing_reads_format_and_limits_from_the_header(self):
+        self.assertEqual(photos.sniff_photo(png_bytes()), 'png')
+        with self.assertRaisesMessage(photos.PhotoError, 'valid JPEG'):
+            photos.sniff_photo(b'GIF89a but not really an image')
+        with mock.patch.object(photos, 'MAX_UPLOAD_BYTES', 100), self.assertRaisesMessage(photos.PhotoError, 'smaller'):
+            photos.sniff_photo(png_bytes())
+        with mock.patch.object(photos, 'MAX_PIXELS', 64 * 48 - 1), self.assertRaisesMessage(photos.PhotoError, 'dimensions'):
+            photos.sniff_photo(png_bytes())
+
+    def test_non_images_and_oversized_images_are_rejected(self):
+        user, client = self.client_for('photo-rejected')
+        response = self.upload(client, b'plain text', name='photo.png')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('profile_photo', response.data)
+        with mock.patch.object(photos, 'MAX_UPLOAD_BYTES', 100):
+            self.assertEqual(self.upload(client, png_bytes()).status_code, 400)
+        user.refresh_from_db()
+        self.assertFalse(user.profile_photo)
+
+    def test_identical_uploads_share_one_content_hashed_file(self):
+        data = png_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        names = []
+        for username in ('photo-first', 'photo-second'):
+            user, client = self.client_for(username)
+            self.assertEqual(self.upload(client, data).status_code, 200)
+            user.refresh_from_db()
+            names.append(user.profile_photo.name)
+        self.assertEqual(names, [photos.original_name(digest, 'png')] * 2)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, photos.PHOTO_DIR, digest[:2])).count(f'{digest}.png'), 1)
+
+    def test_variants_are_generated_after_commit_and_served(self):
+        data = png_bytes(color=(10, 120, 200))
+        digest = hashlib.sha256(data).hexdigest()
+        user, client = self.client_for('photo-variants')
+        with mock.patch.object(photos, 'generate_variants', wraps=photos.generate_variants) as generate:
+            client.patch('/api/users/me/', {'profile_photo': SimpleUploadedFile('photo.png', data)}, format='multipart')
+            generate.assert_not_called()
+            self.upload(client, data)
+            generate.assert_called_once()
+
+        user.refresh_from_db()
+        self.assertEqual(sorted(user.profile_photo_variants, key=int), ['48', '128', '256'])
+        for size, names in user.profile_photo_variants.items():
+            self.assertEqual(names, {extension: photos.variant_name(digest, size, extension) for extension in ('webp', 'jpeg')})
+            with default_storage.open(names['webp']) as variant, Image.open(variant) as image:
+                self.assertEqual(image.size, (int(size), int(size)))
+
+        served = client.get('/api/users/me/').data['profile_photo_variants']
+        self.assertEqual(served['48']['jpeg'], default_storage.url(photos.variant_name(digest, '48', 'jpeg')))
+
+
+class DiagnosticsTestCase(TestCase):
+    """Admins, and users who must not see the diagnostics: a learner and a staff teacher"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create(username=name, email=f'{name}@example.com', role=role, is_staff=is_staff)
+            for name, role, is_staff in (
+                ('diagnostics-admin', User.Role.ADMIN, False),
+                ('diagnostics-learner', User.Role.LEARNER, False),
+                ('diagnostics-staff', User.Role.TEACHER, True),
+            )
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, name):
+        # Token auth: the profiling middleware authenticates before DRF does
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=self.users[name])[0].key}')
+        return client
+
+
+class RequestProfilingTests(DiagnosticsTestCase):
+    def test_non_admins_get_a_plain_response(self):
+        for name in ('diagnostics-learner', 'diagnostics-staff'):
+            client = self.client_for(name)
+            for response in (client.get('/api/users/me/?_profile=sql'), client.get('/api/users/me/', HTTP_X_PROFILE='cprofile')):
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['username'], name)
+                self.assertNotIn('X-Profile-Id', response)
+                self.assertNotIn('Server-Timing', response)
+
+    def test_admin_gets_the_report(self):
+        client = self.client_for('diagnostics-admin')
+        response = client.get('/api/learners/conversations/?_profile=sql')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        report = client.get(f"/api/users/request-profiles/{response['X-Profile-Id']}/").data
+        self.assertEqual(
+            (report['path'], report['mode'], report['status']), ('/api/learners/conversations/?_profile=sql', 'sql', 200),
+        )
+        self.assertGreaterEqual(report['sql']['count'], 1)
+        self.assertIsNone(report['profile'])
+
+        self.assertEqual(
+            self.client_for('diagnostics-staff').get(f"/api/users/request-profiles/{response['X-Profile-Id']}/").status_code,
+            403,
+        )
+
+    def test_cprofile_report_and_stats(self):
+        client = self.client_for('diagnostics-admin')
+        profile_id = client.get('/api/users/me/', HTTP_X_PROFILE='cprofile')['X-Profile-Id']
+        self.assertIn('cumulative', client.get(f'/api/users/request-profiles/{profile_id}/').data['profile'])
+        stats = client.get(f'/api/users/request-profiles/{profile_id}/?output=prof')
+        self.assertEqual(stats['Content-Type'], 'application/octet-stream')
+
+
+class MemoryDiagnosticsTests(DiagnosticsTestCase):
+    def test_non_admins_are_refused(self):
+        for name in ('diagnostics-learner', 'diagnostics-staff'):
+            client = self.client_for(name)
+            for response in (
+                client.get('/api/users/memory/'),
+                client.get('/api/users/memory/?output=prometheus'),
+                client.post('/api/users/memory/', {'action': 'collect'}, format='json'),
+            ):
+                self.assertEqual(response.status_code, 403)
+                self.assertNotIn(b'rss', response.content)
+
+    def test_admin_gets_stats_and_snapshots(self):
+        client = self.client_for('diagnostics-admin')
+        stats = client.get('/api/users/memory/?objects=true').data
+        self.assertEqual(stats['pid'], os.getpid())
+        self.assertIn('objects', stats)
+        self.assertIn(f'pid="{os.getpid()}"', client.get('/api/users/memory/?output=prometheus').content.decode())
+
+        self.addCleanup(memory.stop_tracing)
+        self.assertTrue(client.post('/api/users/memory/', {'action': 'start'}, format='json').data['tracemalloc']['tracing'])
+        first = client.post('/api/users/memory/', {'action': 'snapshot', 'label': 'before'}, format='json').data['snapshot']
+        second = client.post('/api/users/memory/', {'action': 'snapshot'}, format='json').data['snapshot']
+        sites = client.get(f"/api/users/memory/snapshots/{first}/").data['sites']
+        self.assertTrue(sites)
+        compared = client.get(f"/api/users/memory/snapshots/{second}/?compare=previous")
+        self.assertEqual(compared.status_code, 200)
 
-# Create your tests here.
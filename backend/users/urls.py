@@ -1,7 +1,7 @@
 # users/urls.py
 
 from django.urls import path
-from .views import UserProfileView, LearnerProfileView, current_user, get_csrf_token, check_username
+from .views import UserProfileView, LearnerProfileView, RosterProvisionView, access_token, current_user, get_csrf_token, check_username, check_usernames, memory_diagnostics, memory_snapshot, request_profile, response_cache_stats
 
 urlpatterns = [
     path('csrf/', get_csrf_token),
@@ -9,5 +9,12 @@ urlpatterns = [
     path('learner-profile/', LearnerProfileView.as_view(), name='learner-profile-list'),
     path('learner-profile/<int:pk>/', LearnerProfileView.as_view(), name='learner-profile-detail'),
     path('me/', current_user),
+    path('access-token/', access_token, name='access-token'),
     path('check-username/', check_username, name='check-username'),
+    path('check-usernames/', check_usernames, name='check-usernames'),
+    path('roster/', RosterProvisionView.as_view(), name='roster-provision'),
+    path('cache-stats/', response_cache_stats, name='response-cache-stats'),
+    path('memory/', memory_diagnostics, name='memory-diagnostics'),
+    path('memory/snapshots/<int:snapshot_id>/', memory_snapshot, name='memory-snapshot'),
+    path('request-profiles/<str:profile_id>/', request_profile, name='request-profile'),
 ]
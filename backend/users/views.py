@@ -10,16 +10,28 @@ from .serializers import (
     UserSerializer, AdminProfileSerializer, #ParentProfileSerializer,
     # LearnerProfileSerializer, TeacherProfileSerializer
 )
-from .permissions import IsOwnerOrRelated
+from .permissions import IsOwnerOrRelated, IsAdminRole
+from .relationships import visible_learner_ids
+from .authentication import issue_access_token
+from .provisioning import RosterError, parse_roster, provision_roster
+from .availability import MAX_BATCH, username_index
+from .response_cache import response_cache, user_scopes
+from backend import memory, profiling
+from backend.conditional import make_etag, not_modified, set_validators
+from backend.fastjson import ORJSONParser
+from backend.sparse_fields import apply_request_fields, expanded, expands_relations
 from learners.models import LearnerProfile
 from learners.serializers import LearnerProfileSerializer
 from parents.serializers import ParentProfileSerializer
 from teachers.serializers import TeacherProfileSerializer
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
+import gc
+import json
 
 User = get_user_model()
 
@@ -33,12 +45,35 @@ def check_username(request):
     username = request.GET.get('username', '').strip()
     if not username:
         return Response({'detail': 'Username is required'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    exists = User.objects.filter(username=username).exists()
-    if exists:
+
+    if not username_index.is_available(username):
         return Response({'detail': 'Username is already taken'}, status=status.HTTP_400_BAD_REQUEST)
     return Response({'detail': 'Username is available'}, status=status.HTTP_200_OK)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def check_usernames(request):
+    """
+    POST /api/users/check-usernames/ {"usernames": [...]}
+    → [{"username", "available", "suggestions"}] for up to MAX_BATCH candidates
+    """
+    usernames = request.data.get('usernames') if isinstance(request.data, dict) else None
+    if not isinstance(usernames, list) or not usernames:
+        return Response({'detail': 'usernames must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(usernames) > MAX_BATCH:
+        return Response({'detail': f'At most {MAX_BATCH} usernames per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+    usernames = [str(name).strip() for name in usernames if str(name).strip()]
+    taken = username_index.taken(usernames)
+    return Response([
+        {
+            'username': name,
+            'available': name not in taken,
+            'suggestions': username_index.suggest(name) if name in taken else [],
+        }
+        for name in usernames
+    ])
+
 @api_view(['GET', 'PATCH'])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser])
@@ -47,8 +82,17 @@ def current_user(request):
         return Response({'detail': 'Not authenticated'}, status=401)
 
     if request.method == 'GET':
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        user = request.user
+        etag = make_etag('user', user.pk, user.updated_at.isoformat(), request.META.get('QUERY_STRING', ''))
+        cached = not_modified(request, etag, user.updated_at)
+        if cached is None:
+            cached = response_cache.lookup(request, 'me', user_scopes(user))
+        if cached is not None:
+            return cached
+        # No request in the context: profile_photo stays a relative URL as before
+        serializer = apply_request_fields(UserSerializer(user), request)
+        response_cache.store(request, 'me', user_scopes(user), serializer.data, etag, user.updated_at)
+        return set_validators(Response(serializer.data), etag, user.updated_at)
     
     elif request.method == 'PATCH':
         serializer = UserSerializer(request.user, data=request.data, partial=True)
@@ -57,6 +101,109 @@ def current_user(request):
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def access_token(request):
+    """Exchange the session token for a short-lived signed access token for the chat endpoints"""
+    token = issue_access_token(request.user)
+    return Response({
+        'access': str(token),
+        'expires_in': int(token.lifetime.total_seconds()),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def response_cache_stats(request):
+    """GET /api/users/cache-stats/ → per-endpoint response cache hits, misses and hit ratio for this process"""
+    return Response(response_cache.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def request_profile(request, profile_id):
+    """
+    GET /api/users/request-profiles/<id>/ → stored report of a profiled request (X-Profile header)
+    GET /api/users/request-profiles/<id>/?output=prof → its raw cProfile stats
+    """
+    if request.query_params.get('output') == 'prof':
+        stats = cache.get(profiling.stats_key(profile_id))
+        if stats is None:
+            return Response({'detail': 'No cProfile stats for this id'}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(stats, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="request-{profile_id}.prof"'
+        return response
+    report = cache.get(profiling.report_key(profile_id))
+    if report is None:
+        return Response({'detail': 'Profile not found or expired'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(report)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def memory_diagnostics(request):
+    """
+    GET /api/users/memory/[?objects=true] → this worker's RSS, GC and tracemalloc stats (and live object counts)
+    GET /api/users/memory/?output=prometheus → the same stats as Prometheus metrics
+    POST /api/users/memory/ {"action": "start" [, "frames": n] | "snapshot" [, "label"] | "collect" | "stop"}
+    """
+    if request.method == 'POST':
+        action = request.data.get('action')
+        result = {}
+        if action == 'start':
+            try:
+                memory.start_tracing(int(request.data.get('frames', 1)))
+            except (TypeError, ValueError):
+                return Response({'detail': 'frames must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        elif action == 'snapshot':
+            try:
+                result['snapshot'] = memory.take_snapshot(str(request.data.get('label', '')))
+            except RuntimeError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        elif action == 'collect':
+            result['collected'] = gc.collect()
+        elif action == 'stop':
+            memory.stop_tracing()
+        else:
+            return Response({'detail': 'action must be start, snapshot, collect or stop'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**result, **memory.process_stats()})
+
+    if request.query_params.get('output') == 'prometheus':
+        return HttpResponse(memory.prometheus_metrics(), content_type='text/plain; version=0.0.4')
+    stats = memory.process_stats()
+    if request.query_params.get('objects', 'false').lower() == 'true':
+        stats['objects'] = memory.live_objects()
+    return Response(stats)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminRole])
+def memory_snapshot(request, snapshot_id):
+    """
+    GET /api/users/memory/snapshots/<id>/[?group=lineno|traceback&limit=n] → largest allocation sites
+    GET /api/users/memory/snapshots/<id>/?compare=<id>|previous → sites that grew the most since that snapshot
+    """
+    group = request.query_params.get('group', 'lineno')
+    if group not in ('lineno', 'filename', 'traceback'):
+        return Response({'detail': 'group must be lineno, filename or traceback'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', memory.TOP_LIMIT)), 200))
+    except ValueError:
+        limit = memory.TOP_LIMIT
+
+    base = request.query_params.get('compare')
+    try:
+        if base is None:
+            return Response({'snapshot': snapshot_id, 'sites': memory.top_sites(snapshot_id, group, limit)})
+        base_id = memory.previous_snapshot_id(snapshot_id) if base == 'previous' else int(base)
+        if base_id is None:
+            return Response({'detail': 'No earlier snapshot to compare with'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'snapshot': snapshot_id,
+            'compared_to': base_id,
+            'sites': memory.compare(snapshot_id, base_id, group, limit),
+        })
+    except ValueError:
+        return Response({'detail': 'compare must be a snapshot id or previous'}, status=status.HTTP_400_BAD_REQUEST)
+    except KeyError:
+        return Response({'detail': 'Snapshot not found in this worker'}, status=status.HTTP_404_NOT_FOUND)
+
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -86,6 +233,10 @@ class UserProfileView(APIView):
 
     def get(self, request):
         user = request.user
+        uncached = expands_relations(request)
+        cached = None if uncached else response_cache.lookup(request, 'profile', user_scopes(user))
+        if cached is not None:
+            return cached
         profile = self.get_user_profile(user)
         if profile is None:
             return Response({'error': f'{user.role.title()} profile does not exist'}, status=404)
@@ -93,9 +244,19 @@ class UserProfileView(APIView):
         serializer_class = self.get_serializer_class(user.role)
         if serializer_class is None:
             return Response({'error': 'Invalid role'}, status=400)
+        if uncached:
+            # The expanded users change without touching the profile's updated_at
+            return Response(serializer_class(profile, context={'request': request}).data)
 
-        serializer = serializer_class(profile)
-        return Response(serializer.data)
+        etag = make_etag(
+            'profile', user.role, profile.pk, profile.updated_at.isoformat(), request.META.get('QUERY_STRING', ''),
+        )
+        cached = not_modified(request, etag, profile.updated_at)
+        if cached is not None:
+            return cached
+        serializer = serializer_class(profile, context={'request': request})
+        response_cache.store(request, 'profile', user_scopes(user), serializer.data, etag, profile.updated_at)
+        return set_validators(Response(serializer.data), etag, profile.updated_at)
 
     def put(self, request):
         user = request.user
@@ -119,9 +280,14 @@ class LearnerProfileView(APIView):
     def get(self, request, pk=None):
         user = request.user
 
+        profiles = LearnerProfile.objects.all()
+        related = [name for name in ('user', 'parent', 'teacher') if expanded(request, name)]
+        if related:
+            profiles = profiles.select_related(*related)
+
         if pk:
             try:
-                profile = LearnerProfile.objects.get(pk=pk)
+                profile = profiles.get(pk=pk)
             except LearnerProfile.DoesNotExist:
                 return Response({'detail': 'Profile not found'}, status=404)
 
@@ -129,20 +295,52 @@ class LearnerProfileView(APIView):
             if not IsOwnerOrRelated().has_object_permission(request, self, profile):
                 return Response({'detail': 'Access denied.'}, status=403)
 
-            serializer = LearnerProfileSerializer(profile)
+            serializer = LearnerProfileSerializer(profile, context={'request': request})
             return Response(serializer.data)
 
         # List of profiles filtered by user role
-        if user.role == User.Role.ADMIN:
-            profiles = LearnerProfile.objects.all()
-        elif user.role == User.Role.LEARNER:
-            profiles = LearnerProfile.objects.filter(user=user)
-        elif user.role == User.Role.TEACHER:
-            profiles = LearnerProfile.objects.filter(teacher=user)
-        elif user.role == User.Role.PARENT:
-            profiles = LearnerProfile.objects.filter(parent=user)
-        else:
+        if user.role not in User.Role.values:
             return Response({'detail': 'Not allowed'}, status=403)
+        learner_ids = visible_learner_ids(user)
+        if learner_ids is not None:
+            profiles = profiles.filter(user_id__in=learner_ids)
+
+        serializer = LearnerProfileSerializer(profiles, many=True, context={'request': request})
+        return Response(serializer.data)
+
+
+class RosterProvisionView(APIView):
+    """
+    POST /api/users/roster/[?dry_run=true]
+    Bulk-creates users, profiles and parent/teacher links. Send either a
+    multipart `file` (.csv or .json) or a JSON list of roster rows.
+
+    Passwords are hashed inside the request, without a process pool, so at most
+    max_passwords rows may carry one; provision larger rosters with the
+    `provision_roster` command, or leave passwords blank (unusable).
+    """
+    permission_classes = [IsAuthenticated, IsAdminRole]
+    parser_classes = [ORJSONParser, MultiPartParser, FormParser]
+    max_passwords = 50
+
+    def post(self, request):
+        try:
+            if 'file' in request.FILES:
+                upload = request.FILES['file']
+                fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+                rows = parse_roster(upload.read().decode('utf-8-sig'), fmt)
+            elif isinstance(request.data, list):
+                rows = parse_roster(json.dumps(request.data), 'json')
+            else:
+                return Response({'detail': 'Send a roster file or a JSON list of rows'}, status=400)
+        except (RosterError, UnicodeDecodeError, json.JSONDecodeError) as exc:
+            return Response({'detail': str(exc)}, status=400)
+
+        if sum(1 for row in rows if row.get('password')) > self.max_passwords:
+            return Response({
+                'detail': f'At most {self.max_passwords} rows may set a password here; use the provision_roster command',
+            }, status=400)
 
-        serializer = LearnerProfileSerializer(profiles, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        dry_run = request.query_params.get('dry_run', 'false').lower() == 'true'
+        report = provision_roster(rows, workers=1, dry_run=dry_run)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)